@@ -6,9 +6,11 @@ import calendar_client as cal
 from calendar_client import rename_event
 from zoneinfo import ZoneInfo
 from agent_brain import messages as msg
-from agent_brain.respond import respond_with_brain
+from agent_brain.respond import respond_with_brain, send_text_safe
 # NEW imports (keep existing ones)
 from agent_brain import prompts
+from agent_brain import day_texts
+from agent_brain import tone_templates
 from agent_brain import scheduler as sched   # centralize calendar reflows here
 import beia_core.models.timebox as db                                    # segment/day_state writes
 from feature_flags import ff
@@ -180,6 +182,28 @@ async def _send_llm_payload(update, context, action_name: str, payload: dict):
             send=True,
         )
 
+def _llm_tone() -> bool:
+    # LLM-written FSM copy is opt-in; the default is the compiled tone templates
+    return ff.get("WF0_LLM_TONE")
+
+async def _send_templated(update, context, kind: str, tone: str, **slots):
+    text = tone_templates.render(kind, tone, ds_on=ff.get("WF0_DS_MODE"), **slots)
+    await send_text_safe(update, context, text)
+    return text
+
+async def _send_boundary_text(update, context, action_name: str, kind: str, title: str, tone: str, payload: dict):
+    """
+    Templated line by default. With WF0_LLM_TONE: the morning-precomputed LLM
+    line, or a live LLM call on a cache miss.
+    """
+    if not _llm_tone():
+        return await _send_templated(update, context, kind, tone, title=title)
+    text = day_texts.lookup(kind, title, tone)
+    if text:
+        await send_text_safe(update, context, text)
+        return text
+    return await _send_llm_payload(update, context, action_name, payload)
+
 # --- Main handler ---
 async def handle_action(parsed, update, context):
     action = parsed.get("action")
@@ -403,10 +427,13 @@ async def handle_action(parsed, update, context):
                 gap_min = 15
             tone_str = (seg.get("tone_at_start") or "gentle").lower()
 
-        payload = prompts.free_time_prompt(gap_minutes=gap_min, tone=tone_str, theme_hint=None)
         # Mark start so we don’t re-prompt each minute
         db.update_segment(seg_id, start_confirmed_at=dt.datetime.now(tz=TZ))
-        await _send_llm_payload(update, context, "send_ftw_intent", payload)
+        if _llm_tone():
+            payload = prompts.free_time_prompt(gap_minutes=gap_min, tone=tone_str, theme_hint=None)
+            await _send_llm_payload(update, context, "send_ftw_intent", payload)
+        else:
+            await _send_templated(update, context, "free_time", tone_str, minutes=gap_min)
     
     # --- FSM verb routing (Workflow #0) ---
     elif action == "send_start":
@@ -477,7 +504,7 @@ async def fsm_send_start(seg_id: str, update, context):
     logging.info(f"[FSM] send_start → title='{title}', tone='{tone_str}'")
     # Mark started, then send prompt
     db.update_segment(seg_id, start_confirmed_at=dt.datetime.now(tz=TZ))
-    await _send_llm_payload(update, context, "fsm_send_start", payload)
+    await _send_boundary_text(update, context, "fsm_send_start", "start", title, tone_str, payload)
 
 async def fsm_send_mid(seg_id: str, update, context):
     seg = _fetch_segment(seg_id)
@@ -487,7 +514,7 @@ async def fsm_send_mid(seg_id: str, update, context):
     tone_str = (seg.get("tone_at_start") or "gentle").lower()
     payload = prompts.mid_prompt(title=title, tone=tone_str)
     logging.info(f"[FSM] send_mid → title='{title}', tone='{tone_str}'")
-    await _send_llm_payload(update, context, "fsm_send_mid", payload)
+    await _send_boundary_text(update, context, "fsm_send_mid", "mid", title, tone_str, payload)
 
 async def fsm_send_end(seg_id: str, update, context):
     seg = _fetch_segment(seg_id)
@@ -497,7 +524,7 @@ async def fsm_send_end(seg_id: str, update, context):
     tone_str = (seg.get("tone_at_start") or "gentle").lower()
     payload = prompts.end_prompt(title=title, tone=tone_str)
     logging.info(f"[FSM] send_end → title='{title}', tone='{tone_str}'")
-    await _send_llm_payload(update, context, "fsm_send_end", payload)
+    await _send_boundary_text(update, context, "fsm_send_end", "end", title, tone_str, payload)
 
 async def fsm_extend(seg_id: str, minutes: int, update, context):
     seg = _fetch_segment(seg_id)
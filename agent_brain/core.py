@@ -2,8 +2,12 @@
 # agent_brain/core.py
 # ======================
 import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from telegram import Bot
-from openai import AsyncOpenAI  # ✅ Use the async client
+import llm_client  # ✅ shared pooled async client
 import calendar_client
 from beia_core.models.timebox import get_user_context, get_recent_conversation, save_conversation_turn, clear_conversation_history
 from agent_brain.observer import detect_drift
@@ -11,10 +15,35 @@ from agent_brain.scheduler import propose_adjustment
 from agent_brain.prompts import generate_followup_nudge
 from agent_brain.state import log_event_status
 from agent_brain.principles import COVEY_SYSTEM_PROMPT
+from agent_brain import memory
+from agent_brain import outbox
 import datetime as dt
 
 
-async def run_brain():
+# Static instructions: identical on every call so the provider can cache the prefix.
+BRAIN_SYSTEM_PROMPT = f"""
+{COVEY_SYSTEM_PROMPT}
+
+You are a time-stewardship assistant, helping the user manage their calendar.
+
+Instructions:
+- If the user prompt includes an agenda (e.g. lines starting with 🗓️, ⏳, ✅), summarize that info directly.
+- Be concise and focused. Only offer reflective advice if the user asks for it.
+- Always respond with direct value **first** (agenda, event info, durations) before optional insights.
+- Never ignore or rephrase event summaries. Treat them as the user's source of truth.
+- Respond in plain English, not philosophical abstraction.
+- The latest "Context:" message holds the user's current event, weekly focus and energy.
+""".strip()
+
+BRAIN_MEMORY = memory.MemoryStore(summarizer=memory.llm_summarizer)
+
+BRAIN_CONTEXT = """Context:
+- Current Event: {current_summary}
+- Weekly Focus: {focus}
+- Energy Level: {energy}"""
+
+
+async def run_brain(bot=None):
     print("🧠 [run_brain] Checking for drift...")
     drift = detect_drift()
 
@@ -27,26 +56,81 @@ async def run_brain():
     suggestion = propose_adjustment(drift)
     print(f"🛠️ [run_brain] Proposed adjustment: {suggestion}")
 
-    message = generate_followup_nudge(drift, suggestion)
+    message = await asyncio.to_thread(generate_followup_nudge, drift, suggestion)
     print(f"📩 [run_brain] GPT Nudge:\n{message}\n")
 
     log_event_status(drift["event_id"], drift["status"])
     print("📚 [run_brain] Event status logged.")
 
-    bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
-    await bot.send_message(
-        chat_id=os.getenv("TELEGRAM_CHAT_ID"),
-        text=message,
-        parse_mode="Markdown"
-    )
+    bot = bot or Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
+    await outbox.send(bot, os.getenv("TELEGRAM_CHAT_ID"), message, parse_mode="Markdown")
     print("📤 [run_brain] Message sent to Telegram.")
     
     
-async def conversational_brain(input_msg) -> str:
+_RESET_REPLY = "🧠 Memory cleared. Let's begin fresh — what would you like to focus on today?"
+
+# Per-user context (DB profile + current calendar event) is reused for a short
+# while so back-to-back messages don't each pay for a DB read and two Google calls.
+CONTEXT_TTL_S = float(os.getenv("BRAIN_CONTEXT_TTL_S", "30"))
+_CONTEXT_CACHE = {}  # user_id -> (expires_monotonic, (context, current_event))
+
+# One writer thread keeps conversation turns in order without blocking replies
+_HISTORY_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="brain-history")
+_PENDING_WRITES = set()
+
+
+def invalidate_context(user_id=None) -> None:
+    if user_id is None:
+        _CONTEXT_CACHE.clear()
+    else:
+        _CONTEXT_CACHE.pop(str(user_id), None)
+
+
+async def _gather_context(user_id):
     """
-    Accepts either:
-      - str: user message
-      - dict: {"system": str|None, "user": str|None}
+    (context, current_event) for the prompt. On a cache miss the DB and
+    calendar lookups run concurrently off-thread, together with the one-time
+    history load; a failing source degrades to an empty value.
+    """
+    key = str(user_id)
+    now = time.monotonic()
+    hit = _CONTEXT_CACHE.get(key)
+    fresh = hit is not None and hit[0] > now
+    needs_history = not BRAIN_MEMORY.is_loaded(user_id)
+
+    jobs = {}
+    if not fresh:
+        jobs["context"] = asyncio.to_thread(get_user_context, user_id=user_id, now=dt.datetime.utcnow())
+        jobs["calendar"] = asyncio.to_thread(calendar_client.get_current_and_next_event)
+    if needs_history:
+        jobs["history"] = asyncio.to_thread(get_recent_conversation, user_id)
+    results = dict(zip(jobs, await asyncio.gather(*jobs.values(), return_exceptions=True)))
+    failed = set()
+    for name, res in results.items():
+        if isinstance(res, Exception):
+            logging.warning(f"[brain] {name} lookup failed: {res}")
+            results[name] = None
+            failed.add(name)
+
+    if needs_history and "history" not in failed:
+        rows = results["history"] or []
+        # load() on the loop so evicted turns can be folded into the summary.
+        # A failed lookup skips it: the next message retries instead of
+        # marking the user loaded with an empty history.
+        BRAIN_MEMORY.load(user_id, lambda: rows)
+    if fresh:
+        return hit[1]
+
+    value = (results["context"] or {}, (results["calendar"] or {}).get("current"))
+    _CONTEXT_CACHE[key] = (now + CONTEXT_TTL_S, value)
+    return value
+
+
+async def _prepare_brain(input_msg):
+    """
+    Normalize input and assemble the prompt.
+    Returns (user_id, user_message, messages); messages is None when the
+    input was a memory reset (already handled).
     """
     # --- Normalize inputs ---
     if isinstance(input_msg, dict):
@@ -60,56 +144,93 @@ async def conversational_brain(input_msg) -> str:
 
     # Reset guard checks the *user* text
     if user_message.lower() in {"reset", "start over", "clear memory"}:
-        clear_conversation_history(user_id)
-        return "🧠 Memory cleared. Let's begin fresh — what would you like to focus on today?"
+        await asyncio.to_thread(clear_conversation_history, user_id)
+        BRAIN_MEMORY.clear(user_id)
+        invalidate_context(user_id)
+        return user_id, user_message, None
 
-    # Context for the default system prompt
-    context = get_user_context(user_id=user_id, now=dt.datetime.utcnow()) or {}
-    current_event = calendar_client.get_current_and_next_event().get("current")
+    # Context for the default system prompt + chat history (token-budgeted,
+    # older turns folded into a rolling summary in the background)
+    context, current_event = await _gather_context(user_id)
 
     current_summary = current_event.get("summary") if current_event else "None"
     focus = context.get("focus", "No focus set")
     energy = context.get("energy", "Unknown")
 
-    base_system_prompt = f"""
-{COVEY_SYSTEM_PROMPT}
+    dynamic_context = BRAIN_CONTEXT.format(
+        current_summary=current_summary, focus=focus, energy=energy
+    )
+    history = BRAIN_MEMORY.context(user_id)
 
-You are a time-stewardship assistant, helping the user manage their calendar.
+    # Byte-stable prefix (instructions + history) first, per-request bits last
+    messages = [{"role": "system", "content": BRAIN_SYSTEM_PROMPT}]
+    messages += history
+    if system_override:
+        messages.append({"role": "system", "content": system_override})
+    messages.append({"role": "system", "content": dynamic_context})
+    messages.append({"role": "user", "content": user_message})
+    return user_id, user_message, messages
 
-Instructions:
-- If the user prompt includes an agenda (e.g. lines starting with 🗓️, ⏳, ✅), summarize that info directly.
-- Be concise and focused. Only offer reflective advice if the user asks for it.
-- Always respond with direct value **first** (agenda, event info, durations) before optional insights.
-- Never ignore or rephrase event summaries. Treat them as the user's source of truth.
-- Respond in plain English, not philosophical abstraction.
 
-Context:
-- Current Event: {current_summary}
-- Weekly Focus: {focus}
-- Energy Level: {energy}
-""".strip()
+def _save_turns(user_id, turns) -> None:
+    try:
+        for role, content in turns:
+            save_conversation_turn(user_id, role, content)
+    except Exception as e:
+        logging.warning(f"[brain] could not persist conversation turn: {e}")
 
-    # Chat history
-    history = get_recent_conversation(user_id)
 
-    # Build the messages array
-    messages = []
-    if system_override:
-        messages.append({"role": "system", "content": system_override})
-    messages.append({"role": "system", "content": base_system_prompt})
-    messages += history
-    messages.append({"role": "user", "content": user_message})
+def _remember(user_id, user_message: str, reply: str) -> None:
+    """In-memory history now; the DB write happens in the background."""
+    BRAIN_MEMORY.append(user_id, "user", user_message)
+    BRAIN_MEMORY.append(user_id, "assistant", reply)
+    turns = [("user", user_message), ("assistant", reply)]
+    fut = asyncio.get_running_loop().run_in_executor(_HISTORY_WRITER, _save_turns, user_id, turns)
+    _PENDING_WRITES.add(fut)
+    fut.add_done_callback(_PENDING_WRITES.discard)
 
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages
-    )
+
+async def flush_history() -> None:
+    """Wait for queued conversation writes (tests; bot.on_shutdown)."""
+    if _PENDING_WRITES:
+        await asyncio.gather(*list(_PENDING_WRITES), return_exceptions=True)
+
+
+async def conversational_brain(input_msg) -> str:
+    """
+    Accepts either:
+      - str: user message
+      - dict: {"system": str|None, "user": str|None}
+    """
+    user_id, user_message, messages = await _prepare_brain(input_msg)
+    if messages is None:
+        return _RESET_REPLY
+
+    response = await llm_client.chat(messages, model="gpt-4o", site="brain", user_id=user_id)
 
     reply = response.choices[0].message.content.strip()
 
     # Save convo
-    save_conversation_turn(user_id, "user", user_message)
-    save_conversation_turn(user_id, "assistant", reply)
+    _remember(user_id, user_message, reply)
+
+    return reply
+
+
+async def conversational_brain_stream(input_msg):
+    """
+    Same as conversational_brain() but yields text deltas as they arrive.
+    The full reply is saved to memory/DB once the stream completes.
+    """
+    user_id, user_message, messages = await _prepare_brain(input_msg)
+    if messages is None:
+        yield _RESET_REPLY
+        return
+
+    parts = []
+    async for delta in llm_client.chat_stream(messages, model="gpt-4o", site="brain_stream", user_id=user_id):
+        parts.append(delta)
+        yield delta
 
-    return reply
\ No newline at end of file
+    reply = "".join(parts).strip()
+    if reply:
+        _remember(user_id, user_message, reply)
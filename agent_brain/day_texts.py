@@ -0,0 +1,197 @@
+# ======================
+# agent_brain/day_texts.py
+# ======================
+"""
+Morning pre-generation of the day's boundary texts.
+
+Every start/mid/end line for today's segments and every before/during/after
+reminder for today's events is written in ONE structured-output LLM call and
+stored in the LLM text cache. Boundary handlers then read their line from the
+cache instantly; only items that are not cached yet (new or renamed blocks,
+a different tone) go to the LLM, so a later call happens only when the plan
+changes. The start/mid/end lines are only needed when WF0_LLM_TONE asks
+for LLM-written copy; by default those prompts come from tone_templates.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import beia_core.models.timebox as db
+import feature_flags as ff
+import llm_cache
+import llm_client
+from agent_brain.principles import COVEY_SYSTEM_PROMPT
+from gpt_agent import reminder_cache_key
+
+DAY_TEXTS_MODEL = os.getenv("DAY_TEXTS_MODEL", "gpt-4o")
+BATCH_MAX = int(os.getenv("DAY_TEXTS_BATCH_MAX", "80"))  # items per call; a normal day fits in one
+TEMPLATE_ID = "day_text.v1"
+
+FSM_KINDS = ("start", "mid", "end")
+REMINDER_PHASES = ("before", "during", "after")
+
+# What each line has to do; mirrors prompts.start_prompt / mid_prompt / end_prompt
+# and gpt_agent._reminder_prompt so cached and live texts read the same.
+_KIND_RULES = {
+    "start": "Start of the block. Secure an explicit Start, a short Snooze or a Skip. "
+             "Pairs with buttons: Start • 5m • Skip • Edit.",
+    "mid": "Midpoint heartbeat. Confirm progress or pivot/extend. "
+           "Pairs with buttons: Yes • +15m • +30m • Pivot.",
+    "end": "End of the block. Mark the outcome cleanly. "
+           "Pairs with buttons: Done • Need More • Didn’t Start.",
+    "before": "Reminder a few minutes before the event starts.",
+    "during": "Check-in around the middle of the event.",
+    "after": "Check-in just after the scheduled end.",
+}
+
+_TONE_RULES = {
+    "gentle": "warm, encouraging, no pressure",
+    "coach": "direct, upbeat, action-oriented",
+    "ds": "terse, firm, no fluff",
+}
+
+_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "day_texts",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "texts": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"id": {"type": "integer"}, "text": {"type": "string"}},
+                        "required": ["id", "text"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["texts"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+@dataclass(frozen=True)
+class TextItem:
+    key: str     # llm_cache key the handler will look up
+    kind: str    # start | mid | end | before | during | after
+    title: str
+    tone: str = ""
+
+
+def fsm_key(kind: str, title: str, tone: str) -> str:
+    return llm_cache.make_key(TEMPLATE_ID, title=title, phase=kind, tone=tone, model=DAY_TEXTS_MODEL)
+
+
+def items_for_day(segments: Iterable[Dict], reminder_titles: Iterable[str] = ()) -> List[TextItem]:
+    """Every text today's plan can need, deduplicated by cache key."""
+    items: Dict[str, TextItem] = {}
+    for seg in segments:
+        title = seg.get("title") or "This block"
+        tone = (seg.get("tone_at_start") or "gentle").lower()
+        for kind in FSM_KINDS:
+            key = fsm_key(kind, title, tone)
+            items.setdefault(key, TextItem(key, kind, title, tone))
+    for title in reminder_titles:
+        if not title:
+            continue
+        for phase in REMINDER_PHASES:
+            key = reminder_cache_key(title, phase)
+            items.setdefault(key, TextItem(key, phase, title))
+    return list(items.values())
+
+
+def missing(items: Sequence[TextItem]) -> List[TextItem]:
+    cache = llm_cache.get_cache()
+    return [it for it in items if cache.variant_count(it.key) == 0]
+
+
+def build_messages(items: Sequence[TextItem]) -> List[Dict[str, str]]:
+    rules = "\n".join(f"- {kind}: {rule}" for kind, rule in _KIND_RULES.items())
+    tones = "\n".join(f"- {tone}: {rule}" for tone, rule in _TONE_RULES.items())
+    system = (
+        f"{COVEY_SYSTEM_PROMPT}\n\n"
+        "You write the short Telegram lines a time-management companion sends during the day.\n"
+        "For every item write exactly one line (max ~20 words, at most one emoji). "
+        "Use the item's title verbatim. Return one entry per id.\n\n"
+        f"Kinds:\n{rules}\n\nTones (empty tone = neutral):\n{tones}"
+    )
+    payload = [{"id": i, "kind": it.kind, "title": it.title, "tone": it.tone} for i, it in enumerate(items)]
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": json.dumps({"items": payload}, ensure_ascii=False)},
+    ]
+
+
+def generate(items: Sequence[TextItem]) -> Dict[str, str]:
+    """One structured-output call for `items`; returns cache key -> text."""
+    if not items:
+        return {}
+    response = llm_client.chat_sync(
+        build_messages(items),
+        model=DAY_TEXTS_MODEL,
+        temperature=0.7,
+        response_format=_RESPONSE_FORMAT,
+        site="day_texts",
+    )
+    data = json.loads(response.choices[0].message.content or "{}")
+    out: Dict[str, str] = {}
+    for entry in data.get("texts") or []:
+        idx = entry.get("id")
+        text = (entry.get("text") or "").strip()
+        if isinstance(idx, int) and 0 <= idx < len(items) and text:
+            out[items[idx].key] = text
+    return out
+
+
+def precompute(segments: Iterable[Dict], reminder_titles: Iterable[str] = ()) -> int:
+    """Generate and cache whatever today's plan still lacks; returns how many texts were stored."""
+    todo = missing(items_for_day(segments, reminder_titles))
+    stored = 0
+    for i in range(0, len(todo), BATCH_MAX):
+        batch = todo[i:i + BATCH_MAX]
+        texts = generate(batch)
+        cache = llm_cache.get_cache()
+        for key, text in texts.items():
+            cache.put(key, text)
+        stored += len(texts)
+        if len(texts) < len(batch):
+            logging.info(f"[day_texts] {len(batch) - len(texts)} items came back empty; handlers will fall back")
+    return stored
+
+
+def lookup(kind: str, title: str, tone: str) -> Optional[str]:
+    """Precomputed start/mid/end line, or None (caller falls back to a live LLM call)."""
+    try:
+        return llm_cache.get_cache().get(fsm_key(kind, title, (tone or "gentle").lower()))
+    except Exception as e:
+        logging.warning(f"[day_texts] cache read failed: {e}")
+        return None
+
+
+def load_day_segments(day_start: dt.datetime, day_end: dt.datetime) -> List[Dict]:
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, title, tone_at_start FROM segments WHERE start_at >= %s AND start_at < %s",
+            (day_start, day_end),
+        )
+        return [{"id": r[0], "title": r[1], "tone_at_start": r[2]} for r in cur.fetchall()]
+
+
+def precompute_day(now: dt.datetime, events: Optional[Iterable[Dict]] = None) -> int:
+    """Morning stage: today's segments from the DB plus reminder titles from `events`."""
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    segments = []
+    if ff.enabled("WF0_LLM_TONE"):  # otherwise FSM prompts render from tone_templates
+        segments = load_day_segments(day_start, day_start + dt.timedelta(days=1))
+    titles = [ev.get("summary") for ev in (events or []) if ev.get("id")]
+    return precompute(segments, titles)
@@ -0,0 +1,188 @@
+# ======================
+# agent_brain/gating.py
+# ======================
+"""
+Quiet hours / Sabbath / OOO gating, compiled once into sorted suppression
+intervals for the coming week. Lookups are a bisect, and callers can ask for
+the next allowed instant so deferred nudges get re-queued instead of dropped.
+"""
+from __future__ import annotations
+
+import bisect
+import datetime as dt
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+HORIZON_DAYS = 7
+
+Interval = Tuple[dt.datetime, dt.datetime, str]
+
+
+def _parse_hhmm(s: str) -> dt.time:
+    h, m = map(int, s.strip().split(":"))
+    return dt.time(h, m)
+
+
+def _quiet_intervals(day0: dt.datetime, days: int, spec: str) -> List[Interval]:
+    if not spec:
+        return []
+    start_s, end_s = spec.split("-")
+    start_t, end_t = _parse_hhmm(start_s), _parse_hhmm(end_s)
+    out: List[Interval] = []
+    # start one day early so a window wrapping past midnight covers day0's morning
+    for i in range(-1, days + 1):
+        d = (day0 + dt.timedelta(days=i)).date()
+        start = dt.datetime.combine(d, start_t, tzinfo=day0.tzinfo)
+        end = dt.datetime.combine(d, end_t, tzinfo=day0.tzinfo)
+        if end <= start:
+            end += dt.timedelta(days=1)  # wraps past midnight
+        out.append((start, end, "quiet"))
+    return out
+
+
+def _sabbath_intervals(day0: dt.datetime, days: int, day_name: str) -> List[Interval]:
+    day_name = (day_name or "").strip().lower()
+    if day_name not in WEEKDAYS:
+        return []
+    target = WEEKDAYS.index(day_name)
+    out: List[Interval] = []
+    for i in range(0, days + 1):
+        d = day0 + dt.timedelta(days=i)
+        if d.weekday() == target:
+            start = d.replace(hour=0, minute=0, second=0, microsecond=0)
+            out.append((start, start + dt.timedelta(days=1), "sabbath"))
+    return out
+
+
+def _merge(intervals: Iterable[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end, reason in sorted(intervals, key=lambda r: r[0]):
+        if merged and start <= merged[-1][1]:
+            p_start, p_end, p_reason = merged[-1]
+            if end > p_end:
+                merged[-1] = (p_start, end, p_reason if p_reason == reason else f"{p_reason}+{reason}")
+            continue
+        merged.append((start, end, reason))
+    return merged
+
+
+@dataclass(frozen=True)
+class GatingPolicy:
+    window_start: dt.datetime
+    window_end: dt.datetime
+    intervals: Tuple[Interval, ...] = ()
+    _starts: Tuple[dt.datetime, ...] = field(default=(), repr=False)
+
+    @classmethod
+    def compile(
+        cls,
+        now: dt.datetime,
+        *,
+        quiet_hours: str = "22:00-06:00",
+        sabbath_day: str = "",
+        ooo: Iterable[Tuple[dt.datetime, dt.datetime]] = (),
+        days: int = HORIZON_DAYS,
+    ) -> "GatingPolicy":
+        day0 = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        raw: List[Interval] = []
+        raw += _quiet_intervals(day0, days, quiet_hours)
+        raw += _sabbath_intervals(day0, days, sabbath_day)
+        raw += [(s, e, "ooo") for s, e in ooo if e > s]
+        merged = tuple(_merge(raw))
+        return cls(
+            window_start=day0,
+            window_end=day0 + dt.timedelta(days=days),
+            intervals=merged,
+            _starts=tuple(i[0] for i in merged),
+        )
+
+    def covers(self, at: dt.datetime) -> bool:
+        return self.window_start <= at < self.window_end
+
+    def _find(self, at: dt.datetime) -> Optional[Interval]:
+        i = bisect.bisect_right(self._starts, at) - 1
+        if i >= 0 and self.intervals[i][0] <= at < self.intervals[i][1]:
+            return self.intervals[i]
+        return None
+
+    def is_gated(self, at: dt.datetime) -> bool:
+        return self._find(at) is not None
+
+    def reason(self, at: dt.datetime) -> Optional[str]:
+        hit = self._find(at)
+        return hit[2] if hit else None
+
+    def next_allowed(self, at: dt.datetime) -> dt.datetime:
+        """`at` itself if not gated, else the end of the suppression interval covering it."""
+        hit = self._find(at)
+        return hit[1] if hit else at
+
+
+# ---------- per-user compiled policies ----------
+
+def _load_user_overrides() -> Dict[str, Dict]:
+    raw = os.getenv("GATING_USER_OVERRIDES", "").strip()
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+    except Exception as e:
+        print(f"[gating] ignoring malformed GATING_USER_OVERRIDES: {e}")
+        return {}
+
+
+_LOCK = threading.Lock()
+_POLICIES: Dict[Optional[str], GatingPolicy] = {}
+_OOO: List[Tuple[dt.datetime, dt.datetime]] = []
+_USER_OVERRIDES: Dict[str, Dict] = _load_user_overrides()
+
+
+def _settings_for(user_id: Optional[str]) -> Dict:
+    settings = {
+        "quiet_hours": os.getenv("QUIET_HOURS", "22:00-06:00"),
+        "sabbath_day": os.getenv("SABBATH_DAY", ""),
+    }
+    if user_id is not None:
+        settings.update({k: v for k, v in _USER_OVERRIDES.get(str(user_id), {}).items()
+                         if k in ("quiet_hours", "sabbath_day")})
+    return settings
+
+
+def policy_for(user_id: Optional[str] = None, now: Optional[dt.datetime] = None) -> GatingPolicy:
+    """Return the compiled policy for a user, recompiling only when `now` leaves its window."""
+    now = now or dt.datetime.now()
+    key = str(user_id) if user_id is not None else None
+    pol = _POLICIES.get(key)
+    if pol is not None and pol.covers(now) and pol.window_end - now > dt.timedelta(days=1):
+        return pol
+    with _LOCK:
+        pol = GatingPolicy.compile(now, ooo=list(_OOO), **_settings_for(key))
+        _POLICIES[key] = pol
+    return pol
+
+
+def invalidate() -> None:
+    with _LOCK:
+        _POLICIES.clear()
+
+
+def set_ooo(intervals: Iterable[Tuple[dt.datetime, dt.datetime]]) -> None:
+    """Replace the out-of-office intervals (from the calendar) and drop compiled policies."""
+    global _OOO
+    new = sorted((s, e) for s, e in intervals)
+    if new == _OOO:
+        return
+    _OOO = new
+    invalidate()
+
+
+def set_user_override(user_id: str, **settings) -> None:
+    """Per-user quiet_hours / sabbath_day override, e.g. set_user_override("42", quiet_hours="23:00-07:00")."""
+    with _LOCK:
+        _USER_OVERRIDES.setdefault(str(user_id), {}).update(settings)
+        _POLICIES.pop(str(user_id), None)
@@ -0,0 +1,250 @@
+# ======================
+# agent_brain/idempotency.py
+# ======================
+"""
+Idempotency for button presses and contract commands.
+
+A double tap on an inline button (wf0:, domain|, remind_again|) or a repeated
+"DONE <title>" would otherwise run the action twice: two calendar writes, two
+DB updates, two LLM replies. run_once() puts a key in front of the action:
+
+    (chat, callback data or normalized command, segment id, time bucket)
+
+The first request claims the key and runs. The replies it sends through the
+outbox are stored under the key. A duplicate inside the window gets the stored
+replies resent and skips every side effect. A duplicate that arrives while the
+first is still running is dropped. A failed run releases its key, so a retry
+goes through.
+
+Keys live in a bounded LRU with TTL (IDEMPOTENCY_BACKEND=memory, the default).
+With IDEMPOTENCY_BACKEND=db they go in Postgres, so several bot processes
+share one view.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import beia_core.models.timebox as db
+from agent_brain import outbox
+
+TTL_S = int(os.getenv("IDEMPOTENCY_TTL_S", "120"))
+BUCKET_S = int(os.getenv("IDEMPOTENCY_BUCKET_S", "60"))
+MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1024"))
+BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+
+# Contract / FSM verbs with side effects. Chat fallback and read-only questions
+# are never deduplicated: asking the same thing twice should get a fresh answer.
+IDEMPOTENT_ACTIONS = {
+    "done", "didnt_start", "need_more", "snooze", "drift", "pause",
+    "reschedule", "move_next", "skip",
+    "mark_done", "mark_missed", "extend_15", "extend_30", "snooze_segment", "pivot",
+    "confirm_start", "mid_yes", "schedule_more", "schedule_recovery",
+}
+
+PENDING = "pending"
+DONE = "done"
+
+
+def _norm(value) -> Any:
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().lower()
+    return value
+
+
+def normalize_command(parsed: Dict[str, Any]) -> str:
+    return json.dumps({k: _norm(v) for k, v in parsed.items()}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def make_key(chat_id, parsed: Dict[str, Any], *, source: Optional[str] = None,
+             bucket: Optional[int] = None, now: Optional[float] = None) -> str:
+    if bucket is None:
+        bucket = int((now if now is not None else time.time()) // BUCKET_S)
+    what = source if source is not None else normalize_command(parsed)
+    blob = "\x1f".join([str(chat_id), what, str(parsed.get("segment_id") or ""), str(bucket)])
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def eligible(parsed: Dict[str, Any], source: Optional[str] = None) -> bool:
+    """Callbacks always; typed commands only for verbs with side effects."""
+    return source is not None or parsed.get("action") in IDEMPOTENT_ACTIONS
+
+
+class MemoryStore:
+    """Bounded LRU of key -> (state, replies, expires_at)."""
+
+    def __init__(self, *, ttl: int = TTL_S, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, Optional[List[Dict]], float]]" = OrderedDict()
+
+    def _live(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def claim(self, key: str) -> Tuple[bool, Optional[str], Optional[List[Dict]]]:
+        """(claimed, state, replies): claimed=False means a live entry already exists."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is not None:
+                return False, entry[0], entry[1]
+            self._entries[key] = (PENDING, None, now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True, None, None
+
+    def peek(self, key: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            return (entry[0], entry[1]) if entry else (None, None)
+
+    def complete(self, key: str, replies: List[Dict]) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (DONE, replies, self._entries[key][2])
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DbStore:
+    """Same interface, in Postgres; the primary key makes claim() atomic across processes."""
+
+    def __init__(self, *, ttl: int = TTL_S):
+        self.ttl = ttl
+        self._schema_ready = False
+
+    def ensure_schema(self) -> None:
+        if self._schema_ready:
+            return
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key        TEXT        PRIMARY KEY,
+                    state      TEXT        NOT NULL,
+                    replies    TEXT,
+                    expires_at TIMESTAMPTZ NOT NULL
+                )
+            """)
+            conn.commit()
+        self._schema_ready = True
+
+    def claim(self, key: str) -> Tuple[bool, Optional[str], Optional[List[Dict]]]:
+        self.ensure_schema()
+        expires = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=self.ttl)
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM idempotency_keys WHERE expires_at <= NOW()")
+            cur.execute(
+                "INSERT INTO idempotency_keys (key, state, expires_at) VALUES (%s, %s, %s) "
+                "ON CONFLICT (key) DO NOTHING",
+                (key, PENDING, expires),
+            )
+            claimed = cur.rowcount == 1
+            row = None
+            if not claimed:
+                cur.execute("SELECT state, replies FROM idempotency_keys WHERE key = %s", (key,))
+                row = cur.fetchone()
+            conn.commit()
+        if claimed or row is None:
+            return claimed, None, None
+        return False, row[0], json.loads(row[1]) if row[1] else None
+
+    def peek(self, key: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        self.ensure_schema()
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT state, replies FROM idempotency_keys WHERE key = %s AND expires_at > NOW()", (key,))
+            row = cur.fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def complete(self, key: str, replies: List[Dict]) -> None:
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE idempotency_keys SET state = %s, replies = %s WHERE key = %s",
+                        (DONE, json.dumps(replies, ensure_ascii=False), key))
+            conn.commit()
+
+    def release(self, key: str) -> None:
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM idempotency_keys WHERE key = %s", (key,))
+            conn.commit()
+
+
+_STORE = None
+
+
+def get_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = DbStore() if BACKEND == "db" else MemoryStore()
+    return _STORE
+
+
+def set_store(store) -> None:
+    global _STORE
+    _STORE = store
+
+
+async def _store_call(store, method: str, *args):
+    fn = getattr(store, method)
+    if isinstance(store, DbStore):  # keep Postgres round trips off the event loop
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def _replay(bot, chat_id, replies: Optional[List[Dict]]) -> None:
+    for r in replies or []:
+        await outbox.send(bot, chat_id, r["text"], parse_mode=r.get("parse_mode"))
+
+
+async def run_once(chat_id, parsed: Dict[str, Any], fn: Callable[[], Awaitable[Any]], *,
+                   bot, source: Optional[str] = None) -> Any:
+    """
+    Run `fn` unless the same request ran in this or the previous time bucket.
+    Duplicates get the first run's replies resent and return None.
+    """
+    if not chat_id or not eligible(parsed, source):
+        return await fn()
+
+    store = get_store()
+    bucket = int(time.time() // BUCKET_S)
+    # A double tap can straddle a bucket boundary: the previous bucket counts too
+    state, replies = await _store_call(store, "peek", make_key(chat_id, parsed, source=source, bucket=bucket - 1))
+    key = make_key(chat_id, parsed, source=source, bucket=bucket)
+    if state is None:
+        claimed, state, replies = await _store_call(store, "claim", key)
+        if claimed:
+            with outbox.capture() as sent:
+                try:
+                    result = await fn()
+                except BaseException:
+                    await _store_call(store, "release", key)
+                    raise
+            await _store_call(store, "complete", key, sent)
+            return result
+
+    action = parsed.get("action")
+    if state == DONE:
+        logging.info(f"[idempotency] duplicate {action} in chat {chat_id}; replaying {len(replies or [])} replies")
+        await _replay(bot, chat_id, replies)
+    else:
+        logging.info(f"[idempotency] duplicate {action} in chat {chat_id} while the first is running; dropped")
+    return None
@@ -0,0 +1,84 @@
+# ======================
+# agent_brain/job_store.py
+# ======================
+"""
+Persistent store for one-off segment boundary jobs (midpoint ticks etc.).
+
+Rows are keyed by (seg_id, kind) so re-scheduling the same boundary is an
+upsert, never an append. The scheduler mirrors these rows into APScheduler
+with a stable job id and restores them at startup.
+"""
+import datetime as dt
+import logging
+from typing import List, Optional, Tuple
+
+import beia_core.models.timebox as db
+
+_SCHEMA_READY = False
+
+
+def ensure_schema() -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS boundary_jobs (
+                seg_id     TEXT        NOT NULL,
+                kind       TEXT        NOT NULL,
+                run_at     TIMESTAMPTZ NOT NULL,
+                expires_at TIMESTAMPTZ,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (seg_id, kind)
+            )
+        """)
+        cur.execute("ALTER TABLE boundary_jobs ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ")
+        conn.commit()
+    _SCHEMA_READY = True
+
+
+def job_id(seg_id: str, kind: str) -> str:
+    """Stable APScheduler id for a (segment, boundary kind) pair."""
+    return f"seg:{seg_id}:{kind}"
+
+
+def upsert_job(seg_id: str, kind: str, run_at: dt.datetime,
+               expires_at: Optional[dt.datetime] = None) -> None:
+    """expires_at: past this instant the job is pointless (e.g. segment end), so deferral stops."""
+    ensure_schema()
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO boundary_jobs (seg_id, kind, run_at, expires_at)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (seg_id, kind)
+            DO UPDATE SET run_at = EXCLUDED.run_at, expires_at = EXCLUDED.expires_at, updated_at = NOW()
+        """, (seg_id, kind, run_at, expires_at))
+        conn.commit()
+
+
+def delete_job(seg_id: str, kind: str) -> None:
+    ensure_schema()
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM boundary_jobs WHERE seg_id=%s AND kind=%s", (seg_id, kind))
+        conn.commit()
+
+
+def load_pending(now: dt.datetime) -> List[Tuple[str, str, dt.datetime, Optional[dt.datetime]]]:
+    """
+    Return [(seg_id, kind, run_at, expires_at)] for jobs that have not fired yet and
+    prune anything already in the past (those boundaries are handled by the
+    per-minute observer tick).
+    """
+    ensure_schema()
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM boundary_jobs WHERE run_at <= %s", (now,))
+        pruned = cur.rowcount
+        cur.execute(
+            "SELECT seg_id, kind, run_at, expires_at FROM boundary_jobs WHERE run_at > %s ORDER BY run_at",
+            (now,),
+        )
+        rows = cur.fetchall()
+        conn.commit()
+    if pruned:
+        logging.info(f"[JobStore] pruned {pruned} stale boundary jobs")
+    return [(r[0], r[1], r[2], r[3]) for r in rows]
@@ -0,0 +1,197 @@
+# ======================
+# agent_brain/memory.py
+# ======================
+"""
+Per-user conversation memory, trimmed by token budget instead of message count.
+
+Recent turns are kept verbatim up to `budget_tokens`. Turns that fall off
+the front are folded into a rolling summary by an async summarizer, off the
+request path, so the prompt stays roughly the same size however long the
+conversation runs. The assembled context is cached per user and rebuilt
+only when a turn is added or the summary changes.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import llm_client
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1200"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("MEMORY_SUMMARY_TOKENS", "250"))
+SUMMARY_MODEL = os.getenv("MEMORY_SUMMARY_MODEL", "gpt-4o-mini")
+
+_MSG_OVERHEAD = 4  # role/separators per message
+
+Message = Dict[str, str]
+Summarizer = Callable[[str, List[Message]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token); good enough for budgeting."""
+    return (len(text or "") + 3) // 4
+
+
+def message_tokens(msg: Message) -> int:
+    return estimate_tokens(msg.get("content") or "") + _MSG_OVERHEAD
+
+
+class ConversationMemory:
+    def __init__(self, budget_tokens: int = MEMORY_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+        self.summary = ""
+        self.turns: Deque[Message] = deque()
+        self.tokens = 0
+        self._context: Optional[List[Message]] = None
+        self.fold_lock: Optional[asyncio.Lock] = None  # serializes summary updates
+
+    def add(self, role: str, content: str) -> List[Message]:
+        """Append a turn; returns the turns evicted to stay within budget (oldest first)."""
+        msg = {"role": role, "content": content or ""}
+        self.turns.append(msg)
+        self.tokens += message_tokens(msg)
+        evicted: List[Message] = []
+        # always keep the newest turn, even if it alone is over budget
+        while self.tokens > self.budget_tokens and len(self.turns) > 1:
+            old = self.turns.popleft()
+            self.tokens -= message_tokens(old)
+            evicted.append(old)
+        self._context = None
+        return evicted
+
+    def set_summary(self, summary: str) -> None:
+        self.summary = (summary or "").strip()
+        self._context = None
+
+    def context(self) -> List[Message]:
+        """Summary (if any) + recent turns; cached until the next change."""
+        if self._context is None:
+            ctx: List[Message] = []
+            if self.summary:
+                ctx.append({"role": "system", "content": f"Earlier in this conversation: {self.summary}"})
+            ctx.extend(dict(m) for m in self.turns)
+            self._context = ctx
+        return list(self._context)
+
+    def context_tokens(self) -> int:
+        return self.tokens + (estimate_tokens(self.summary) + _MSG_OVERHEAD if self.summary else 0)
+
+
+class MemoryStore:
+    """
+    user_id -> ConversationMemory. With a summarizer, evicted turns are folded
+    into the summary in a background task; without one they are just dropped.
+    """
+
+    def __init__(self, *, budget_tokens: int = MEMORY_TOKEN_BUDGET,
+                 summarizer: Optional[Summarizer] = None):
+        self.budget_tokens = budget_tokens
+        self.summarizer = summarizer
+        self._users: Dict[str, ConversationMemory] = {}
+        self._loaded: set = set()   # users whose stored history has been seeded
+        self._lock = threading.Lock()
+        self._tasks: set = set()
+
+    def _memory(self, user_id) -> ConversationMemory:
+        key = str(user_id)
+        with self._lock:
+            mem = self._users.get(key)
+            if mem is None:
+                mem = self._users[key] = ConversationMemory(self.budget_tokens)
+            return mem
+
+    def has(self, user_id) -> bool:
+        return str(user_id) in self._users
+
+    def is_loaded(self, user_id) -> bool:
+        return str(user_id) in self._loaded
+
+    def load(self, user_id, loader: Callable[[], List[Message]]) -> None:
+        """
+        Seed a user's memory once (e.g. from the DB); later calls are no-ops.
+        Turns appended before a successful load (an earlier load failed) are
+        kept after the loaded history unless the history already ends with them.
+        """
+        if self.is_loaded(user_id):
+            return
+        history = loader() or []
+        key = str(user_id)
+        with self._lock:
+            old = self._users.get(key)
+            mem = self._users[key] = ConversationMemory(self.budget_tokens)
+            self._loaded.add(key)
+        recent = [(m["role"], m["content"]) for m in (old.turns if old else [])]
+        tail = [(m.get("role", "user"), m.get("content") or "") for m in history[len(history) - len(recent):]] if recent else []
+        if old is not None:
+            mem.set_summary(old.summary)
+        evicted: List[Message] = []
+        for m in history:
+            evicted += mem.add(m.get("role", "user"), m.get("content") or "")
+        if recent and tail != recent:
+            for role, content in recent:
+                evicted += mem.add(role, content)
+        self._fold(user_id, evicted)
+
+    def append(self, user_id, role: str, content: str) -> None:
+        self._fold(user_id, self._memory(user_id).add(role, content))
+
+    def context(self, user_id) -> List[Message]:
+        return self._memory(user_id).context()
+
+    def clear(self, user_id=None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+                self._loaded.clear()
+            else:
+                self._users.pop(str(user_id), None)
+                self._loaded.discard(str(user_id))
+
+    def _fold(self, user_id, evicted: List[Message]) -> None:
+        if not evicted or self.summarizer is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logging.info("[memory] no running loop; dropping %d turns without summarizing", len(evicted))
+            return
+        task = loop.create_task(self._summarize(user_id, evicted))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, user_id, evicted: List[Message]) -> None:
+        mem = self._memory(user_id)
+        if mem.fold_lock is None:
+            mem.fold_lock = asyncio.Lock()
+        async with mem.fold_lock:
+            try:
+                summary = await self.summarizer(mem.summary, evicted)
+            except Exception as e:
+                logging.warning(f"[memory] summarizer failed: {e}")
+                return
+            if self.has(user_id):
+                mem.set_summary(summary)
+
+    async def drain(self) -> None:
+        """Wait for pending summaries (tests / shutdown)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+async def llm_summarizer(previous: str, turns: List[Message]) -> str:
+    """Fold `turns` into `previous` with a small model (shared pooled client)."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    messages = [
+        {"role": "system", "content": (
+            "You maintain a running summary of a chat between a user and their time-management assistant. "
+            f"Merge the new turns into the summary. Keep facts, commitments, preferences and open questions. "
+            f"At most {SUMMARY_TOKEN_BUDGET * 3 // 4} words. Reply with the summary only."
+        )},
+        {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"},
+    ]
+    resp = await llm_client.chat(messages, model=SUMMARY_MODEL, temperature=0.2, site="memory_summary")
+    return resp.choices[0].message.content.strip()
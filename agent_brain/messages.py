@@ -4,6 +4,7 @@ import datetime as dt
 from typing import Optional, Dict, List, Any
 from beia_core.models.enums import Domain
 from feature_flags import ff_is_enabled
+from agent_brain import tone_templates
 
 def build_domain_picker(event_id: str) -> Dict[str, Any]:
     """Chat-native domain picker.
@@ -109,14 +110,6 @@ def _cb(seg_id: str, code: str, arg: Optional[str] = None) -> str:
     # Still returns a stable token, but routers should prefer typed commands.
     return f"{CB_PREFIX}|{seg_id}|{code}" + (f"|{arg}" if arg else "")
 
-def _tone_copy(tone: str, gentle: str, coach: str, ds: str, ds_on: bool) -> str:
-    tone = (tone or "gentle").lower()
-    if tone == "ds" and ds_on:
-        return ds
-    if tone == "coach":
-        return coach
-    return gentle
-
 # ---------- START PROMPT ----------
 def build_start_message(
     seg_id: str,
@@ -135,13 +128,7 @@ def build_start_message(
         subtitle.append(f"Theme: {theme}")
     meta = f" — {' • '.join(subtitle)}" if subtitle else ""
 
-    text = _tone_copy(
-        tone,
-        gentle=f"Ready to start *{title}*{meta}?",
-        coach=f"Starting *{title}*{meta}. This matters — shall we begin?",
-        ds=f"You're late to *{title}*{meta}. Starting now — confirm.",
-        ds_on=ds_on,
-    )
+    text = tone_templates.render("start", tone, ds_on=ds_on, title=title, meta=meta)
 
     return {
         "kind": "scheduled",
@@ -161,13 +148,7 @@ def build_mid_message(
 ) -> Dict[str, Any]:
     """Chat-native midpoint prompt payload."""
     ds_on = ff_is_enabled("WF0_DS_MODE", user_id)
-    text = _tone_copy(
-        tone,
-        gentle=f"Still on *{title}*?",
-        coach=f"Halfway through *{title}*. On track to finish?",
-        ds=f"Mark status for *{title}*: DONE • DIDNT START • NEED MORE",
-        ds_on=ds_on,
-    )
+    text = tone_templates.render("mid", tone, ds_on=ds_on, title=title)
 
     return {
         "kind": "noted",
@@ -190,13 +171,7 @@ def build_end_message(
 ) -> Dict[str, Any]:
     """Chat-native end prompt payload."""
     ds_on = ff_is_enabled("WF0_DS_MODE", user_id)
-    text = _tone_copy(
-        tone,
-        gentle=f"Wrap up *{title}*?",
-        coach=f"Did we finish *{title}*? I can reschedule if not.",
-        ds=f"*{title}* ended — DONE • DIDNT START • NEED MORE",
-        ds_on=ds_on,
-    )
+    text = tone_templates.render("end", tone, ds_on=ds_on, title=title)
 
     return {
         "kind": "noted",
@@ -215,7 +190,7 @@ def build_drift_message(seg_id: str, current_title: str) -> Dict[str, Any]:
     return {
         "kind": "noted",
         "delta": {"title": current_title, "segment_id": seg_id, "status": "drift"},
-        "text": f"You're doing *{current_title}* instead. What do you want to do?",
+        "text": tone_templates.render("drift", "gentle", title=current_title),
         "options": [
             "KEEP AS IS",
             "SHIFT",
@@ -234,13 +209,7 @@ def build_free_time_message(
     """Chat-native free-time prompt payload."""
     ds_on = ff_is_enabled("WF0_DS_MODE", user_id)
     hint = f" — *{theme_hint}*" if theme_hint else ""
-    text = _tone_copy(
-        tone,
-        gentle=f"You've got {minutes}m free. Use it for:{hint}",
-        coach=f"Let's claim this {minutes}m gap. Pick one:{hint}",
-        ds=f"Idle {minutes}m detected. Choose now:{hint}",
-        ds_on=ds_on,
-    )
+    text = tone_templates.render("free_time", tone, ds_on=ds_on, minutes=minutes, hint=hint)
 
     return {
         "kind": "noted",
@@ -0,0 +1,347 @@
+# ======================
+# agent_brain/outbox.py
+# ======================
+"""
+Central outbound queue for Telegram messages.
+
+Every send goes through one queue per chat, paced by a per-chat token bucket
+(Telegram allows about one message per second per chat) and a global bucket
+(about 30 messages per second per bot). A RetryAfter from Telegram pauses
+sending for the time it asks for, and the message is retried. Messages for
+the same chat queued inside one `coalesce()` block (one scheduler tick) are
+merged into a single message. Queue delay (enqueue -> first send attempt) is
+measured for stats().
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import logging
+import os
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from telegram.error import BadRequest, RetryAfter
+
+PER_CHAT_RATE = float(os.getenv("OUTBOX_PER_CHAT_RATE", "1"))      # msgs/s per chat
+PER_CHAT_BURST = int(os.getenv("OUTBOX_PER_CHAT_BURST", "3"))
+GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))         # msgs/s per bot
+GLOBAL_BURST = int(os.getenv("OUTBOX_GLOBAL_BURST", "25"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "3"))
+MERGE_SEPARATOR = "\n\n"
+MAX_TEXT_LEN = 4096  # Telegram's limit; merging never builds a longer message
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass
+class OutMessage:
+    bot: Any
+    chat_id: Any
+    text: str
+    parse_mode: Optional[str] = None
+    reply_markup: Any = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    merged: int = 1
+    future: Optional[asyncio.Future] = None
+    on_sent: List[Callable[[], Any]] = field(default_factory=list)
+    on_failed: List[Callable[[], Any]] = field(default_factory=list)
+
+
+def merge(messages: List[OutMessage]) -> List[OutMessage]:
+    """
+    Merge consecutive messages per chat into one. A message with a keyboard
+    closes its group (the keyboard stays on the merged text); a different
+    parse_mode, or a text that would push the group past MAX_TEXT_LEN,
+    starts a new group.
+    """
+    out: List[OutMessage] = []
+    open_group: Dict[Any, OutMessage] = {}
+    for m in messages:
+        key = str(m.chat_id)
+        g = open_group.get(key)
+        if (g is not None and g.parse_mode == m.parse_mode and g.bot is m.bot
+                and len(g.text) + len(MERGE_SEPARATOR) + len(m.text) <= MAX_TEXT_LEN):
+            g.text = f"{g.text}{MERGE_SEPARATOR}{m.text}"
+            g.reply_markup = m.reply_markup
+            g.merged += 1
+            g.enqueued_at = min(g.enqueued_at, m.enqueued_at)
+            g.on_sent.extend(m.on_sent)
+            g.on_failed.extend(m.on_failed)
+        else:
+            g = OutMessage(m.bot, m.chat_id, m.text, m.parse_mode, m.reply_markup, m.enqueued_at,
+                           on_sent=list(m.on_sent), on_failed=list(m.on_failed))
+            out.append(g)
+            open_group[key] = g
+        if m.reply_markup is not None:
+            open_group.pop(key, None)
+    return out
+
+
+_BATCH: contextvars.ContextVar[Optional[List[OutMessage]]] = contextvars.ContextVar("outbox_batch", default=None)
+# Set by capture(): every text sent from this context is also appended here (idempotency replays)
+_CAPTURE: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar("outbox_capture", default=None)
+
+
+class Outbox:
+    def __init__(self, *, per_chat_rate: float = PER_CHAT_RATE, per_chat_burst: int = PER_CHAT_BURST,
+                 global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, Deque[OutMessage]] = {}
+        self._in_flight: set = set()
+        self._paused_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+        self.delays: Deque[float] = deque(maxlen=1000)
+        self.counters = {"sent": 0, "merged": 0, "retries": 0, "failed": 0}
+
+    # ---------- public API ----------
+
+    async def send(self, bot, chat_id, text, *, parse_mode=None, reply_markup=None, on_sent=None,
+                   on_failed=None, record_reply=True):
+        """
+        Queue a message. Outside coalesce() this waits for delivery and returns
+        the sent Message; inside, it returns None at once and the message goes
+        out (merged per chat) when the block ends. `on_sent` (sync or async,
+        no arguments) runs only once the message was actually delivered;
+        `on_failed` runs once delivery was given up. record_reply=False keeps
+        the text out of capture() (a streamed message records its final text).
+        """
+        if record_reply:
+            record(text, parse_mode)
+        msg = OutMessage(bot, chat_id, text, parse_mode, reply_markup,
+                         on_sent=[on_sent] if on_sent else [], on_failed=[on_failed] if on_failed else [])
+        batch = _BATCH.get()
+        if batch is not None:
+            batch.append(msg)
+            return None
+        self._ensure_loop()
+        msg.future = self._loop.create_future()
+        self._enqueue([msg])
+        return await msg.future
+
+    @contextlib.asynccontextmanager
+    async def coalesce(self):
+        """Collect sends made inside the block; merge them per chat on exit."""
+        if _BATCH.get() is not None:  # nested: the outer block flushes
+            yield
+            return
+        token = _BATCH.set([])
+        try:
+            yield
+        finally:
+            batch = _BATCH.get()
+            _BATCH.reset(token)
+            if batch:
+                self._ensure_loop()
+                merged = merge(batch)
+                self.counters["merged"] += len(batch) - len(merged)
+                self._enqueue(merged)
+
+    async def drain(self) -> None:
+        """Wait until everything queued so far has been sent (tests / shutdown)."""
+        while self._worker is not None and not self._worker.done():
+            await asyncio.wait({self._worker})
+
+    def stats(self) -> Dict[str, Any]:
+        delays = sorted(self.delays)
+        n = len(delays)
+        return {
+            **self.counters,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "delay_ms_p50": round(statistics.median(delays) * 1000, 1) if n else 0.0,
+            "delay_ms_p95": round(delays[max(0, int(n * 0.95) - 1)] * 1000, 1) if n else 0.0,
+            "delay_ms_max": round(delays[-1] * 1000, 1) if n else 0.0,
+        }
+
+    # ---------- internals ----------
+
+    def _ensure_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # new event loop (restart / tests): drop state bound to the old one
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._worker = None
+            self._queues.clear()
+            self._in_flight.clear()
+            self._tasks = set()
+
+    def _enqueue(self, messages: List[OutMessage]) -> None:
+        for m in messages:
+            self._queues.setdefault(str(m.chat_id), deque()).append(m)
+        self._wake.set()
+        if self._worker is None or self._worker.done():
+            self._worker = self._loop.create_task(self._run())
+
+    def _bucket(self, chat: str) -> TokenBucket:
+        b = self._buckets.get(chat)
+        if b is None:
+            b = self._buckets[chat] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return b
+
+    def _pick(self, now: float):
+        """(chat, wait_s) for the chat that can send soonest; in-flight chats keep their order."""
+        best = None
+        for chat, q in self._queues.items():
+            if not q or chat in self._in_flight:
+                continue
+            wait = self._bucket(chat).wait_time(now)
+            if best is None or wait < best[1]:
+                best = (chat, wait)
+        return best
+
+    async def _run(self) -> None:
+        """Worker: runs while there is anything queued or in flight, then exits."""
+        while True:
+            now = time.monotonic()
+            pick = self._pick(now)
+            if pick is None:
+                if not self._in_flight and not any(self._queues.values()):
+                    return
+                await self._sleep(None)
+                continue
+            chat, wait = pick
+            wait = max(wait, self.global_bucket.wait_time(now), self._paused_until - now)
+            if wait > 0:
+                await self._sleep(wait)
+                continue
+            self._bucket(chat).take(now)
+            self.global_bucket.take(now)
+            msg = self._queues[chat].popleft()
+            self._in_flight.add(chat)
+            task = self._loop.create_task(self._deliver(chat, msg))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _sleep(self, timeout: Optional[float]) -> None:
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _call(self, msg: OutMessage, parse_mode):
+        kwargs = {"chat_id": msg.chat_id, "text": msg.text, "parse_mode": parse_mode}
+        if msg.reply_markup is not None:
+            kwargs["reply_markup"] = msg.reply_markup
+        res = msg.bot.send_message(**kwargs)
+        return await res if inspect.isawaitable(res) else res
+
+    async def _deliver(self, chat: str, msg: OutMessage) -> None:
+        if msg.attempts == 0:
+            self.delays.append(time.monotonic() - msg.enqueued_at)
+        msg.attempts += 1
+        try:
+            try:
+                result = await self._call(msg, msg.parse_mode)
+            except BadRequest:
+                if not msg.parse_mode:
+                    raise
+                result = await self._call(msg, None)  # Markdown rejected: send as plain text
+        except RetryAfter as e:
+            delay = getattr(e, "retry_after", 1) or 1
+            delay = delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            if msg.attempts < MAX_ATTEMPTS:
+                self.counters["retries"] += 1
+                self._queues.setdefault(chat, deque()).appendleft(msg)
+            else:
+                self._fail(msg, e)
+                await self._run_callbacks(msg, msg.on_failed)
+        except Exception as e:
+            self._fail(msg, e)
+            await self._run_callbacks(msg, msg.on_failed)
+        else:
+            self.counters["sent"] += 1
+            if msg.future is not None and not msg.future.done():
+                msg.future.set_result(result)
+            await self._run_callbacks(msg, msg.on_sent)
+        finally:
+            self._in_flight.discard(chat)
+            self._wake.set()
+
+    async def _run_callbacks(self, msg: OutMessage, callbacks: List[Callable[[], Any]]) -> None:
+        for cb in callbacks:
+            try:
+                res = cb()
+                if inspect.isawaitable(res):
+                    await res
+            except Exception as e:
+                logging.warning(f"[outbox] delivery callback for {msg.chat_id} failed: {e}")
+
+    def _fail(self, msg: OutMessage, exc: BaseException) -> None:
+        self.counters["failed"] += 1
+        if msg.future is not None and not msg.future.done():
+            msg.future.set_exception(exc)
+        else:
+            logging.warning(f"[outbox] dropped message to {msg.chat_id}: {exc}")
+
+
+OUTBOX = Outbox()
+
+
+async def send(bot, chat_id, text, *, parse_mode=None, reply_markup=None, on_sent=None, on_failed=None,
+               record_reply=True):
+    return await OUTBOX.send(bot, chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup,
+                             on_sent=on_sent, on_failed=on_failed, record_reply=record_reply)
+
+
+def coalesce():
+    return OUTBOX.coalesce()
+
+
+def in_batch() -> bool:
+    """True inside a coalesce() block, where sends return before delivery."""
+    return _BATCH.get() is not None
+
+
+def stats() -> Dict[str, Any]:
+    return OUTBOX.stats()
+
+
+@contextlib.contextmanager
+def capture():
+    """Collect {"text", "parse_mode"} for every reply sent inside the block."""
+    replies: List[Dict[str, Any]] = []
+    token = _CAPTURE.set(replies)
+    try:
+        yield replies
+    finally:
+        _CAPTURE.reset(token)
+
+
+def record(text: str, parse_mode: Optional[str] = None) -> None:
+    """Note a reply that bypassed the queue (e.g. a streamed message) for capture()."""
+    captured = _CAPTURE.get()
+    if captured is not None:
+        captured.append({"text": text, "parse_mode": parse_mode})
@@ -8,7 +8,8 @@ from agent_brain.principles import COVEY_SYSTEM_PROMPT
 # ----------------------------
 # Legacy function (unchanged)
 # ----------------------------
-from gpt_agent import fallback_reply
+from gpt_agent import conversation_reply
+import llm_cache
 
 def generate_followup_nudge(drift, suggestion):
     """Legacy prompt used by older parts of the agent.
@@ -33,7 +34,9 @@ Respond in one short paragraph (<= 2 sentences).
 """
 
     full_prompt = COVEY_SYSTEM_PROMPT + "\n" + user_prompt
-    txt = fallback_reply(full_prompt) or ""
+    # Same missed title → cached variants; an LLM failure falls through to the hardening below
+    key = llm_cache.make_key("followup_nudge.v1", title=summary, model="gpt-4o")
+    txt = llm_cache.cached_text(key, lambda: conversation_reply(full_prompt), fallback=lambda: "") or ""
 
     # --- Contract hardening (deterministic) ---
     low = txt.lower()
@@ -0,0 +1,188 @@
+# ======================
+# agent_brain/reconcile.py
+# ======================
+"""
+Diff-based calendar → segments reconcile.
+
+Each calendar event is normalized and fingerprinted; only segments whose
+fingerprint changed are written. Inserts/updates go out as one bulk upsert,
+stale rows as one bulk delete, both inside a single transaction.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from psycopg2.extras import execute_values
+
+import beia_core.models.timebox as db
+import calendar_client as cal
+
+_SCHEMA_READY = False
+
+_FINGERPRINT_FIELDS = ("title", "type", "rigidity", "start_at", "end_at", "location")
+
+
+def ensure_schema() -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("ALTER TABLE segments ADD COLUMN IF NOT EXISTS fingerprint TEXT")
+        conn.commit()
+    _SCHEMA_READY = True
+
+
+def segment_id_for_event(event_id: str) -> str:
+    # keep in line with calendar_client.create_event / observer
+    return f"gcal:{event_id}"
+
+
+def normalize_event(ev: Dict, tz) -> Optional[Dict]:
+    """Calendar event -> segment doc, or None for all-day / malformed events."""
+    start_str = (ev.get("start") or {}).get("dateTime")
+    end_str = (ev.get("end") or {}).get("dateTime")
+    if not start_str or not end_str or not ev.get("id"):
+        return None
+    # Stored rigidity wins; meetings default to firm, everything else soft
+    rigidity = cal._explicit_rigidity_from_event(ev)
+    if not rigidity:
+        rigidity = "firm" if ev.get("attendees") or ev.get("hangoutLink") else "soft"
+    return {
+        "id": segment_id_for_event(ev["id"]),
+        "type": "scheduled",
+        "title": ev.get("summary") or "Untitled",
+        "rigidity": rigidity.lower(),
+        "start_at": dt.datetime.fromisoformat(start_str).astimezone(tz),
+        "end_at": dt.datetime.fromisoformat(end_str).astimezone(tz),
+        "location": (ev.get("location") or "").strip() or None,
+        "tz": str(tz),
+    }
+
+
+def fingerprint(seg: Dict) -> str:
+    canon = {}
+    for k in _FINGERPRINT_FIELDS:
+        v = seg.get(k)
+        canon[k] = v.isoformat() if isinstance(v, dt.datetime) else v
+    blob = json.dumps(canon, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ReconcilePlan:
+    inserts: List[Dict] = field(default_factory=list)
+    updates: List[Dict] = field(default_factory=list)
+    deletes: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    segments: List[Dict] = field(default_factory=list)   # full normalized day, changed or not
+
+    @property
+    def changed(self) -> List[Dict]:
+        return self.inserts + self.updates
+
+
+@dataclass
+class ReconcileResult:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+    def __str__(self) -> str:
+        return (f"inserted={self.inserted} updated={self.updated} "
+                f"deleted={self.deleted} unchanged={self.unchanged}")
+
+
+def diff_segments(desired: Iterable[Dict], stored: Dict[str, Optional[str]],
+                  deletable: Iterable[str] = ()) -> ReconcilePlan:
+    """
+    desired:   normalized segment docs from the calendar
+    stored:    {seg_id: fingerprint} currently in the DB for the same window
+    deletable: stored ids that may be removed if absent from the calendar
+               (not yet started / closed)
+    """
+    plan = ReconcilePlan()
+    seen = set()
+    for seg in desired:
+        seg = dict(seg, fingerprint=fingerprint(seg))
+        seen.add(seg["id"])
+        plan.segments.append(seg)
+        if seg["id"] not in stored:
+            plan.inserts.append(seg)
+        elif stored[seg["id"]] != seg["fingerprint"]:
+            plan.updates.append(seg)
+        else:
+            plan.unchanged += 1
+    plan.deletes = [sid for sid in deletable if sid not in seen]
+    return plan
+
+
+def load_stored(day_start: dt.datetime, day_end: dt.datetime):
+    """Return ({seg_id: fingerprint}, [deletable ids]) for calendar-backed segments in the window."""
+    ensure_schema()
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, fingerprint, (end_status IS NULL AND start_confirmed_at IS NULL)
+              FROM segments
+             WHERE id LIKE 'gcal:%%'
+               AND type = 'scheduled'
+               AND start_at >= %s AND start_at < %s
+        """, (day_start, day_end))
+        rows = cur.fetchall()
+    stored = {r[0]: r[1] for r in rows}
+    deletable = [r[0] for r in rows if r[2]]
+    return stored, deletable
+
+
+def apply_plan(plan: ReconcilePlan) -> ReconcileResult:
+    result = ReconcileResult(
+        inserted=len(plan.inserts),
+        updated=len(plan.updates),
+        deleted=len(plan.deletes),
+        unchanged=plan.unchanged,
+    )
+    if not plan.changed and not plan.deletes:
+        return result
+
+    ensure_schema()
+    rows = [
+        (s["id"], s["type"], s["title"], s["rigidity"], s["start_at"], s["end_at"], s["tz"],
+         "gentle", s["fingerprint"])
+        for s in plan.changed
+    ]
+    with db.get_conn() as conn, conn.cursor() as cur:
+        if rows:
+            # tone_at_start is only seeded on insert; observer owns it afterwards
+            execute_values(cur, """
+                INSERT INTO segments (id, type, title, rigidity, start_at, end_at, tz, tone_at_start, fingerprint)
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE SET
+                    title       = EXCLUDED.title,
+                    rigidity    = EXCLUDED.rigidity,
+                    start_at    = EXCLUDED.start_at,
+                    end_at      = EXCLUDED.end_at,
+                    tz          = EXCLUDED.tz,
+                    fingerprint = EXCLUDED.fingerprint
+            """, rows)
+        if plan.deletes:
+            cur.execute("DELETE FROM segments WHERE id = ANY(%s)", (list(plan.deletes),))
+        conn.commit()
+    return result
+
+
+def reconcile_day(events: Iterable[Dict], day_start: dt.datetime, day_end: dt.datetime, tz):
+    """
+    Full pipeline for one day. Returns (ReconcilePlan, ReconcileResult) so the
+    caller can schedule follow-up work for changed segments only.
+    """
+    desired = [s for s in (normalize_event(ev, tz) for ev in events) if s]
+    stored, deletable = load_stored(day_start, day_end)
+    plan = diff_segments(desired, stored, deletable)
+    result = apply_plan(plan)
+    logging.info(f"[Reconcile] {result}")
+    return plan, result
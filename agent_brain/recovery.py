@@ -0,0 +1,252 @@
+# ======================
+# agent_brain/recovery.py
+# ======================
+"""
+Recovery-block placement for missed segments.
+
+Everything waiting in missed_queue is placed in one go: candidates are
+ordered by quadrant priority, each takes the best-scoring start inside the
+day's free gaps (energy window, earliness), the chosen window is carved out
+of the gaps, and the day's recovery budget caps how many get booked. The
+bookings go out as one calendar batch and one segments insert.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+import beia_core.models.timebox as db
+import calendar_client as cal
+from agent_brain import reconcile
+from agent_brain import state
+from agent_brain import timeline
+from agent_brain.quadrant_detector import detect_quadrant
+
+RECOVERY_BLOCKS_MAX = int(os.getenv("RECOVERY_BLOCKS_MAX", "3"))   # per day
+RECOVERY_BLOCK_MIN = int(os.getenv("RECOVERY_BLOCK_MIN", "15"))
+RECOVERY_BLOCK_MAX = int(os.getenv("RECOVERY_BLOCK_MAX", "60"))
+ENERGY_PEAK_HOURS = os.getenv("ENERGY_PEAK_HOURS", "09:00-12:00")
+SLOT_STEP_MIN = 15
+
+# Q1 must be recovered first; Q2 is the designed work we protect; Q3/Q4 only if room is left
+QUADRANT_WEIGHT = {"I": 3.0, "II": 2.0, "III": 1.0, "IV": 0.0}
+
+Window = Tuple[dt.datetime, dt.datetime]
+
+# Drain job, "recover" and "schedule more" can run at once; each batch must see the previous one's bookings
+_BATCH_LOCK = threading.Lock()
+
+
+@dataclass
+class Candidate:
+    seg_id: str
+    title: str
+    quadrant: str
+    duration_min: int
+
+
+@dataclass
+class Placement:
+    seg_id: str
+    title: str
+    start: dt.datetime
+    end: dt.datetime
+    score: float
+
+
+def _parse_peak(spec: str) -> Optional[Tuple[dt.time, dt.time]]:
+    try:
+        start_s, end_s = spec.split("-")
+        sh, sm = map(int, start_s.split(":"))
+        eh, em = map(int, end_s.split(":"))
+        return dt.time(sh, sm), dt.time(eh, em)
+    except Exception:
+        return None
+
+
+def candidate_from_segment(seg: Dict) -> Candidate:
+    minutes = int((seg["end_at"] - seg["start_at"]).total_seconds() // 60)
+    minutes = max(RECOVERY_BLOCK_MIN, min(RECOVERY_BLOCK_MAX, minutes))
+    title = seg.get("title") or "Untitled"
+    return Candidate(seg_id=seg["id"], title=title, quadrant=detect_quadrant(title), duration_min=minutes)
+
+
+def score_slot(cand: Candidate, start: dt.datetime, now: dt.datetime,
+               peak: Optional[Tuple[dt.time, dt.time]]) -> float:
+    score = QUADRANT_WEIGHT.get(cand.quadrant, 1.0)
+    if peak and peak[0] <= start.timetz().replace(tzinfo=None) < peak[1]:
+        # deep (Q2) work gets the most out of the energy window
+        score += 1.0 if cand.quadrant == "II" else 0.5
+    # sooner is better, fading over ~8h
+    hours_out = max(0.0, (start - now).total_seconds() / 3600)
+    score += max(0.0, 1.0 - hours_out / 8)
+    return score
+
+
+def _align(at: dt.datetime) -> dt.datetime:
+    at = at.replace(second=0, microsecond=0)
+    rem = at.minute % SLOT_STEP_MIN
+    return at + dt.timedelta(minutes=SLOT_STEP_MIN - rem) if rem else at
+
+
+def _carve(gaps: List[Window], start: dt.datetime, end: dt.datetime, pad: dt.timedelta) -> List[Window]:
+    out: List[Window] = []
+    for g_start, g_end in gaps:
+        if end + pad <= g_start or start - pad >= g_end:
+            out.append((g_start, g_end))
+            continue
+        if start - pad > g_start:
+            out.append((g_start, start - pad))
+        if end + pad < g_end:
+            out.append((end + pad, g_end))
+    return out
+
+
+def plan_placements(candidates: Sequence[Candidate], gaps: Iterable[Window], *,
+                    now: dt.datetime, budget: int,
+                    peak_hours: str = ENERGY_PEAK_HOURS,
+                    buffer_min: int = timeline.TRANSITION_BUFFER_MIN,
+                    first: Iterable[str] = ()) -> Tuple[List[Placement], List[Candidate]]:
+    """
+    Greedy placement for the whole day.
+    Segments in `first` (the ones the user asked about) pick before the rest;
+    otherwise highest-priority candidates pick first. Each takes its
+    best-scoring aligned start inside the remaining gaps, which are then
+    carved (plus buffer) so no two recovery blocks overlap.
+    Returns (placements, unplaced).
+    """
+    peak = _parse_peak(peak_hours)
+    pad = dt.timedelta(minutes=buffer_min)
+    free = sorted((max(s, now), e) for s, e in gaps if e > now)
+    asked = set(first)
+    ordered = sorted(candidates, key=lambda c: (c.seg_id not in asked,
+                                                -QUADRANT_WEIGHT.get(c.quadrant, 1.0), -c.duration_min))
+
+    placements: List[Placement] = []
+    unplaced: List[Candidate] = []
+    for cand in ordered:
+        if len(placements) >= budget:
+            unplaced.append(cand)
+            continue
+        need = dt.timedelta(minutes=cand.duration_min)
+        best: Optional[Placement] = None
+        for g_start, g_end in free:
+            probe = _align(g_start)
+            while probe + need <= g_end:
+                score = score_slot(cand, probe, now, peak)
+                if best is None or score > best.score:
+                    best = Placement(cand.seg_id, cand.title, probe, probe + need, score)
+                probe += dt.timedelta(minutes=SLOT_STEP_MIN)
+        if best is None:
+            unplaced.append(cand)
+            continue
+        placements.append(best)
+        free = _carve(free, best.start, best.end, pad)
+    placements.sort(key=lambda p: p.start)
+    return placements, unplaced
+
+
+# ---------- DB / calendar side ----------
+
+def pending_missed() -> List[str]:
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT seg_id FROM missed_queue ORDER BY seg_id")
+        return [r[0] for r in cur.fetchall()]
+
+
+def load_segments(seg_ids: Sequence[str]) -> List[Dict]:
+    if not seg_ids:
+        return []
+    with db.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, title, start_at, end_at FROM segments WHERE id = ANY(%s)", (list(seg_ids),))
+        return [{"id": r[0], "title": r[1], "start_at": r[2], "end_at": r[3]} for r in cur.fetchall()]
+
+
+def remaining_budget(day: Optional[dt.date] = None) -> int:
+    st = db.get_day_state(day or state._day_key())
+    return max(0, RECOVERY_BLOCKS_MAX - int(st.get("recovery_blocks_used", 0) or 0))
+
+
+def free_gaps(now: dt.datetime, tz) -> List[Window]:
+    """Gaps from the published free-slot index, or a fresh one built from today's calendar."""
+    index = timeline.current_index(now)
+    if index is None:
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        segs = [s for s in (reconcile.normalize_event(ev, tz) for ev in cal.get_agenda("today") or []) if s]
+        index = timeline.FreeSlotIndex(segs, timeline.plan_buffers(segs), day_start,
+                                       day_start + dt.timedelta(days=1))
+    return index.gaps(after=now, min_minutes=RECOVERY_BLOCK_MIN)
+
+
+def book(placements: Sequence[Placement], tz) -> Dict[str, Placement]:
+    """One calendar batch + one segments insert + one missed_queue delete. Returns seg_id -> placement booked."""
+    if not placements:
+        return {}
+    bodies = {
+        p.seg_id: {
+            "summary": f"Recovery: {p.title}",
+            "start": {"dateTime": p.start.isoformat(), "timeZone": str(tz)},
+            "end": {"dateTime": p.end.isoformat(), "timeZone": str(tz)},
+            "extendedProperties": {"private": {"rigidity": "soft", "recovery_of": p.seg_id}},
+        }
+        for p in placements
+    }
+    created = cal.create_events_batch(bodies)
+    booked = {p.seg_id: p for p in placements if p.seg_id in created}
+    if not booked:
+        return {}
+    rows = [
+        (f"gcal:{created[sid]['id']}", "scheduled", f"Recovery: {p.title}", "soft",
+         p.start, p.end, str(tz), "gentle")
+        for sid, p in booked.items()
+    ]
+    with db.get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO segments (id, type, title, rigidity, start_at, end_at, tz, tone_at_start)
+            VALUES %s
+            ON CONFLICT (id) DO NOTHING
+        """, rows)
+        cur.execute("DELETE FROM missed_queue WHERE seg_id = ANY(%s)", (list(booked),))
+        conn.commit()
+    return booked
+
+
+def run_batch(now: dt.datetime, tz, *, extra: Sequence[str] = (),
+              use_budget: bool = True) -> Dict[str, Placement]:
+    """
+    Drain missed_queue (plus any `extra` segment ids) and book all of today's
+    recovery blocks at once. With use_budget=False the day's recovery cap is
+    ignored and not consumed (plain "schedule more" follow-ups).
+
+    A user-initiated run (`extra` given) only takes queued misses from the
+    same day as the requested segments, and the requested ones pick first,
+    so the budget never goes to another day's miss instead.
+    """
+    with _BATCH_LOCK:
+        seg_ids = list(dict.fromkeys([*extra, *(pending_missed() if use_budget else [])]))
+        segments = load_segments(seg_ids)
+        if extra:
+            days = {s["start_at"].astimezone(tz).date() for s in segments if s["id"] in extra}
+            segments = [s for s in segments if s["id"] in extra or s["start_at"].astimezone(tz).date() in days]
+        candidates = [candidate_from_segment(s) for s in segments]
+        if not candidates:
+            return {}
+        budget = remaining_budget() if use_budget else len(candidates)
+        if budget <= 0:
+            return {}
+        placements, unplaced = plan_placements(candidates, free_gaps(now, tz), now=now, budget=budget,
+                                               first=extra)
+        booked = book(placements, tz)
+        if booked:
+            # the published index predates these blocks; carve them out so the next batch can't reuse the gaps
+            pad = dt.timedelta(minutes=timeline.TRANSITION_BUFFER_MIN)
+            timeline.mark_busy((p.start - pad, p.end + pad, f"recovery:{sid}") for sid, p in booked.items())
+        if booked and use_budget:
+            state.increment_recovery_blocks_used(len(booked))
+    print(f"[recovery] booked={len(booked)} unplaced={len(unplaced)}")
+    return booked
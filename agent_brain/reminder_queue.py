@@ -0,0 +1,196 @@
+# ===========================
+# agent_brain/reminder_queue.py
+# ===========================
+"""
+Precomputed reminder queue.
+
+The planner turns today's agenda into before/during/after fire times once
+(whenever the calendar or segments change); the dispatcher only wakes up for
+the next due item instead of scanning the agenda every minute.
+"""
+from __future__ import annotations
+
+import dataclasses
+import datetime as dt
+import heapq
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+PHASES = ("before", "during", "after")
+
+# Delivery windows mirror the old per-minute scan:
+#   before: between REMINDER_MAX_BEFORE and REMINDER_MIN_BEFORE minutes before start
+#   during: 1–3 minutes after start
+#   after:  1–3 minutes after end
+DURING_OFFSET = dt.timedelta(seconds=60)
+AFTER_OFFSET = dt.timedelta(seconds=60)
+LATE_WINDOW = dt.timedelta(seconds=120)
+# A failed delivery is retried this many times, RETRY_DELAY apart
+MAX_RETRIES = 3
+RETRY_DELAY = dt.timedelta(seconds=30)
+
+
+@dataclass(order=True)
+class ReminderItem:
+    fire_at: dt.datetime
+    event_id: str = field(compare=False)
+    phase: str = field(compare=False)          # before|during|after|postponed
+    title: str = field(compare=False, default="")
+    deadline: Optional[dt.datetime] = field(compare=False, default=None)
+    start_str: Optional[str] = field(compare=False, default=None)
+    attempt: int = field(compare=False, default=0)
+    planned_at: Optional[dt.datetime] = field(compare=False, default=None)  # fire_at before any retry
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.event_id, self.phase, (self.planned_at or self.fire_at).isoformat())
+
+
+def _parse(ts: Optional[str], tz) -> Optional[dt.datetime]:
+    if not ts:
+        return None
+    return dt.datetime.fromisoformat(ts).astimezone(tz)
+
+
+def plan_reminders(
+    events: Iterable[Dict],
+    now: dt.datetime,
+    *,
+    tz,
+    minutes_before: int,
+    min_before: int,
+    fire_time_fn: Callable[..., dt.datetime],
+    notified: Set[Tuple[str, str]] = frozenset(),
+) -> List[ReminderItem]:
+    """
+    Compute every reminder still due today.
+
+    `fire_time_fn` must follow time_service.compute_reminder_fire_time
+    semantics: (start_at, minutes_before, tz) -> tz-aware fire datetime.
+    Items whose delivery window already closed are dropped.
+    """
+    items: List[ReminderItem] = []
+    for ev in events:
+        start_str = (ev.get("start") or {}).get("dateTime")
+        end_str = (ev.get("end") or {}).get("dateTime")
+        if not start_str or not end_str or not ev.get("id"):
+            continue
+        start_at = _parse(start_str, tz)
+        end_at = _parse(end_str, tz)
+        title = ev.get("summary") or ""
+
+        if (ev["id"], "before") not in notified:
+            fire_at = fire_time_fn(start_at=start_at, minutes_before=minutes_before, tz=str(tz))
+            items.append(ReminderItem(
+                fire_at=fire_at, event_id=ev["id"], phase="before", title=title,
+                deadline=start_at - dt.timedelta(minutes=min_before), start_str=start_str,
+            ))
+        if (ev["id"], "during") not in notified:
+            fire_at = start_at + DURING_OFFSET
+            items.append(ReminderItem(
+                fire_at=fire_at, event_id=ev["id"], phase="during", title=title,
+                deadline=fire_at + LATE_WINDOW,
+            ))
+        if (ev["id"], "after") not in notified:
+            fire_at = end_at + AFTER_OFFSET
+            items.append(ReminderItem(
+                fire_at=fire_at, event_id=ev["id"], phase="after", title=title,
+                deadline=fire_at + LATE_WINDOW,
+            ))
+
+    return [it for it in items if it.deadline is None or it.deadline >= now]
+
+
+class ReminderQueue:
+    """Thread-safe min-heap of ReminderItems ordered by fire time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[ReminderItem] = []
+        self._fired: Dict[Tuple[str, str, str], dt.datetime] = {}
+        self._retrying: Dict[Tuple[str, str, str], ReminderItem] = {}
+        # Delivered (event_id, phase) pairs; the DB is consulted once per event
+        self._notified: Set[Tuple[str, str]] = set()
+        self._seeded: Set[str] = set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def replace(self, items: Iterable[ReminderItem], now: Optional[dt.datetime] = None) -> None:
+        """
+        Swap in a freshly planned set, skipping anything this process already
+        fired. Pending retries survive the swap in place of their planned item.
+        """
+        with self._lock:
+            if now is not None:
+                horizon = now - dt.timedelta(days=1)
+                self._fired = {k: v for k, v in self._fired.items() if v >= horizon}
+            heap = [it for it in items if it.key not in self._fired and it.key not in self._retrying]
+            heap.extend(self._retrying.values())
+            heapq.heapify(heap)
+            self._heap = heap
+
+    def retry(self, item: ReminderItem, now: dt.datetime) -> bool:
+        """
+        Re-queue an item whose delivery failed, RETRY_DELAY from now. The
+        retry gets a LATE_WINDOW of its own, so a short outage still delivers
+        it late rather than never. Returns False once MAX_RETRIES is used up.
+        """
+        if item.attempt >= MAX_RETRIES:
+            return False
+        fire_at = now + RETRY_DELAY
+        again = dataclasses.replace(
+            item, fire_at=fire_at, attempt=item.attempt + 1, planned_at=item.planned_at or item.fire_at,
+            deadline=max(item.deadline, fire_at + LATE_WINDOW) if item.deadline else None,
+        )
+        with self._lock:
+            self._fired.pop(item.key, None)
+            self._retrying[item.key] = again
+            heapq.heappush(self._heap, again)
+        return True
+
+    def mark_notified(self, event_id: str, phase: str) -> None:
+        with self._lock:
+            self._notified.add((event_id, phase))
+
+    def notified_for(
+        self, event_ids: Iterable[str], lookup: Callable[[str, str], bool]
+    ) -> Set[Tuple[str, str]]:
+        """
+        Delivered (event_id, phase) pairs for these events. Only events this
+        queue has not seen yet go through `lookup(event_id, phase)`; after that
+        deliveries are recorded with mark_notified. State for events no longer
+        in the list is dropped.
+        """
+        ids = set(event_ids)
+        with self._lock:
+            new = ids - self._seeded
+        found = {(eid, phase) for eid in new for phase in PHASES if lookup(eid, phase)}
+        with self._lock:
+            self._seeded = (self._seeded & ids) | new
+            self._notified = {k for k in self._notified if k[0] in ids} | found
+            return set(self._notified)
+
+    def push(self, item: ReminderItem) -> None:
+        with self._lock:
+            if item.key not in self._fired and item.key not in self._retrying:
+                heapq.heappush(self._heap, item)
+
+    def next_fire_at(self) -> Optional[dt.datetime]:
+        with self._lock:
+            return self._heap[0].fire_at if self._heap else None
+
+    def pop_due(self, now: dt.datetime) -> List[ReminderItem]:
+        """Pop everything with fire_at <= now; items past their deadline are discarded."""
+        due: List[ReminderItem] = []
+        with self._lock:
+            while self._heap and self._heap[0].fire_at <= now:
+                it = heapq.heappop(self._heap)
+                self._fired[it.key] = it.fire_at
+                self._retrying.pop(it.key, None)
+                if it.deadline is not None and it.deadline < now:
+                    continue
+                due.append(it)
+        return due
@@ -1,7 +1,13 @@
 import os
+import re
+import time
+import asyncio
 import logging
-from telegram.error import BadRequest
-from agent_brain.core import conversational_brain
+from telegram.error import BadRequest, RetryAfter
+from agent_brain.core import conversational_brain, conversational_brain_stream
+from agent_brain import outbox
+import feature_flags as ff
+import llm_client
 
 logging.basicConfig(level=logging.INFO)
 
@@ -31,10 +37,124 @@ async def send_text_safe(update, context, text, parse_mode="Markdown"):
     if not text or not str(text).strip():
         logging.info("send_text_safe: empty response; nothing to send")
         return
+    # Rate-limited, per-tick coalesced delivery; falls back to plain text if Markdown is rejected
+    await outbox.send(context.bot, chat_id, text, parse_mode=parse_mode)
+
+
+_HICCUP = "⚠️ Quick hiccup on my side. Try: WHAT'S ON NOW or SUMMARY today."
+
+
+# --- Streaming replies (WF2_STREAMING) ---
+# Telegram allows roughly one edit per second per chat before throttling.
+STREAM_EDIT_INTERVAL_S = float(os.getenv("STREAM_EDIT_INTERVAL_S", "1.2"))
+STREAM_FIRST_CHUNK_CHARS = int(os.getenv("STREAM_FIRST_CHUNK_CHARS", "80"))
+STREAM_FIRST_CHUNK_S = float(os.getenv("STREAM_FIRST_CHUNK_S", "0.8"))
+_SENTENCE_END = re.compile(r"[.!?…:]\s|\n")
+
+
+def markdown_is_balanced(text: str) -> bool:
+    """Cheap check that legacy-Markdown entities are closed, so Telegram won't reject the text."""
+    body = re.sub(r"```.*?```", "", text, flags=re.S)
+    if body.count("```") or body.count("`") % 2:
+        return False
+    body = re.sub(r"`[^`]*`", "", body)
+    body = re.sub(r"\[[^\]]*\]\([^)]*\)", "", body)
+    return body.count("*") % 2 == 0 and body.count("_") % 2 == 0 and body.count("[") == body.count("]")
+
+
+STREAM_FINAL_EDIT_RETRIES = 2
+
+
+async def _edit(context, chat_id, message_id, text, parse_mode=None, retries: int = 0) -> bool:
+    """
+    One edit_message_text. Intermediate edits pass retries=0 (a throttled one
+    is simply skipped); the final edit retries after Telegram's RetryAfter.
+    """
     try:
-        await context.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
-    except BadRequest:
-        await context.bot.send_message(chat_id=chat_id, text=text, parse_mode=None)
+        await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id,
+                                            text=text, parse_mode=parse_mode)
+        return True
+    except RetryAfter as e:
+        delay = getattr(e, "retry_after", 1) or 1
+        await asyncio.sleep(delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay))
+        if retries > 0:
+            return await _edit(context, chat_id, message_id, text, parse_mode, retries - 1)
+        return False
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return True
+        if parse_mode:
+            return await _edit(context, chat_id, message_id, text, None, retries)
+        logging.warning(f"stream edit failed: {e}")
+        return False
+
+
+async def stream_text_safe(update, context, chunks, parse_mode="Markdown") -> str:
+    """
+    Send an async stream of text deltas as one Telegram message: the first
+    sentence goes out as a new message, later text arrives through throttled
+    edit_message_text calls, and the final edit applies Markdown only if it
+    validates (plain text otherwise). Returns the full text.
+
+    The first message goes through the outbox (rate limits, RetryAfter);
+    only the edits of that message go to the bot directly. Inside a
+    coalesce() batch the stream is collected and sent as one queued message,
+    so it keeps its place behind messages queued earlier in the tick.
+    """
+    chat_id = _get_chat_id(update, context)
+    if outbox.in_batch():
+        text = "".join([delta async for delta in chunks]).strip()
+        if text:
+            await send_text_safe(update, context, text, parse_mode=parse_mode)
+        return text
+    started = time.monotonic()
+    text = ""
+    message_id = None
+    shown = ""
+    last_edit = 0.0
+
+    try:
+        async for delta in chunks:
+            text += delta
+            now = time.monotonic()
+            if message_id is None:
+                ready = (
+                    _SENTENCE_END.search(text)
+                    or len(text) >= STREAM_FIRST_CHUNK_CHARS
+                    or now - started >= STREAM_FIRST_CHUNK_S
+                )
+                if chat_id and ready and text.strip():
+                    # intermediate text is plain: half-written Markdown would be rejected
+                    msg = await outbox.send(context.bot, chat_id, text, record_reply=False)
+                    message_id = getattr(msg, "message_id", None)
+                    shown, last_edit = text, now
+                    logging.info(f"stream: first text after {(now - started) * 1000:.0f}ms")
+                continue
+            if now - last_edit >= STREAM_EDIT_INTERVAL_S and text != shown:
+                if await _edit(context, chat_id, message_id, text):
+                    shown = text
+                last_edit = time.monotonic()
+    except Exception as e:
+        if message_id is None:
+            raise  # nothing shown yet: the caller can still send a complete reply
+        # the user already sees part of the reply: finish that message rather than sending a second one
+        logging.warning(f"stream: interrupted after {len(text)} chars ({e!r}); finalizing partial reply")
+
+    text = text.strip()
+    if not text:
+        return text
+    if message_id is None:
+        await send_text_safe(update, context, text, parse_mode=parse_mode)
+        return text
+    final_mode = parse_mode if parse_mode and markdown_is_balanced(text) else None
+    if text != shown or final_mode:
+        try:
+            if not await _edit(context, chat_id, message_id, text, final_mode, retries=STREAM_FINAL_EDIT_RETRIES):
+                logging.warning(f"stream: final edit of message {message_id} did not go through")
+        except Exception as e:
+            logging.warning(f"stream: final edit of message {message_id} failed: {e!r}")
+    outbox.record(text, final_mode)  # streamed outside the queue; still replayable by idempotency
+    return text
 
 
 def _clean(s: str | None) -> str:
@@ -132,14 +252,25 @@ async def respond_with_brain(
 
     logging.info(f"🧠 Final user_message sent to GPT:\n{user_msg}\n")
 
+    brain_input = {"system": system, "user": user_msg} if system and _clean(system) else user_msg
+
+    if send and ff.enabled("WF2_STREAMING") and llm_client.BREAKER.state != "open":
+        try:
+            return await stream_text_safe(update, context, conversational_brain_stream(brain_input),
+                                          parse_mode=parse_mode)
+        except Exception as e:
+            # stream_text_safe only raises before its first message went out, so this can't duplicate
+            logging.exception("streaming reply failed before any text was sent, falling back: %s", e)
+
     try:
-        if system and _clean(system):
-            llm_text = await conversational_brain({"system": system, "user": user_msg})
-        else:
-            llm_text = await conversational_brain(user_msg)
+        llm_text = await conversational_brain(brain_input)
+    except llm_client.LLMUnavailable as e:
+        # Provider degraded: the caller's deterministic summary (messages.py copy) is the reply
+        logging.warning("conversational_brain skipped: %s", e)
+        llm_text = _clean(summary) or _HICCUP
     except Exception as e:
         logging.exception("conversational_brain failed: %s", e)
-        llm_text = "⚠️ Quick hiccup on my side. Try: WHAT'S ON NOW or SUMMARY today."
+        llm_text = _clean(summary) or _HICCUP
 
     if send:
         await send_text_safe(update, context, llm_text, parse_mode=parse_mode)
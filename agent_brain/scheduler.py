@@ -5,53 +5,131 @@
 # --- NEW imports for Workflow #0 backbone ---
 from agent_brain import observer  # will expose observer.tick(now, app)
 from agent_brain import fsm       # types only; logic handled by observer
+from agent_brain import job_store
+from agent_brain import reminder_queue
+from agent_brain import reconcile
+from agent_brain import timeline
+from agent_brain import gating
+from agent_brain import recovery
+from agent_brain import day_texts
+from agent_brain import outbox
+from agent_brain import idempotency
 import feature_flags as ff
 
-# Use a single APScheduler across this module
-from apscheduler.schedulers.background import BackgroundScheduler
-SCHED = BackgroundScheduler()
-
 import os
 import asyncio
+import functools
+import threading
 import datetime as dt
 from zoneinfo import ZoneInfo
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
 import beia_core.models.timebox as db
+import beia_core.services.time_service as time_service
 import calendar_client as cal
 from gpt_agent import create_reminder_message
 
-# --- NEW: gating for quiet hours / Sabbath / OOO ---
-def _is_quiet(now: dt.datetime) -> bool:
-    quiet = os.getenv("QUIET_HOURS", "22:00-06:00")
-    start_s, end_s = quiet.split("-")
-    start_h, start_m = map(int, start_s.split(":"))
-    end_h, end_m = map(int, end_s.split(":"))
-    start = now.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
-    end = now.replace(hour=end_h, minute=end_m, second=0, microsecond=0)
-    if start <= end:
-        return start <= now <= end
-    # wraps past midnight
-    return now >= start or now <= end
-
-def _is_sabbath(now: dt.datetime) -> bool:
-    day = os.getenv("SABBATH_DAY", "").strip().lower()
-    if not day:
-        return False
-    # map names -> weekday (Mon=0..Sun=6)
-    names = ["monday","tuesday","wednesday","thursday","friday","saturday","sunday"]
-    try:
-        return now.weekday() == names.index(day)
-    except ValueError:
-        return False
+class _LazyScheduler:
+    """Builds the BackgroundScheduler (and imports APScheduler) on first use, not at import."""
+
+    def __init__(self):
+        self._sched = None
+        self._lock = threading.Lock()
 
+    def _get(self):
+        if self._sched is None:
+            with self._lock:
+                if self._sched is None:
+                    from apscheduler.schedulers.background import BackgroundScheduler
+                    self._sched = BackgroundScheduler()
+        return self._sched
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+# Use a single APScheduler across this module
+SCHED = _LazyScheduler()
+
+# --- NEW: gating for quiet hours / Sabbath / OOO ---
+# Compiled once per week window in agent_brain.gating; lookups are a bisect.
 def _gated(now: dt.datetime) -> bool:
     """Return True if we should suppress pings/escalations right now."""
-    if _is_quiet(now):
-        return True
-    if _is_sabbath(now):
-        return True
-    return False
+    return gating.policy_for(os.getenv("TELEGRAM_CHAT_ID"), now).is_gated(now)
+
+def _next_allowed(now: dt.datetime) -> dt.datetime:
+    return gating.policy_for(os.getenv("TELEGRAM_CHAT_ID"), now).next_allowed(now)
+
+def refresh_ooo_windows(now: dt.datetime | None = None):
+    """Pull OOO events for the gating horizon from the calendar into the gating policy."""
+    now = now or dt.datetime.now(TZ)
+    end = now + dt.timedelta(days=gating.HORIZON_DAYS)
+    intervals = []
+    for ev in cal.list_out_of_office(now, end) or []:
+        start_s = ev['start'].get('dateTime', ev['start'].get('date'))
+        end_s = ev['end'].get('dateTime', ev['end'].get('date'))
+        s_at = dt.datetime.fromisoformat(start_s)
+        e_at = dt.datetime.fromisoformat(end_s)
+        # all-day OOO comes back as naive dates
+        s_at = s_at.replace(tzinfo=TZ) if s_at.tzinfo is None else s_at.astimezone(TZ)
+        e_at = e_at.replace(tzinfo=TZ) if e_at.tzinfo is None else e_at.astimezone(TZ)
+        intervals.append((s_at, e_at))
+    gating.set_ooo(intervals)
+
+# --- NEW: one-off boundary jobs (midpoint ticks), deduplicated + persisted ---
+def _midpoint_cb(seg_id: str, expires_at: dt.datetime | None = None):
+    now = dt.datetime.now(TZ)
+    try:
+        job_store.delete_job(seg_id, "mid")
+    except Exception as e:
+        print(f"[midpoint] could not clear job row for {seg_id}: {e}")
+    if _gated(now):
+        # Defer rather than drop, as long as the segment is still running then
+        resume_at = _next_allowed(now)
+        if expires_at is None or resume_at < expires_at:
+            schedule_boundary_job(seg_id, "mid", resume_at, expires_at=expires_at)
+        return
+    # delegate the heavy FSM logic to observer
+    try:
+        observer.emit_midpoint(seg_id=seg_id, now=now)
+    except AttributeError:
+        # Fallback: if emit_midpoint not yet implemented, call generic tick
+        observer.tick(now=now)
+
+_BOUNDARY_CALLBACKS = {"mid": _midpoint_cb}
+
+def _add_boundary_job(seg_id: str, kind: str, run_at: dt.datetime, expires_at: dt.datetime | None = None):
+    SCHED.add_job(
+        _BOUNDARY_CALLBACKS[kind], 'date',
+        run_date=run_at,
+        args=[seg_id, expires_at],
+        id=job_store.job_id(seg_id, kind),
+        replace_existing=True,
+    )
+
+def schedule_boundary_job(seg_id: str, kind: str, run_at: dt.datetime, *, expires_at: dt.datetime | None = None):
+    """
+    Upsert a one-off job for (seg_id, kind). Re-scheduling the same boundary
+    replaces the previous job instead of stacking a duplicate.
+    """
+    if run_at <= dt.datetime.now(TZ):
+        return
+    job_store.upsert_job(seg_id, kind, run_at, expires_at)
+    _add_boundary_job(seg_id, kind, run_at, expires_at)
+
+def cancel_boundary_job(seg_id: str, kind: str):
+    job_store.delete_job(seg_id, kind)
+    if SCHED.get_job(job_store.job_id(seg_id, kind)):
+        SCHED.remove_job(job_store.job_id(seg_id, kind))
+
+def restore_boundary_jobs():
+    """Re-arm persisted boundary jobs after a restart. Returns the number restored."""
+    restored = 0
+    for seg_id, kind, run_at, expires_at in job_store.load_pending(dt.datetime.now(TZ)):
+        if kind not in _BOUNDARY_CALLBACKS:
+            continue
+        _add_boundary_job(seg_id, kind, run_at, expires_at)
+        restored += 1
+    return restored
 
 # --- NEW: schedule a one-off midpoint tick for a segment ---
 def schedule_midpoint_tick(seg_id: str, start_at: dt.datetime, end_at: dt.datetime):
@@ -59,17 +137,7 @@ def schedule_midpoint_tick(seg_id: str, start_at: dt.datetime, end_at: dt.dateti
     if duration <= 0:
         return
     mid_at = start_at + dt.timedelta(seconds=duration/2)
-    def _mid_cb():
-        now = dt.datetime.now(TZ)
-        if _gated(now):
-            return
-        # delegate the heavy FSM logic to observer
-        try:
-            observer.emit_midpoint(seg_id=seg_id, now=now)
-        except AttributeError:
-            # Fallback: if emit_midpoint not yet implemented, call generic tick
-            observer.tick(now=now)
-    SCHED.add_job(_mid_cb, 'date', run_date=mid_at)
+    schedule_boundary_job(seg_id, "mid", mid_at, expires_at=end_at)
 
 TZ = ZoneInfo(os.getenv("TIMEZONE", "Europe/London"))
 
@@ -91,6 +159,13 @@ def send_daily_agenda(app):
 
         await app.bot.send_message(chat_id=os.getenv("TELEGRAM_CHAT_ID"), text=text)
 
+        # Pre-generate the day's start/mid/end + reminder texts in one LLM call
+        try:
+            stored = await asyncio.to_thread(day_texts.precompute_day, now, events)
+            print(f"[day_texts] precomputed {stored} texts")
+        except Exception as e:
+            print(f"[day_texts] precompute error: {e}")
+
     from apscheduler.schedulers.background import BackgroundScheduler
     scheduler = BackgroundScheduler()
     scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(job(), loop), 'cron', hour=4, minute=0, timezone=TZ)
@@ -125,109 +200,210 @@ def start_live_session_jobs(app):
     # kick off jobs once (idempotent start)
     if not SCHED.running:
         SCHED.start()
+    try:
+        restored = restore_boundary_jobs()
+        print(f"[boundary] restored {restored} pending jobs")
+    except Exception as e:
+        print(f"[boundary] could not restore jobs: {e}")
     SCHED.add_job(_tick_job, 'interval', minutes=1, id='wf0_tick', replace_existing=True, timezone=TZ)
     SCHED.add_job(_reconcile_job, 'interval', minutes=30, id='wf0_reconcile', replace_existing=True, timezone=TZ)
+    SCHED.add_job(_recovery_drain_job, 'interval', minutes=30, id='wf0_recovery_drain', replace_existing=True, timezone=TZ)
+    ff.subscribe(_on_flags_changed)
 
-def send_time_reminders(app):
-    loop = asyncio.get_event_loop()
+def _on_flags_changed(change):
+    """Flag file reloaded: run the jobs a flipped flag affects now instead of at their next interval."""
+    now = dt.datetime.now(TZ)
+    if change.turned_on("WF0_DS_MODE") and SCHED.get_job('wf0_recovery_drain'):
+        SCHED.modify_job('wf0_recovery_drain', next_run_time=now)
+    if "WF0_BUFFERS" in change.keys and SCHED.get_job('wf0_reconcile'):
+        SCHED.modify_job('wf0_reconcile', next_run_time=now)
+    print(f"[flags] v{change.new.version}: {', '.join(sorted(change.keys))} changed")
+
+# --- Reminder planner + dispatcher (replaces the per-minute agenda scan) ---
+REMINDERS = reminder_queue.ReminderQueue()
+REMINDER_REPLAN_MIN = int(os.getenv("REMINDER_REPLAN_MIN", 15))
+_REMINDER_APP = None
+_REMINDER_LOOP = None
+
+def replan_reminders(now: dt.datetime | None = None) -> int:
+    """
+    Recompute today's before/during/after fire times into REMINDERS and
+    re-arm the dispatcher. Call whenever the calendar or segments change.
+    Returns the number of queued items.
+    """
+    now = now or dt.datetime.now(TZ)
+    min_before = int(os.getenv("REMINDER_MIN_BEFORE", 9))
+    max_before = int(os.getenv("REMINDER_MAX_BEFORE", 11))
+
+    events = [
+        ev for ev in (cal.get_agenda("today") or [])
+        if ev.get("id") and (ev.get("start") or {}).get("dateTime")
+    ]
+    # Only events new to the queue hit the DB; deliveries are tracked in REMINDERS.
+    # Blocked titles are checked when a 'before' reminder fires, not on every replan.
+    notified = REMINDERS.notified_for([ev["id"] for ev in events], db.was_event_notified)
+
+    items = reminder_queue.plan_reminders(
+        events, now,
+        tz=TZ,
+        minutes_before=(min_before + max_before) // 2,
+        min_before=min_before,
+        fire_time_fn=time_service.compute_reminder_fire_time,
+        notified=notified,
+    )
 
-    async def job():
-        now = dt.datetime.now(TZ)
-        due = db.get_due_postponed_reminders(now)
-        for event_id, remind_at in due:
-            await app.bot.send_message(
-                chat_id=os.getenv("TELEGRAM_CHAT_ID"),
-                text=f"🔔 Reminder: *{event_id}* is due now!",
-                parse_mode="Markdown"
+    # Postponed ("remind me again") reminders still pending today
+    end_of_day = now.replace(hour=23, minute=59, second=59, microsecond=0)
+    for event_id, remind_at in db.get_due_postponed_reminders(end_of_day) or []:
+        items.append(reminder_queue.ReminderItem(fire_at=remind_at, event_id=event_id, phase="postponed"))
+
+    REMINDERS.replace(items, now=now)
+    _arm_reminder_dispatch()
+    return len(items)
+
+def _arm_reminder_dispatch():
+    """Sleep until the next due reminder: a single one-off job, re-armed after each dispatch."""
+    next_at = REMINDERS.next_fire_at()
+    if next_at is None:
+        if SCHED.get_job('reminder_dispatch'):
+            SCHED.remove_job('reminder_dispatch')
+        return
+    run_at = max(next_at, dt.datetime.now(TZ))
+    SCHED.add_job(_dispatch_due_reminders, 'date', run_date=run_at,
+                  id='reminder_dispatch', replace_existing=True, misfire_grace_time=120)
+
+def _dispatch_due_reminders():
+    due = REMINDERS.pop_due(dt.datetime.now(TZ))
+    if due and _REMINDER_LOOP is not None:
+        asyncio.run_coroutine_threadsafe(_send_reminders(due), _REMINDER_LOOP)
+    _arm_reminder_dispatch()
+
+async def _send_reminders(items):
+    app = _REMINDER_APP
+    chat_id = os.getenv("TELEGRAM_CHAT_ID")
+    # Reminders due in the same tick go out as one message (keyboard kept on the last one)
+    async with outbox.coalesce():
+        for it in items:
+            await _send_reminder(app, chat_id, it)
+
+async def _send_reminder(app, chat_id, it):
+    # Inside coalesce() the send returns before delivery: mark the reminder done
+    # only once it is really out; a failed delivery is re-queued with a short backoff.
+    retry = functools.partial(_reminder_failed, it)
+    try:
+        if it.phase == "postponed":
+            remind_at = it.planned_at or it.fire_at
+            await outbox.send(
+                app.bot, chat_id,
+                f"🔔 Reminder: *{it.event_id}* is due now!",
+                parse_mode="Markdown",
+                on_sent=functools.partial(asyncio.to_thread, db.delete_postponed_reminder, it.event_id, remind_at),
+                on_failed=retry,
             )
-            db.delete_postponed_reminder(event_id, remind_at)
-
-        upcoming_events = cal.get_agenda("today")
-        min_before = int(os.getenv("REMINDER_MIN_BEFORE", 9))
-        max_before = int(os.getenv("REMINDER_MAX_BEFORE", 11))
-
-        for ev in upcoming_events:
-            start_str = ev['start'].get('dateTime')
-            end_str = ev['end'].get('dateTime')
-            if not start_str or not end_str:
-                continue
-
-            start_time = dt.datetime.fromisoformat(start_str).astimezone(TZ)
-            end_time = dt.datetime.fromisoformat(end_str).astimezone(TZ)
-            delta_to_start = (start_time - now).total_seconds()
-            delta_to_end = (end_time - now).total_seconds()
-
-            # BEFORE
-            if min_before * 60 <= delta_to_start <= max_before * 60 and not db.was_event_notified(ev['id'], "before"):
-                if db.is_event_blocked(os.getenv("TELEGRAM_CHAT_ID"), ev['summary'], "before"):
-                    continue
-                text = create_reminder_message(ev['summary'], phase="before")
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🔁 Remind me again in 10 min", callback_data=f"remind_again|{ev['id']}|{start_str}")]
-                ])
-                await app.bot.send_message(chat_id=os.getenv("TELEGRAM_CHAT_ID"), text=text, parse_mode="Markdown", reply_markup=keyboard)
-                db.mark_event_as_notified(ev['id'], "before")
-
-            # DURING
-            if -180 <= delta_to_start <= -60 and not db.was_event_notified(ev['id'], "during"):
-                text = create_reminder_message(ev['summary'], phase="during")
-                await app.bot.send_message(chat_id=os.getenv("TELEGRAM_CHAT_ID"), text=text, parse_mode="Markdown")
-                db.mark_event_as_notified(ev['id'], "during")
-
-            # AFTER
-            if -180 <= delta_to_end <= -60 and not db.was_event_notified(ev['id'], "after"):
-                text = create_reminder_message(ev['summary'], phase="after")
-                await app.bot.send_message(chat_id=os.getenv("TELEGRAM_CHAT_ID"), text=text, parse_mode="Markdown")
-                db.mark_event_as_notified(ev['id'], "after")
+            return
 
-    from apscheduler.schedulers.background import BackgroundScheduler
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(lambda: asyncio.run_coroutine_threadsafe(job(), loop), 'interval', minutes=1)
-    scheduler.start()
+        # Blocked first: a blocked reminder should not cost a text generation
+        if it.phase == "before" and await asyncio.to_thread(db.is_event_blocked, chat_id, it.title, "before"):
+            return
+        # Cache-only: a miss sends the deterministic line and fills the cache in the background
+        text = await asyncio.to_thread(create_reminder_message, it.title, phase=it.phase, block=False)
+        keyboard = None
+        if it.phase == "before":
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔁 Remind me again in 10 min", callback_data=f"remind_again|{it.event_id}|{it.start_str}")]
+            ])
+        await outbox.send(app.bot, chat_id, text, parse_mode="Markdown", reply_markup=keyboard,
+                          on_sent=functools.partial(_reminder_delivered, it), on_failed=retry)
+    except Exception as e:
+        print(f"[reminders] could not send {it.phase} reminder for {it.event_id}: {e}")
+        _reminder_failed(it)
+
+def _reminder_failed(it):
+    if REMINDERS.retry(it, dt.datetime.now(TZ)):
+        print(f"[reminders] {it.phase} reminder for {it.event_id} not delivered; retry {it.attempt + 1} queued")
+        _arm_reminder_dispatch()
+    else:
+        print(f"[reminders] giving up on {it.phase} reminder for {it.event_id}")
+
+async def _reminder_delivered(it):
+    REMINDERS.mark_notified(it.event_id, it.phase)
+    await asyncio.to_thread(db.mark_event_as_notified, it.event_id, it.phase)
+
+def send_time_reminders(app):
+    global _REMINDER_APP, _REMINDER_LOOP
+    _REMINDER_APP = app
+    _REMINDER_LOOP = asyncio.get_event_loop()
+
+    def _replan_job():
+        try:
+            replan_reminders()
+        except Exception as e:
+            print(f"[reminders] replan error: {e}")
+
+    if not SCHED.running:
+        SCHED.start()
+    # Reminder texts are pre-generated with the rest of the day's texts in
+    # send_daily_agenda's morning job (agent_brain.day_texts).
+    # Calendar edits made outside the bot are picked up by a slow replan; the
+    # dispatcher itself only wakes for due items.
+    SCHED.add_job(_replan_job, 'interval', minutes=REMINDER_REPLAN_MIN, id='reminder_replan',
+                  replace_existing=True, timezone=TZ, next_run_time=dt.datetime.now(TZ))
 
 # --- NEW: reconcile calendar ↔ segments; add buffers; respect rigidity ---
 def reconcile_segments_with_calendar(app=None):
     now = dt.datetime.now(TZ)
     events = cal.get_agenda("today") or []
-    # Build simple segment views from events
-    segs_from_cal = []
-    for ev in events:
-        start_str = ev['start'].get('dateTime')
-        end_str = ev['end'].get('dateTime')
-        if not start_str or not end_str:
-            continue
-        start_at = dt.datetime.fromisoformat(start_str).astimezone(TZ)
-        end_at = dt.datetime.fromisoformat(end_str).astimezone(TZ)
-        # Rigidity can be embedded in extendedProperties; default firm for meetings, soft for others
-        rigidity = 'firm' if ev.get('attendees') or ev.get('hangoutLink') else 'soft'
-        segs_from_cal.append({
-            "id": ev['id'],
-            "type": "scheduled",
-            "rigidity": rigidity,
-            "start_at": start_at,
-            "end_at": end_at,
-            "tone_at_start": "gentle",
-        })
-
-    # Upsert into DB and schedule midpoint ticks
-    for s in segs_from_cal:
-        db.insert_segment({
-            "id": s["id"],
-            "type": s["type"],
-            "rigidity": s["rigidity"],
-            "start_at": s["start_at"],
-            "end_at": s["end_at"],
-            "tone_at_start": s["tone_at_start"],
-        })
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + dt.timedelta(days=1)
+
+    # Diff calendar vs stored fingerprints; only changed rows are written (one bulk upsert/delete)
+    plan, result = reconcile.reconcile_day(events, day_start, day_end, TZ)
+    print(f"[reconcile] {result}")
+
+    # Midpoint jobs are upserts, so only changed segments need (re)scheduling
+    for s in plan.changed:
         try:
             schedule_midpoint_tick(seg_id=s["id"], start_at=s["start_at"], end_at=s["end_at"])
         except Exception as e:
             print(f"[midpoint] could not schedule midpoint for {s['id']}: {e}")
+    for seg_id in plan.deletes:
+        try:
+            cancel_boundary_job(seg_id, "mid")
+        except Exception as e:
+            print(f"[midpoint] could not cancel midpoint for {seg_id}: {e}")
+
+    # Transition/travel buffers: one pass over the sorted day, one bulk write,
+    # then publish the free-slot index so conflict checks see the buffers.
+    # Buffers live in segments.travel_buffer_min only; calendar events are not edited.
+    if ff.enabled("WF0_BUFFERS"):
+        try:
+            buffers = timeline.plan_buffers(plan.segments)
+            timeline.write_buffers(buffers)
+            timeline.publish_index(timeline.FreeSlotIndex(plan.segments, buffers, day_start, day_end))
+        except Exception as e:
+            print(f"[buffers] could not plan buffers: {e}")
 
-    # Add 5–10m transition buffers between adjacent soft/free segments (no mutation of 'hard')
-    # NOTE: This is a minimal placeholder; a fuller version should read back from DB,
-    # detect collisions, and write buffer minutes into segments.travel_buffer_min.
-    # Left intentionally simple to avoid unintended calendar edits here.
+    # OOO blocks feed the compiled gating policy
+    try:
+        refresh_ooo_windows(now=now)
+    except Exception as e:
+        print(f"[gating] could not refresh OOO windows: {e}")
+
+    # Calendar changed: refresh the reminder queue
+    if plan.changed or plan.deletes:
+        try:
+            replan_reminders(now=now)
+        except Exception as e:
+            print(f"[reminders] replan after reconcile failed: {e}")
+
+    # Plan changed: generate texts only for what the morning batch doesn't cover
+    if plan.changed:
+        try:
+            stored = day_texts.precompute_day(now, events)
+            if stored:
+                print(f"[day_texts] {stored} texts for changed plan")
+        except Exception as e:
+            print(f"[day_texts] refresh after reconcile failed: {e}")
 
     # Detect free gaps and (optionally) seed Free Time Windows via observer
     try:
@@ -240,14 +416,22 @@ async def handle_remind_again(update, context):
     query = update.callback_query
     await query.answer()
     _, event_id, _ = query.data.split("|")
-    remind_at = dt.datetime.now(TZ) + dt.timedelta(minutes=10)
-    db.save_postponed_reminder(event_id, remind_at)
-
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=f"🔁 Reminder set again for *{event_id}* at {remind_at.strftime('%H:%M')}",
-        parse_mode="Markdown"
-    )
+    chat_id = update.effective_chat.id
+
+    async def _postpone():
+        remind_at = dt.datetime.now(TZ) + dt.timedelta(minutes=10)
+        db.save_postponed_reminder(event_id, remind_at)
+        REMINDERS.push(reminder_queue.ReminderItem(fire_at=remind_at, event_id=event_id, phase="postponed"))
+        _arm_reminder_dispatch()
+        await outbox.send(
+            context.bot, chat_id,
+            f"🔁 Reminder set again for *{event_id}* at {remind_at.strftime('%H:%M')}",
+            parse_mode="Markdown"
+        )
+
+    # A double tap postpones once and repeats the confirmation
+    await idempotency.run_once(chat_id, {"action": "remind_again", "event_id": event_id},
+                               _postpone, bot=context.bot, source=query.data)
 
 def propose_adjustment(drift):
     now = dt.datetime.now(TZ)
@@ -260,6 +444,37 @@ def propose_adjustment(drift):
         "reason": f"missed earlier block for {drift['summary']}"
     }
 
+# --- NEW: recovery / follow-up placement (see agent_brain.recovery) ---
+def _recovery_drain_job():
+    """Batch-place everything waiting in missed_queue (DS mode only; budget-capped)."""
+    if not ff.enabled("WF0_DS_MODE"):
+        return
+    now = dt.datetime.now(TZ)
+    if _gated(now):
+        return
+    try:
+        recovery.run_batch(now, TZ)
+    except Exception as e:
+        print(f"[recovery] drain error: {e}")
+
+async def schedule_recovery_block(seg_id: str, reason: str | None = None) -> dt.datetime | None:
+    """
+    Place a recovery block for `seg_id` together with anything else queued as
+    missed, so the whole day is solved at once. Returns the booked start for
+    `seg_id`, or None if there was no room / budget left today.
+    """
+    now = dt.datetime.now(TZ)
+    booked = await asyncio.to_thread(recovery.run_batch, now, TZ, extra=[seg_id])
+    p = booked.get(seg_id)
+    return p.start if p else None
+
+async def schedule_more(seg_id: str) -> dt.datetime | None:
+    """Book a follow-up slot for `seg_id` today (does not consume the recovery budget)."""
+    now = dt.datetime.now(TZ)
+    booked = await asyncio.to_thread(recovery.run_batch, now, TZ, extra=[seg_id], use_budget=False)
+    p = booked.get(seg_id)
+    return p.start if p else None
+
 # --- NEW: convenience initializer ---
 def start_all_schedulers(app):
     """
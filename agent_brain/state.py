@@ -126,9 +126,9 @@ def record_pivot(
 
 # ---------- convenience wrappers for DS / Recovery bookkeeping ----------
 
-def increment_recovery_blocks_used() -> None:
+def increment_recovery_blocks_used(by: int = 1) -> None:
     st = db.get_day_state(_day_key())
-    used = st.get("recovery_blocks_used", 0) + 1
+    used = st.get("recovery_blocks_used", 0) + by
     db.set_day_state(_day_key(), recovery_blocks_used=used)
 
 def reset_daily_streaks() -> None:
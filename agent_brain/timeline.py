@@ -0,0 +1,174 @@
+# ======================
+# agent_brain/timeline.py
+# ======================
+"""
+Day timeline helpers: transition/travel buffer planning and a free-slot index.
+
+plan_buffers() walks the day's segments once (sorted by start) and decides how
+many minutes of margin each segment needs before it. FreeSlotIndex folds those
+buffers into the busy intervals so conflict checks and gap searches need no
+extra calendar round trips.
+"""
+from __future__ import annotations
+
+import bisect
+import datetime as dt
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+import beia_core.models.timebox as db
+
+TRANSITION_BUFFER_MIN = int(os.getenv("TRANSITION_BUFFER_MIN", "5"))   # soft/free → soft/free
+TRANSITION_BUFFER_MAX = int(os.getenv("TRANSITION_BUFFER_MAX", "10"))  # before hard/firm commitments
+TRAVEL_BUFFER_MIN = int(os.getenv("TRAVEL_BUFFER_MIN", "15"))          # location change
+
+
+def _buffer_between(prev: Dict, seg: Dict) -> int:
+    rigidity = (seg.get("rigidity") or "soft").lower()
+    minutes = TRANSITION_BUFFER_MAX if rigidity in ("hard", "firm") else TRANSITION_BUFFER_MIN
+    prev_loc = (prev.get("location") or "").strip().lower()
+    loc = (seg.get("location") or "").strip().lower()
+    if prev_loc and loc and prev_loc != loc:
+        minutes = max(minutes, TRAVEL_BUFFER_MIN)
+    return minutes
+
+
+def plan_buffers(segments: Iterable[Dict]) -> Dict[str, int]:
+    """
+    One pass over the day's segments (any order in, sorted here).
+    Returns {seg_id: buffer minutes required before the segment starts}.
+    Free-time windows are gaps, not commitments, so they are skipped.
+    """
+    ordered = sorted(
+        (s for s in segments if s.get("type") != "free"),
+        key=lambda s: s["start_at"],
+    )
+    buffers: Dict[str, int] = {}
+    prev = None
+    for seg in ordered:
+        buffers[seg["id"]] = _buffer_between(prev, seg) if prev else 0
+        if prev is None or seg["end_at"] > prev["end_at"]:
+            prev = seg
+    return buffers
+
+
+def write_buffers(buffers: Dict[str, int]) -> None:
+    """Bulk write buffer minutes into segments.travel_buffer_min (one statement)."""
+    if not buffers:
+        return
+    with db.get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            UPDATE segments AS s
+               SET travel_buffer_min = v.minutes
+              FROM (VALUES %s) AS v(id, minutes)
+             WHERE s.id = v.id
+               AND s.travel_buffer_min IS DISTINCT FROM v.minutes
+        """, list(buffers.items()))
+        conn.commit()
+
+
+class FreeSlotIndex:
+    """
+    Sorted, merged busy intervals for one day with buffers already applied.
+    Each segment occupies [start_at - buffer, end_at).
+    """
+
+    def __init__(self, segments: Iterable[Dict], buffers: Dict[str, int],
+                 day_start: dt.datetime, day_end: dt.datetime):
+        self.day_start = day_start
+        self.day_end = day_end
+        self.built_at = dt.datetime.now(day_start.tzinfo)
+        raw: List[Tuple[dt.datetime, dt.datetime, str]] = []
+        for s in segments:
+            if s.get("type") == "free":
+                continue
+            pad = dt.timedelta(minutes=buffers.get(s["id"], 0))
+            raw.append((s["start_at"] - pad, s["end_at"], s["id"]))
+        self._set_busy(raw)
+
+    def _set_busy(self, raw: List[Tuple[dt.datetime, dt.datetime, str]]) -> None:
+        raw.sort(key=lambda r: r[0])
+        self._busy = raw
+        self._starts = [r[0] for r in raw]
+        self._max_end: List[dt.datetime] = []   # running max end, for prev_end lookups
+        running = None
+        for _, end, _ in raw:
+            running = end if running is None or end > running else running
+            self._max_end.append(running)
+
+    def with_busy(self, intervals: Iterable[Tuple[dt.datetime, dt.datetime, str]], *,
+                  drop_ids: Iterable[str] = ()) -> "FreeSlotIndex":
+        """
+        A copy with extra busy (start, end, id) intervals, e.g. blocks booked
+        since the build; intervals of `drop_ids` (blocks moved away) are removed.
+        """
+        drop = set(drop_ids)
+        idx = FreeSlotIndex((), {}, self.day_start, self.day_end)
+        idx.built_at = self.built_at
+        idx._set_busy([*(b for b in self._busy if b[2] not in drop), *intervals])
+        return idx
+
+    def covers(self, at: dt.datetime) -> bool:
+        return self.day_start <= at < self.day_end
+
+    def conflicts(self, start: dt.datetime, end: dt.datetime, *,
+                  buffer_min: int = TRANSITION_BUFFER_MIN,
+                  ignore_id: Optional[str] = None) -> List[str]:
+        """Segment ids overlapping [start - buffer_min, end)."""
+        lo = start - dt.timedelta(minutes=buffer_min)
+        hi = bisect.bisect_left(self._starts, end)
+        return [
+            sid for (s, e, sid) in self._busy[:hi]
+            if e > lo and sid != ignore_id
+        ]
+
+    def is_free(self, start: dt.datetime, end: dt.datetime, **kw) -> bool:
+        return not self.conflicts(start, end, **kw)
+
+    def prev_end(self, at: dt.datetime, *, ignore_id: Optional[str] = None) -> Optional[dt.datetime]:
+        """Latest busy end among segments that start before `at` (optionally not counting `ignore_id`)."""
+        i = bisect.bisect_left(self._starts, at)
+        if ignore_id is None:
+            return self._max_end[i - 1] if i else None
+        return max((e for _, e, sid in self._busy[:i] if sid != ignore_id), default=None)
+
+    def gaps(self, *, after: Optional[dt.datetime] = None, min_minutes: int = 15) -> List[Tuple[dt.datetime, dt.datetime]]:
+        """Free windows within the day, at least `min_minutes` long."""
+        cursor = max(self.day_start, after) if after else self.day_start
+        out: List[Tuple[dt.datetime, dt.datetime]] = []
+        for s, e, _ in self._busy:
+            if s > cursor and (s - cursor) >= dt.timedelta(minutes=min_minutes):
+                out.append((cursor, min(s, self.day_end)))
+            if e > cursor:
+                cursor = e
+        if self.day_end > cursor and (self.day_end - cursor) >= dt.timedelta(minutes=min_minutes):
+            out.append((cursor, self.day_end))
+        return out
+
+
+_INDEX: Optional[FreeSlotIndex] = None
+
+
+def publish_index(index: FreeSlotIndex) -> None:
+    global _INDEX
+    _INDEX = index
+
+
+def mark_busy(intervals: Iterable[Tuple[dt.datetime, dt.datetime, str]], *,
+              drop_ids: Iterable[str] = ()) -> None:
+    """Carve newly booked (or moved) intervals out of the published index until the next rebuild."""
+    global _INDEX
+    idx = _INDEX
+    if idx is not None:
+        _INDEX = idx.with_busy(intervals, drop_ids=drop_ids)
+
+
+def current_index(at: Optional[dt.datetime] = None) -> Optional[FreeSlotIndex]:
+    """The last published index, if it covers `at` (default: now)."""
+    idx = _INDEX
+    if idx is None:
+        return None
+    at = at or dt.datetime.now(idx.day_start.tzinfo)
+    return idx if idx.covers(at) else None
@@ -0,0 +1,165 @@
+# ======================
+# agent_brain/tone_templates.py
+# ======================
+"""
+Deterministic tone rendering for FSM prompts (start / mid / end / free time / drift).
+
+Each message kind has a small pool of Jinja2 variants per tone
+(gentle / coach / ds). All templates are compiled once, on first use; render()
+picks a variant by round-robin per (kind, tone) and fills the slots, so a
+prompt costs microseconds and never touches the network. The first variant
+of every pool is the copy messages.py used to hard-code.
+
+LLM rewriting (gpt_agent.llm_tone_polish) is only used when WF0_LLM_TONE is
+on, and its results are cached.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+TONES = ("gentle", "coach", "ds")
+
+# kind -> tone -> variants. Slots: title, meta, minutes, hint.
+# Copy rules (contract tests): no guilt words (should / must / need to / have to).
+SOURCES: Dict[str, Dict[str, List[str]]] = {
+    "start": {
+        "gentle": [
+            "Ready to start *{{ title }}*{{ meta }}?",
+            "*{{ title }}*{{ meta }} is up. Want to begin?",
+            "Time for *{{ title }}*{{ meta }}. Start when you're ready.",
+        ],
+        "coach": [
+            "Starting *{{ title }}*{{ meta }}. This matters — shall we begin?",
+            "*{{ title }}*{{ meta }} now. Let's get the first ten minutes in.",
+            "Go time: *{{ title }}*{{ meta }}. Start, or snooze 5?",
+        ],
+        "ds": [
+            "You're late to *{{ title }}*{{ meta }}. Starting now — confirm.",
+            "*{{ title }}*{{ meta }}. Now. Confirm start.",
+            "Clock's running on *{{ title }}*{{ meta }}. START or SKIP.",
+        ],
+    },
+    "mid": {
+        "gentle": [
+            "Still on *{{ title }}*?",
+            "Halfway mark for *{{ title }}*. How's it going?",
+            "Checking in on *{{ title }}* — still with it?",
+        ],
+        "coach": [
+            "Halfway through *{{ title }}*. On track to finish?",
+            "Midpoint of *{{ title }}*. Keep going or adjust?",
+            "*{{ title }}* is half done. Push on, or add time?",
+        ],
+        "ds": [
+            "Mark status for *{{ title }}*: DONE • DIDNT START • NEED MORE",
+            "*{{ title }}* midpoint. Status: DONE • DIDNT START • NEED MORE",
+        ],
+    },
+    "end": {
+        "gentle": [
+            "Wrap up *{{ title }}*?",
+            "*{{ title }}* is ending. How did it go?",
+            "Time's up for *{{ title }}*. Done, or want more time?",
+        ],
+        "coach": [
+            "Did we finish *{{ title }}*? I can reschedule if not.",
+            "*{{ title }}* block is over. Call it: done or more time?",
+            "End of *{{ title }}*. Close it out or book a follow-up?",
+        ],
+        "ds": [
+            "*{{ title }}* ended — DONE • DIDNT START • NEED MORE",
+            "*{{ title }}* over. Report: DONE • DIDNT START • NEED MORE",
+        ],
+    },
+    "free_time": {
+        "gentle": [
+            "You've got {{ minutes }}m free. Use it for:{{ hint }}",
+            "{{ minutes }} open minutes. Anything you'd like to do with them?{{ hint }}",
+        ],
+        "coach": [
+            "Let's claim this {{ minutes }}m gap. Pick one:{{ hint }}",
+            "{{ minutes }}m on the table. Theme, quick win, admin or rest?{{ hint }}",
+        ],
+        "ds": [
+            "Idle {{ minutes }}m detected. Choose now:{{ hint }}",
+            "{{ minutes }}m unassigned. Pick one:{{ hint }}",
+        ],
+    },
+    "drift": {
+        "gentle": [
+            "You're doing *{{ title }}* instead. What do you want to do?",
+            "Looks like *{{ title }}* took over. Keep it, or shift the plan?",
+        ],
+        "coach": [
+            "You're on *{{ title }}* instead of the plan. Keep it, shift, or log it?",
+            "*{{ title }}* isn't what was planned. Your call: keep, shift or log.",
+        ],
+        "ds": [
+            "Off plan: *{{ title }}*. KEEP AS IS • SHIFT • LOG",
+        ],
+    },
+}
+
+_COMPILED: Optional[Dict[str, Dict[str, List[Template]]]] = None
+_COMPILE_LOCK = threading.Lock()
+
+
+def compiled() -> Dict[str, Dict[str, List[Template]]]:
+    """All pools compiled once, on first render (keeps jinja2 out of bot startup)."""
+    global _COMPILED
+    if _COMPILED is None:
+        with _COMPILE_LOCK:
+            if _COMPILED is None:
+                from jinja2 import Environment, StrictUndefined
+                env = Environment(autoescape=False, undefined=StrictUndefined, keep_trailing_newline=False)
+                _COMPILED = {
+                    kind: {tone: [env.from_string(src) for src in variants] for tone, variants in tones.items()}
+                    for kind, tones in SOURCES.items()
+                }
+    return _COMPILED
+
+_ROTATION: Dict[tuple, itertools.count] = {}
+_ROTATION_LOCK = threading.Lock()
+
+
+def resolve_tone(tone: Optional[str], ds_on: bool = True) -> str:
+    """ds only when DS mode is on; anything unknown falls back to gentle."""
+    tone = (tone or "gentle").lower()
+    if tone == "ds" and ds_on:
+        return "ds"
+    if tone == "coach":
+        return "coach"
+    return "gentle"
+
+
+def _next_index(kind: str, tone: str, n: int) -> int:
+    with _ROTATION_LOCK:
+        counter = _ROTATION.setdefault((kind, tone), itertools.count())
+        return next(counter) % n
+
+
+def render(kind: str, tone: Optional[str], *, ds_on: bool = True,
+           variant: Optional[int] = None, **slots) -> str:
+    """
+    Fill the next variant of `kind` for `tone`. `variant` pins a specific
+    variant (e.g. 0 for the canonical copy). Missing slots default to "".
+    """
+    pools = compiled().get(kind)
+    if pools is None:
+        raise ValueError(f"Unknown message kind: {kind}")
+    tone = resolve_tone(tone, ds_on)
+    pool = pools[tone]
+    idx = variant % len(pool) if variant is not None else _next_index(kind, tone, len(pool))
+    values = {"title": "", "meta": "", "minutes": "", "hint": ""}
+    values.update({k: v for k, v in slots.items() if v is not None})
+    return pool[idx].render(**values)
+
+
+def reset_rotation() -> None:
+    with _ROTATION_LOCK:
+        _ROTATION.clear()
@@ -0,0 +1,99 @@
+# ======================
+# agent_brain/update_processor.py
+# ======================
+"""
+Concurrent update processing with per-chat ordering.
+
+PTB processes updates one at a time by default, so a slow LLM parse for one
+chat holds up every other chat's messages and button presses. This processor
+lets updates for different chats run side by side. Updates for the same chat
+still run strictly in arrival order: each chat has a FIFO lock, and an update
+takes it before anything else.
+
+At most MAX_CONCURRENT_UPDATES handlers run at once. That slot is taken only
+after the chat lock, so a burst from one chat cannot fill every slot while it
+waits on itself. MAX_PENDING_UPDATES bounds how many updates PTB hands over
+(running + waiting).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "8"))
+MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", "256"))
+
+
+def chat_key(update: Any) -> Optional[Hashable]:
+    """Chat the update belongs to (falls back to the user); None = no ordering needed."""
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "effective_user", None)
+    return ("user", user.id) if user is not None else None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_UPDATES, max_pending: int = MAX_PENDING_UPDATES):
+        super().__init__(max(max_pending, max_concurrent))
+        self.max_concurrent = max_concurrent
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._depth: Dict[Hashable, int] = {}   # queued + running, per chat
+        self.max_depth = 0
+        self.processed = 0
+        self.running = 0
+
+    async def initialize(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+
+    async def shutdown(self) -> None:
+        self._locks.clear()
+        self._depth.clear()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self._slots is None:
+            await self.initialize()
+        key = chat_key(update)
+        if key is None:
+            async with self._slots:
+                await self._run(coroutine)
+            return
+
+        # Registered before the first await, so arrival order == lock order
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        depth = self._depth[key] = self._depth.get(key, 0) + 1
+        self.max_depth = max(self.max_depth, depth)
+        try:
+            async with lock:
+                async with self._slots:
+                    await self._run(coroutine)
+        finally:
+            left = self._depth[key] - 1
+            if left:
+                self._depth[key] = left
+            else:
+                del self._depth[key]
+                self._locks.pop(key, None)
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self.running += 1
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+            self.processed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        deepest = sorted(self._depth.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        return {
+            "running": self.running,
+            "processed": self.processed,
+            "busy_chats": len(self._depth),
+            "queued": sum(self._depth.values()) - self.running,
+            "max_depth": self.max_depth,
+            "deepest": {str(k): v for k, v in deepest},
+        }
@@ -1,5 +1,5 @@
 # ai_agent_loop.py
-import os, asyncio, inspect, datetime as dt
+import os, asyncio, datetime as dt
 from telegram import Bot
 
 from beia_core.models.timebox import get_events_for_review, mark_ai_reviewed, get_user_context
@@ -8,21 +8,19 @@ from gpt_agent import generate_nudge
 from agent_brain.core import run_brain
 from agent_brain.weekly_audit import run_weekly_audit
 from agent_brain.evening_review import run_evening_review
+from agent_brain import outbox
 
-# helper: call bot.send_message whether it's async (PTB v20+) or sync
-async def _send(bot, **kwargs):
-    fn = bot.send_message
-    if inspect.iscoroutinefunction(fn):
-        return await fn(**kwargs)
-    # sync fallback (older libs or your own wrapper)
-    return await asyncio.to_thread(fn, **kwargs)
+# helper: every loop message goes through the shared outbox (rate limits, retry-after),
+# and messages for the same chat within one pass are merged
+async def _send(bot, *, chat_id, text, parse_mode=None, reply_markup=None):
+    return await outbox.send(bot, chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup)
 
-async def run_ai_loop():
+async def run_ai_loop(bot=None):
     now = dt.datetime.utcnow()
-    bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
+    bot = bot or Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
 
     # 🧠 Main brain pass (was asyncio.run(run_brain()))
-    await run_brain()
+    await run_brain(bot)
 
     # After run_brain() and before review nudges
     await followup_missed_q2(now, bot)
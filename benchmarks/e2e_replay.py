@@ -0,0 +1,100 @@
+"""
+End-to-end latency of bot.handle_message -> actions.handle_action, offline.
+
+OpenAI and Google Calendar traffic is served from the fixture files in
+benchmarks/fixtures (see replay.py); Telegram is replaced by an in-process
+sink that just collects the replies. Postgres is still used, so point
+DATABASE_URL at a local database.
+
+Record fixtures once on a connected machine (real API keys / token.json):
+
+    REPLAY_MODE=record python benchmarks/e2e_replay.py [corpus.txt]
+
+then benchmark anywhere:
+
+    python benchmarks/e2e_replay.py [corpus.txt] [--latency=recorded|none|0.5] [--rounds=3] [--show]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("REPLAY_MODE", "replay")
+for _arg in sys.argv[1:]:
+    if _arg.startswith("--latency="):
+        os.environ["REPLAY_LATENCY"] = _arg.split("=", 1)[1]
+
+import replay  # noqa: E402
+import bot  # noqa: E402
+
+CHAT_ID = int(os.getenv("TELEGRAM_CHAT_ID") or 1)
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "messages.txt")
+
+
+class SinkBot:
+    """Stands in for telegram.Bot: records what would have been sent."""
+
+    def __init__(self):
+        self.sent = []
+        self._next_id = 0
+
+    async def send_message(self, chat_id=None, text=None, **kwargs):
+        self._next_id += 1
+        self.sent.append(text)
+        return SimpleNamespace(message_id=self._next_id, chat_id=chat_id, text=text)
+
+    async def edit_message_text(self, text=None, **kwargs):
+        self.sent.append(text)
+        return SimpleNamespace(text=text)
+
+
+def _update(text, sink):
+    async def reply_text(t, **kwargs):
+        return await sink.send_message(chat_id=CHAT_ID, text=t)
+    message = SimpleNamespace(text=text, reply_text=reply_text, chat_id=CHAT_ID)
+    return SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=CHAT_ID),
+                           effective_message=message, callback_query=None)
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+
+
+async def run(corpus, rounds, show):
+    timings = []
+    for _ in range(rounds):
+        for text in corpus:
+            sink = SinkBot()
+            context = SimpleNamespace(bot=sink, job=None, args=[], user_data={}, chat_data={})
+            t0 = time.perf_counter()
+            await bot.handle_message(_update(text, sink), context)
+            timings.append((time.perf_counter() - t0) * 1000)
+            if show:
+                print(f"{timings[-1]:8.1f}ms {text!r} -> {(sink.sent or [''])[-1]!r:.80}")
+    return timings
+
+
+def main(argv):
+    show = "--show" in argv
+    rounds = next((int(a.split("=", 1)[1]) for a in argv if a.startswith("--rounds=")), 1)
+    args = [a for a in argv if not a.startswith("--")]
+    corpus = load_corpus(args[0] if args else DEFAULT_CORPUS)
+
+    timings = asyncio.run(run(corpus, rounds, show))
+    timings.sort()
+    n = len(timings)
+    print(f"mode:      {replay.mode()} (latency={replay.REPLAY_LATENCY})")
+    print(f"messages:  {n}")
+    print(f"latency:   p50={statistics.median(timings):.1f}ms "
+          f"p95={timings[int(n * 0.95) - 1 if n > 1 else 0]:.1f}ms max={timings[-1]:.1f}ms")
+    for path, left, misses in replay.summary():
+        print(f"fixture:   {os.path.relpath(path)} queued={left} misses={misses}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""
+Feature flag evaluations per second.
+
+Measures FLAGS.get() on the hot path (memoized per user and snapshot version)
+against evaluating the current snapshot directly, for plain flags, per-user
+overrides and percentage rollouts, single-threaded and with several reader
+threads while a writer republishes snapshots, then with evaluation telemetry
+on (every call, and sampled).
+
+    python benchmarks/flag_eval.py [--n 200000] [--threads 4]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_flags import Flags, FlagTelemetry  # noqa: E402
+
+USERS = [str(1000 + i) for i in range(50)]
+KEYS = ["WF0_FTM", "WF2_STREAMING", "WF9_MEMORY", "ROLLOUT_X"]
+
+
+def _flags():
+    flags = Flags()
+    flags.set("ROLLOUT_X", True)
+    flags.set_rollout("ROLLOUT_X", 40, start_ts=int(time.time()) - 60, end_ts=int(time.time()) + 3600)
+    flags.set("WF2_STREAMING", True, user_id=USERS[0])
+    return flags
+
+
+def _rate(fn, n):
+    t0 = time.perf_counter()
+    fn(n)
+    return n / (time.perf_counter() - t0)
+
+
+def run_cached(flags, n):
+    get = flags.get
+    for i in range(n):
+        get(KEYS[i & 3], False, USERS[i % 50])
+
+
+def run_uncached(flags, n):
+    for i in range(n):
+        flags.snapshot().evaluate(KEYS[i & 3], False, USERS[i % 50], time.time())
+
+
+def run_threaded(flags, n, threads):
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            flags.set("WF3_QUADRANTS", not flags.get("WF3_QUADRANTS"))
+            time.sleep(0.01)
+
+    w = threading.Thread(target=writer)
+    readers = [threading.Thread(target=run_cached, args=(flags, n // threads)) for _ in range(threads)]
+    w.start()
+    t0 = time.perf_counter()
+    for r in readers:
+        r.start()
+    for r in readers:
+        r.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    w.join()
+    return (n // threads) * threads / elapsed
+
+
+def main(argv):
+    n = int(argv[argv.index("--n") + 1]) if "--n" in argv else 200_000
+    threads = int(argv[argv.index("--threads") + 1]) if "--threads" in argv else 4
+    flags = _flags()
+    default = flags.telemetry
+    print(f"evaluations: {n}  users: {len(USERS)}  keys: {len(KEYS)}  "
+          f"default telemetry: {'off' if default is None else f'sample={default.sample:g}'}")
+    print(f"  snapshot.evaluate (no memo) : {_rate(lambda k: run_uncached(flags, k), n):>12,.0f} evals/s")
+    print(f"  FLAGS.get (default config)  : {_rate(lambda k: run_cached(flags, k), n):>12,.0f} evals/s")
+    print(f"  FLAGS.get, {threads} readers + writer: {run_threaded(flags, n, threads):>10,.0f} evals/s")
+    for sample in (1.0, 0.05):
+        flags.telemetry = FlagTelemetry(sample=sample)
+        rate = _rate(lambda k: run_cached(flags, k), n)
+        counted = sum(r["evaluations"] for r in flags.telemetry.collect())
+        print(f"  FLAGS.get, telemetry sample={sample:<4g}: {rate:>9,.0f} evals/s  (counted ~{counted:,})")
+    flags.telemetry = default
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,85 @@
+"""
+Cold-import cost of the bot, from `python -X importtime`.
+
+    python benchmarks/import_profile.py [--module=bot] [--runs=3] [--top=15] [--budget-ms=N]
+    python bot.py --import-profile [--budget-ms=N]
+
+Imports the module in fresh interpreters and reports the median cumulative
+import time, the slowest imports, and any heavy SDK that was loaded eagerly.
+Heavy SDKs (openai, Google API client/auth, dateparser, jinja2) are supposed
+to load on first use, not at import. APScheduler is not on that list:
+python-telegram-bot 20.7 imports it in telegram/ext/_jobqueue.py whenever
+it is installed, so `import bot` always loads it.
+
+Exits 1 if the median is over budget or a heavy SDK shows up. The budget
+comes from --budget-ms, then IMPORT_BUDGET_MS, then BUDGET_MS below. It is a
+regression budget: set it from a known-good run on the target machine.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Measured with requirements.txt installed (APScheduler included, ~10ms of it):
+# median ~400-440ms; the budget leaves ~2x headroom for slower machines.
+BUDGET_MS = 1000
+
+# Must not be imported by `import bot`; each one is loaded on first use
+# (apscheduler is left out: python-telegram-bot's job queue imports it eagerly)
+HEAVY = ("openai", "googleapiclient", "google_auth_oauthlib", "google.oauth2", "dateparser", "jinja2")
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str = "bot"):
+    """[(package, self_us, cumulative_us, depth)] for one cold `import module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def heavy_imports(rows):
+    loaded = {name for name, *_ in rows}
+    return sorted(h for h in HEAVY if any(n == h or n.startswith(h + ".") for n in loaded))
+
+
+def main(argv):
+    opts = dict(a[2:].split("=", 1) for a in argv if a.startswith("--") and "=" in a)
+    module = opts.get("module", "bot")
+    runs = int(opts.get("runs", 3))
+    top = int(opts.get("top", 15))
+    budget = float(opts.get("budget-ms") or os.getenv("IMPORT_BUDGET_MS") or BUDGET_MS)
+
+    totals, rows = [], []
+    for _ in range(runs):
+        rows = profile(module)
+        total = next((cum for name, _, cum, _ in rows if name == module), 0)
+        totals.append(total / 1000)
+    median = statistics.median(totals)
+
+    print(f"import {module}: median {median:.0f}ms over {runs} runs (budget {budget:.0f}ms)")
+    print(f"{'cumulative':>12} {'self':>9}  package")
+    for name, self_us, cum_us, depth in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"{cum_us / 1000:10.1f}ms {self_us / 1000:7.1f}ms  {'  ' * depth}{name}")
+
+    heavy = heavy_imports(rows)
+    if heavy:
+        print(f"FAIL: imported eagerly: {', '.join(heavy)}")
+    if median > budget:
+        print(f"FAIL: {median:.0f}ms is over the {budget:.0f}ms budget")
+    return 1 if heavy or median > budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""
+How much of a recorded message corpus skips the LLM parser?
+
+Runs every line of benchmarks/data/messages.txt through the same routing as
+bot.handle_message (parse_command -> fast_parse -> LLM) without calling the
+LLM, and reports the share handled deterministically plus per-message cost.
+
+    python benchmarks/intent_fastpath.py [corpus.txt] [--show]
+"""
+import collections
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gpt_agent  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "messages.txt")
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+
+
+def route(text):
+    parsed = gpt_agent.parse_command(text)
+    if parsed:
+        return "command", parsed
+    parsed = gpt_agent.fast_parse(text)
+    if parsed:
+        return "fast_path", parsed
+    return "llm", gpt_agent.parse_intent(text)
+
+
+def main(argv):
+    show = "--show" in argv
+    args = [a for a in argv if not a.startswith("--")]
+    corpus = load_corpus(args[0] if args else DEFAULT_CORPUS)
+
+    routes = collections.Counter()
+    actions = collections.Counter()
+    timings = []
+    for text in corpus:
+        t0 = time.perf_counter()
+        where, parsed = route(text)
+        timings.append((time.perf_counter() - t0) * 1e6)
+        routes[where] += 1
+        if where != "llm":
+            actions[parsed["action"]] += 1
+        if show:
+            conf = f" ({parsed.get('confidence')})" if parsed and "confidence" in parsed else ""
+            print(f"{where:9} {text!r} -> {parsed and parsed.get('action')}{conf}")
+
+    n = len(corpus)
+    skipped = routes["command"] + routes["fast_path"]
+    print(f"messages:        {n}")
+    print(f"contract cmds:   {routes['command']}")
+    print(f"fast path:       {routes['fast_path']}")
+    print(f"sent to LLM:     {routes['llm']}")
+    print(f"LLM avoided:     {skipped / n:.1%}")
+    print(f"router cost:     p50={statistics.median(timings):.1f}µs max={max(timings):.1f}µs")
+    print("deterministic actions: " + ", ".join(f"{k}={v}" for k, v in sorted(actions.items())))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
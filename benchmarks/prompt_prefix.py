@@ -0,0 +1,73 @@
+"""
+How much of each prompt is a byte-stable prefix?
+
+Builds the request payloads for the main LLM call sites at two different
+moments (different clock, different context) and reports the length of the
+shared leading bytes versus the total. Providers only reuse a cached prefix
+when it matches byte for byte (OpenAI: >= 1024 tokens), so the static part
+should come first and dominate.
+
+    python benchmarks/prompt_prefix.py
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gpt_agent  # noqa: E402
+from agent_brain import core  # noqa: E402
+
+CHARS_PER_TOKEN = 4  # rough, for English + JSON
+
+
+def _payload(messages, tools=None) -> str:
+    # tools are serialized ahead of messages by the provider
+    return json.dumps({"tools": tools or [], "messages": messages}, ensure_ascii=False)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _parse_payload(text, now):
+    gpt_agent.reset_conversation()
+    return _payload(gpt_agent._parse_messages(text, now=now), gpt_agent._PARSE_KW["tools"])
+
+
+def _brain_payload(user, current, focus):
+    messages = [
+        {"role": "system", "content": core.BRAIN_SYSTEM_PROMPT},
+        {"role": "system", "content": core.BRAIN_CONTEXT.format(current_summary=current, focus=focus, energy="High")},
+        {"role": "user", "content": user},
+    ]
+    return _payload(messages)
+
+
+def _reminder_payload(title, phase):
+    return _payload([{"role": "system", "content": gpt_agent._reminder_prompt(title, phase)}])
+
+
+def main():
+    t1 = datetime(2026, 1, 12, 9, 5, tzinfo=gpt_agent.TZ)
+    t2 = t1 + timedelta(days=1, minutes=37)
+    sites = {
+        "parse": (_parse_payload("move gym to 5pm", t1), _parse_payload("cancel dentist friday", t2)),
+        "brain": (_brain_payload("what now?", "Deep Work", "Ship v2"),
+                  _brain_payload("I'm tired", "Gym", "Rest week")),
+        "reminder": (_reminder_payload("Bible Study", "before"), _reminder_payload("Gym", "after")),
+    }
+    print(f"{'site':10} {'total':>8} {'stable':>8} {'stable%':>8} {'~stable tok':>12}")
+    for site, (a, b) in sites.items():
+        stable = _common_prefix(a, b)
+        total = max(len(a), len(b))
+        print(f"{site:10} {total:8d} {stable:8d} {stable / total:8.1%} {stable // CHARS_PER_TOKEN:12d}")
+
+
+if __name__ == "__main__":
+    main()
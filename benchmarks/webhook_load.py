@@ -0,0 +1,104 @@
+"""
+Stand-in for Telegram: POST synthetic updates to a bot running in webhook mode.
+
+Start the bot with BOT_DELIVERY_MODE=webhook (and, to stay offline,
+REPLAY_MODE=replay; see replay.py), then:
+
+    python benchmarks/webhook_load.py --url=http://127.0.0.1:8080/telegram --secret=$WEBHOOK_SECRET \
+        [--count=200] [--concurrency=20] [--chat-id=1] [corpus.txt]
+
+It reports how quickly the server accepts updates (request latency) and how
+long it takes for the handlers to drain them (polling /healthz until the update
+queue is empty). Replies go to --chat-id through the real Bot API, so use a
+test chat, or expect them to fail there without affecting the numbers.
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "messages.txt")
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+
+
+def synthetic_update(update_id, chat_id, text):
+    user = {"id": chat_id, "is_bot": False, "first_name": "Load"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def _health_url(url):
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, "/healthz", "", ""))
+
+
+async def run(url, secret, texts, count, concurrency, chat_id):
+    latencies, statuses = [], {}
+    ids = itertools.count(1)
+    sem = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: secret}) as session:
+        async def post(text):
+            async with sem:
+                t0 = time.perf_counter()
+                async with session.post(url, json=synthetic_update(next(ids), chat_id, text)) as resp:
+                    await resp.read()
+                latencies.append((time.perf_counter() - t0) * 1000)
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(texts[i % len(texts)]) for i in range(count)))
+        accepted = time.perf_counter() - started
+
+        while True:  # handlers are done once PTB's update queue is empty
+            async with session.get(_health_url(url)) as resp:
+                health = await resp.json()
+            if not health.get("update_queue"):
+                break
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - started
+    return latencies, statuses, accepted, drained, health
+
+
+def main(argv):
+    opts = dict(a[2:].split("=", 1) for a in argv if a.startswith("--") and "=" in a)
+    args = [a for a in argv if not a.startswith("--")]
+    url = opts.get("url", "http://127.0.0.1:8080/telegram")
+    secret = opts.get("secret", os.getenv("WEBHOOK_SECRET", ""))
+    count = int(opts.get("count", 200))
+    concurrency = int(opts.get("concurrency", 20))
+    chat_id = int(opts.get("chat-id", os.getenv("TELEGRAM_CHAT_ID") or 1))
+    texts = load_corpus(args[0] if args else DEFAULT_CORPUS)
+
+    latencies, statuses, accepted, drained, health = asyncio.run(
+        run(url, secret, texts, count, concurrency, chat_id))
+    latencies.sort()
+    n = len(latencies)
+    print(f"updates:   {n} (concurrency={concurrency}) statuses={statuses}")
+    print(f"accept:    p50={statistics.median(latencies):.1f}ms "
+          f"p95={latencies[int(n * 0.95) - 1 if n > 1 else 0]:.1f}ms max={latencies[-1]:.1f}ms")
+    print(f"accepted:  {accepted:.2f}s ({n / accepted:.0f} updates/s)")
+    print(f"handled:   {drained:.2f}s ({n / drained:.0f} updates/s)")
+    print(f"outbox:    {health.get('outbox')}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
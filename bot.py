@@ -1,8 +1,7 @@
-import os, logging, datetime as dt, zoneinfo
+import os, sys, asyncio, logging, datetime as dt, zoneinfo
 from dotenv import load_dotenv
 import beia_core.models.timebox as db
 from beia_core.models.enums import Domain
-from beia_core.models.core import Sprint, Build, Subdomain
 
 import re
 
@@ -12,6 +11,8 @@ from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
 
 import gpt_agent
+import feature_flags
+import llm_client
 from agent_brain.scheduler import (
     send_daily_agenda,
     send_time_reminders,
@@ -25,9 +26,12 @@ from datetime import datetime as _dt
 from zoneinfo import ZoneInfo as _ZoneInfo
 from agent_brain import actions as AB
 from agent_brain import observer as OBS
+from agent_brain import outbox
+from agent_brain import idempotency
+from agent_brain.core import flush_history
+from agent_brain.update_processor import PerChatUpdateProcessor
 
 load_dotenv()
-db.init_db()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
@@ -43,18 +47,24 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 1) ✅ Contract-first deterministic parser (CP-1 / CC-3)
     parsed = gpt_agent.parse_command(text)
 
-    # 2) ✅ If not a contract command, use LLM tool-call parser (calendar ops)
+    # 2) ✅ Rule-based fast path for common calendar asks (no LLM round trip)
     if not parsed:
-        parsed = gpt_agent.parse(text)
+        parsed = gpt_agent.fast_parse(text)
 
-    # 3) ✅ If still nothing, route to companion brain (no hardcoded assistant fluff)
+    # 3) ✅ Low confidence / no match: LLM tool-call parser (calendar ops)
+    if not parsed:
+        parsed = await gpt_agent.aparse(text, user_id=str(update.effective_chat.id))
+
+    # 4) ✅ If still nothing, route to companion brain (no hardcoded assistant fluff)
     if not parsed:
         # Push raw user text into the companion brain via AB's existing fallback path
         # so the tone + context rules apply.
         parsed = {"action": "chat_fallback", "user_prompt": text}
 
     try:
-        await AB.handle_action(parsed, update, context)
+        # Repeated contract commands (e.g. DONE <title> sent twice) replay the first reply
+        await idempotency.run_once(update.effective_chat.id, parsed,
+                                   lambda: AB.handle_action(parsed, update, context), bot=context.bot)
     except ValueError as ve:
         await update.message.reply_text(str(ve))
     except Exception as e:
@@ -127,8 +137,10 @@ async def handle_wf0_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         elif verb == "pivot":
             parsed["new_focus"] = arg
 
-    # Reuse your normal action router so replies go through the LLM
-    await AB.handle_action(parsed, update, context)
+    # Reuse your normal action router so replies go through the LLM; double taps run once
+    await idempotency.run_once(update.effective_chat.id, parsed,
+                               lambda: AB.handle_action(parsed, update, context),
+                               bot=context.bot, source=q.data)
 
 async def handle_domain_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -148,6 +160,14 @@ async def handle_domain_callback(update: Update, context: ContextTypes.DEFAULT_T
         await q.edit_message_text("⚠️ Invalid domain choice format.")
         return
 
+    # A double tap must not write the calendar twice; the first tap already edited the message
+    await idempotency.run_once(
+        update.effective_chat.id, {"action": "link_domain", "event_id": event_id},
+        lambda: _link_domain(q, event_id, domain, subdomain_slug, build_id, sprint_id),
+        bot=context.bot, source=q.data,
+    )
+
+async def _link_domain(q, event_id, domain, subdomain_slug, build_id, sprint_id):
     try:
         # Update both GCal + Postgres
         cal.link_event_to_domain(
@@ -217,7 +237,8 @@ async def handle_pivot_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     parsed = {"action": "pivot", "segment_id": seg["id"], "new_focus": new_focus or "Ad‑hoc Focus"}
-    await AB.handle_action(parsed, update, context)
+    await idempotency.run_once(update.effective_chat.id, parsed,
+                               lambda: AB.handle_action(parsed, update, context), bot=context.bot)
 
 async def wf0_tick(context):
     """Runs every minute. Pulls FSM ticks & gap detections and dispatches actions."""
@@ -234,12 +255,23 @@ async def wf0_tick(context):
     shim_update.callback_query = None
     shim_update.message = None
 
-    for r in results:
-        parsed = {"action": r["action"], "segment_id": r["segment_id"]}
-        await AB.handle_action(parsed, shim_update, context)
+    # Everything this tick says to the chat is merged into one message by the outbox
+    async with outbox.coalesce():
+        for r in results:
+            parsed = {"action": r["action"], "segment_id": r["segment_id"]}
+            await AB.handle_action(parsed, shim_update, context)
         
 async def ai_loop_job(context):
-    await run_ai_loop()
+    await run_ai_loop(context.bot)
+    # Hourly: prompt size / cached-prefix tokens / latency per LLM call site
+    report = llm_client.prompt_report()
+    if report:
+        logging.info(f"[llm] prompt report: {report}")
+        logging.info(f"[llm] health: {llm_client.health()}")
+    logging.info(f"[outbox] {outbox.stats()}")
+    processor = getattr(context.application, "update_processor", None)
+    if isinstance(processor, PerChatUpdateProcessor):
+        logging.info(f"[updates] {processor.stats()}")
     
 async def weekly_audit_job(context):
     await send_weekly_audit()
@@ -247,12 +279,32 @@ async def weekly_audit_job(context):
 async def evening_review_job(context):
     await run_evening_review()
 
+async def on_startup(app):
+    """post_init hook: one-time initialization that importing this module must not do."""
+    await asyncio.to_thread(db.init_db)
+    # The reminder replan runs at once and the agenda job reads the DB: start them only once the schema exists
+    send_daily_agenda(app)
+    send_time_reminders(app)
+    if feature_flags.WATCH_ENABLED:
+        feature_flags.start_watcher()
+    feature_flags.start_telemetry()
+
+async def on_shutdown(app):
+    """post_shutdown hook: let queued conversation writes reach the DB, then close the LLM connection pools."""
+    await flush_history()
+    await llm_client.aclose()
+
 def main():
+    # polling (default) or webhook (aiohttp server on the same loop; see webhook_server.py)
+    delivery = (os.getenv("BOT_DELIVERY_MODE") or "polling").lower()
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     if not token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN missing")
 
-    app = ApplicationBuilder().token(token).build()
+    builder = ApplicationBuilder().token(token).post_init(on_startup).post_shutdown(on_shutdown)
+    # Chats run concurrently; updates within one chat stay in order
+    builder.concurrent_updates(PerChatUpdateProcessor())
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("today", today))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
@@ -261,11 +313,7 @@ def main():
     app.job_queue.run_repeating(ai_loop_job, interval=3600)
     app.job_queue.run_repeating(wf0_tick, interval=60, first=0)
 
-    # ✅ Daily Agenda (early morning)
-    send_daily_agenda(app)
-
-    # ✅ Time-sensitive event reminders
-    send_time_reminders(app)
+    # ✅ Daily Agenda (early morning) and time-sensitive event reminders start in on_startup, after init_db
 
     # 🧠 Weekly Audit (Sunday 21:00)
     app.job_queue.run_daily(weekly_audit_job, time=dt.time(hour=21, minute=0, tzinfo=TZ), days=(6,))
@@ -279,8 +327,19 @@ def main():
         handle_pivot_text
     )
 )
-    
-    app.run_polling()
+
+    if delivery == "webhook":
+        import webhook_server
+        webhook_server.run(app)
+    else:
+        app.run_polling()
     
 if __name__ == "__main__":
-    main()
+    if "--import-profile" in sys.argv[1:]:
+        # python bot.py --import-profile [--budget-ms=N]: cold-import report (benchmarks/import_profile.py)
+        import runpy
+        sys.argv = [sys.argv[0]] + [a for a in sys.argv[1:] if a != "--import-profile"]
+        runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "import_profile.py"),
+                       run_name="__main__")
+    else:
+        main()
@@ -3,23 +3,25 @@ import datetime as dt
 import zoneinfo
 from typing import List, Dict, Optional, Union
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
 from beia_core.models.timebox import insert_segment
 from beia_core.models import timebox as db
 
 import json
 
 from dateutil.parser import isoparse
-import dateparser
+
+from agent_brain import timeline
+import replay
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 TZ = zoneinfo.ZoneInfo(os.getenv("TIMEZONE", "UTC"))
 
-def _get_creds() -> Credentials:
+def _get_creds():
     import base64
+    # Google auth libraries are imported on first use: they are slow to load
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
     creds = None
     token_path = 'token.json'
     creds_path = 'client_secret.json'
@@ -54,6 +56,11 @@ def _get_creds() -> Credentials:
     return creds
 
 def _service():
+    from googleapiclient.discovery import build  # lazy: ~0.3s to import
+    # REPLAY_MODE=record|replay swaps in replay.py's recording / offline transport
+    http = replay.calendar_http(_get_creds)
+    if http is not None:
+        return build('calendar', 'v3', http=http, cache_discovery=False)
     creds = _get_creds()
     return build('calendar', 'v3', credentials=creds)
 
@@ -61,7 +68,7 @@ def _service():
 
 BUFFER_MIN = int(os.getenv("TRANSITION_BUFFER_MIN", "5"))  # 5–10 as per spec
 
-def _get_rigidity_from_event(ev: Dict) -> str:
+def _explicit_rigidity_from_event(ev: Dict) -> Optional[str]:
     # Prefer extendedProperties.private.rigidity, fallback to a #rigidity: tag in description
     rig = (
         ev.get("extendedProperties", {})
@@ -74,7 +81,10 @@ def _get_rigidity_from_event(ev: Dict) -> str:
     for tag in ("#rigidity:hard", "#rigidity:firm", "#rigidity:soft", "#rigidity:free"):
         if tag in desc:
             return tag.split(":")[1]
-    return "soft"  # default
+    return None
+
+def _get_rigidity_from_event(ev: Dict) -> str:
+    return _explicit_rigidity_from_event(ev) or "soft"  # default
 
 def _set_rigidity_on_event(ev: Dict, rigidity: str) -> None:
     ev.setdefault("extendedProperties", {}).setdefault("private", {})["rigidity"] = rigidity
@@ -131,23 +141,35 @@ def move_block(event_id: str, new_start: dt.datetime, new_end: dt.datetime,
     if rigidity == "firm" and not require_confirm:
         raise ValueError("⚠️ This event is firm. Confirmation is required to move it.")
 
-    # Add transition buffer vs the previous event ending right before new_start (best effort)
+    # Add transition buffer vs the previous event ending right before new_start (best effort).
+    # The reconcile step publishes a buffered free-slot index for today; use it when it
+    # covers the target day instead of an extra calendar round trip.
+    index = timeline.current_index(new_start)
     prev_end = None
-    # Pull the event immediately before the proposed start to compute a minimal buffer
-    prev = service.events().list(
-        calendarId='primary',
-        timeMax=new_start.isoformat(),
-        maxResults=1,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute().get('items', [])
-    if prev:
-        # If there's a previous event that ends close to the new start, capture its end
-        ps = prev[0]['end'].get('dateTime', prev[0]['end'].get('date'))
-        prev_end = isoparse(ps).astimezone(TZ)
+    if index:
+        # the block being moved must not count as its own "previous" event
+        prev_end = index.prev_end(new_start, ignore_id=f"gcal:{event_id}")
+    else:
+        # Pull the event immediately before the proposed start to compute a minimal buffer
+        # (two results: one of them may be the block being moved)
+        prev = service.events().list(
+            calendarId='primary',
+            timeMax=new_start.isoformat(),
+            maxResults=2,
+            singleEvents=True,
+            orderBy='startTime'
+        ).execute().get('items', [])
+        prev = [p for p in prev if p.get('id') != event_id]
+        if prev:
+            # If there's a previous event that ends close to the new start, capture its end
+            ps = prev[0]['end'].get('dateTime', prev[0]['end'].get('date'))
+            prev_end = isoparse(ps).astimezone(TZ)
     new_start_buf = _with_transition_buffer(prev_end, new_start)
 
-    # Conflict check
+    # Conflict check: the index answers known conflicts (incl. buffers) locally;
+    # a clear slot is still confirmed against the live calendar.
+    if index and index.conflicts(new_start_buf, new_end, buffer_min=0, ignore_id=f"gcal:{event_id}"):
+        raise ValueError("⛔ Conflict detected with another event in the proposed time.")
     if _has_conflict(service, new_start_buf, new_end, ignore_event_id=event_id):
         raise ValueError("⛔ Conflict detected with another event in the proposed time.")
 
@@ -157,6 +179,8 @@ def move_block(event_id: str, new_start: dt.datetime, new_end: dt.datetime,
 
     updated = service.events().update(calendarId='primary', eventId=event_id, body=ev).execute()
     log_event_action("update", updated)
+    # Free the old slot and take the new one in the published index until the next rebuild
+    timeline.mark_busy([(new_start_buf, new_end, f"gcal:{event_id}")], drop_ids=[f"gcal:{event_id}"])
     return updated
 
 def create_event(
@@ -266,6 +290,42 @@ def list_today() -> List[Dict]:
         orderBy='startTime'
     ).execute().get('items', [])
 
+def list_out_of_office(start: dt.datetime, end: dt.datetime) -> List[Dict]:
+    """Out-of-office events in [start, end) (used by the gating policy)."""
+    service = _service()
+    return service.events().list(
+        calendarId='primary',
+        timeMin=start.isoformat(),
+        timeMax=end.isoformat(),
+        eventTypes=['outOfOffice'],
+        singleEvents=True,
+        orderBy='startTime'
+    ).execute().get('items', [])
+
+def create_events_batch(bodies: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Insert several events in one batched HTTP round trip.
+    `bodies` maps a caller key -> event body; returns key -> created event
+    (keys whose insert failed are missing from the result).
+    """
+    if not bodies:
+        return {}
+    service = _service()
+    created: Dict[str, Dict] = {}
+
+    def _cb(request_id, response, exception):
+        if exception is not None:
+            print(f"[calendar] batch insert failed for {request_id}: {exception}")
+            return
+        created[request_id] = response
+        log_event_action("create", response)
+
+    batch = service.new_batch_http_request(callback=_cb)
+    for key, body in bodies.items():
+        batch.add(service.events().insert(calendarId='primary', body=body), request_id=key)
+    batch.execute()
+    return created
+
 def reschedule_event(original_title: str, new_start: dt.datetime) -> Optional[Dict]:
     """
     Find the next upcoming event matching `original_title` and move it to `new_start`,
@@ -396,6 +456,7 @@ def parse_compound_range(phrase: str) -> Optional[Dict[str, dt.datetime]]:
     return {"start": start, "end": end}
 
 def parse_loose_natural_time(phrase: str) -> Optional[dt.datetime]:
+    import dateparser  # lazy: loads its locale data on import
     dt_obj = dateparser.parse(phrase, settings={'TIMEZONE': str(TZ), 'RETURN_AS_TIMEZONE_AWARE': True})
     return dt_obj
 
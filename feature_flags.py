@@ -1,10 +1,11 @@
 # feature_flags.py
 from __future__ import annotations
-import os, json, threading, time
+import os, json, inspect, logging, random, threading, time, itertools
 from dataclasses import dataclass, field
 from functools import wraps
 from pathlib import Path
-from typing import Callable, Dict, Optional
+from types import MappingProxyType
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
 
 # ---------- Defaults: full 18 workflows + #0 subfeatures ----------
 DEFAULT_FLAGS: Dict[str, bool] = {
@@ -20,10 +21,12 @@ DEFAULT_FLAGS: Dict[str, bool] = {
     "WF0_BUFFERS": True,           # 5–10m transition + travel buffers
     "WF0_JETLAG": True,            # soften tones on tz shift
     "WF0_SIGNALS": False,          # opt-in device/activity signals
+    "WF0_LLM_TONE": False,         # LLM-written FSM copy instead of tone templates
 
     # WF1–WF17
     "WF1_REMINDERS": True,
     "WF2_CONVERSATION": True,
+    "WF2_STREAMING": False,        # stream brain replies via progressive message edits
     "WF3_QUADRANTS": False,
     "WF4_EVENING_REVIEW": True,
     "WF5_ACCOUNTABILITY": False,
@@ -45,34 +48,100 @@ DEFAULT_FLAGS: Dict[str, bool] = {
 FLAGS_FILE = os.getenv("FLAGS_FILE", "config/flags.yml")  # supports .yml or .json
 
 # ---------- Types ----------
-@dataclass
+@dataclass(frozen=True)
 class FlagRollout:
     # percentage rollout (0-100), optional time window (epoch seconds)
     percent: int = 100
     start_ts: Optional[int] = None
     end_ts: Optional[int] = None
 
-@dataclass
-class FlagStore:
-    values: Dict[str, bool] = field(default_factory=lambda: DEFAULT_FLAGS.copy())
-    user_overrides: Dict[str, Dict[str, bool]] = field(default_factory=dict)
-    rollouts: Dict[str, FlagRollout] = field(default_factory=dict)
-    _mtime: float = 0.0
+_VERSIONS = itertools.count(1)
+
+@dataclass(frozen=True)
+class FlagSnapshot:
+    """
+    Immutable view of every flag. Readers grab the current snapshot without a
+    lock; writers build a new one and swap the reference (copy-on-write).
+    `version` is unique per published snapshot and keys the evaluation memo.
+    """
+    values: Mapping[str, bool] = field(default_factory=lambda: MappingProxyType(DEFAULT_FLAGS.copy()))
+    user_overrides: Mapping[str, Mapping[str, bool]] = field(default_factory=lambda: MappingProxyType({}))
+    rollouts: Mapping[str, FlagRollout] = field(default_factory=lambda: MappingProxyType({}))
+    mtime: float = 0.0
+    version: int = field(default_factory=lambda: next(_VERSIONS))
+
+    @classmethod
+    def build(cls, values: Dict[str, bool], user_overrides: Dict[str, Dict[str, bool]],
+              rollouts: Dict[str, FlagRollout], mtime: float = 0.0) -> "FlagSnapshot":
+        return cls(
+            values=MappingProxyType(dict(values)),
+            user_overrides=MappingProxyType({u: MappingProxyType(dict(f)) for u, f in user_overrides.items()}),
+            rollouts=MappingProxyType(dict(rollouts)),
+            mtime=mtime,
+        )
+
+    def replace(self, **changes) -> "FlagSnapshot":
+        """A new snapshot (new version) with some fields swapped."""
+        return FlagSnapshot.build(
+            changes.get("values", self.values),
+            changes.get("user_overrides", self.user_overrides),
+            changes.get("rollouts", self.rollouts),
+            changes.get("mtime", self.mtime),
+        )
+
+    def evaluate(self, key: str, default: bool, user_id: Optional[str], now: float) -> bool:
+        uid = str(user_id) if user_id else None
+        if uid and key in self.user_overrides.get(uid, ()):
+            return self.user_overrides[uid][key]
+        base = self.values.get(key, default)
+        r = self.rollouts.get(key)
+        if r is not None and not _rollout_allows(uid, r, now):
+            return False
+        return base
+
+    def valid_until(self, now: float) -> float:
+        """Next rollout window edge after `now`; evaluations may change there."""
+        edges = [ts for r in self.rollouts.values() for ts in (r.start_ts, r.end_ts) if ts and ts >= now]
+        return min(edges) if edges else float("inf")
+
+def _rollout_allows(user_id: Optional[str], r: FlagRollout, now: float) -> bool:
+    if r.start_ts and now < r.start_ts: return False
+    if r.end_ts and now > r.end_ts: return False
+    if r.percent >= 100: return True
+    if r.percent <= 0: return False
+    bucket_source = str(user_id or "0")
+    bucket = (sum(ord(c) for c in bucket_source) % 100)
+    return bucket < r.percent
 
 # ---------- Helper: YAML/JSON loader (no external deps) ----------
-def _load_config_file(path: Path) -> Dict:
+class FlagConfigError(ValueError):
+    """The flags file could not be parsed or failed validation."""
+
+def _load_config_file(path: Path, strict: bool = False) -> Dict:
     if not path.exists():
         return {}
-    text = path.read_text(encoding="utf-8")
+    try:
+        text = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError) as e:
+        if strict:
+            raise FlagConfigError(f"cannot read: {e}") from e
+        return {}
     if not text.strip():
         return {}
     # Prefer PyYAML if installed (handles {}, [], numbers, etc.)
     try:
         import yaml  # type: ignore
         data = yaml.safe_load(text)
+        if strict and data is not None and not isinstance(data, dict):
+            raise FlagConfigError("top level must be a mapping")
         return data if isinstance(data, dict) else {}
-    except Exception:
+    except ImportError:
         pass
+    except FlagConfigError:
+        raise
+    except Exception as e:
+        if strict:
+            raise FlagConfigError(f"invalid YAML: {e}") from e
 
     # Fallback: current minimal parser
     data: Dict = {}
@@ -115,81 +184,339 @@ def _load_config_file(path: Path) -> Dict:
         last_key = key
     return data
 
+def _env_values() -> Dict[str, bool]:
+    values = DEFAULT_FLAGS.copy()
+    for k in list(values.keys()):
+        envv = os.getenv(f"FLAG_{k}")
+        if envv is not None:
+            values[k] = envv.lower() in ("1","true","yes","on")
+    return values
+
+def _is_ts(v) -> bool:
+    return v is None or (isinstance(v, int) and not isinstance(v, bool))
+
+def load_snapshot(path: Path, mtime: float = 0.0) -> FlagSnapshot:
+    """
+    Parse and validate the flags file into a snapshot (env FLAG_<K> applied
+    first, the file wins). Raises FlagConfigError listing every problem;
+    nothing is published here.
+    """
+    cfg = _load_config_file(path, strict=True)
+    values = _env_values()
+    user_overrides: Dict[str, Dict[str, bool]] = {}
+    rollouts_out: Dict[str, FlagRollout] = {}
+    errors = []
+
+    flags_map = cfg.get("flags") or {}
+    file_overrides = cfg.get("user_overrides") or {}
+    rollouts = cfg.get("rollouts") or {}
+    for name, section in (("flags", flags_map), ("user_overrides", file_overrides), ("rollouts", rollouts)):
+        if not isinstance(section, dict):
+            errors.append(f"{name}: expected a mapping, got {type(section).__name__}")
+    if errors:
+        raise FlagConfigError("; ".join(errors))
+
+    for k, v in flags_map.items():
+        if isinstance(v, bool):
+            values[k] = v
+        else:
+            errors.append(f"flags.{k}: expected true/false, got {v!r}")
+
+    for uid, flags in file_overrides.items():
+        if not isinstance(flags, dict):
+            errors.append(f"user_overrides.{uid}: expected a mapping")
+            continue
+        bad = [k for k, v in flags.items() if not isinstance(v, bool)]
+        errors.extend(f"user_overrides.{uid}.{k}: expected true/false, got {flags[k]!r}" for k in bad)
+        user_overrides[str(uid)] = {k: v for k, v in flags.items() if isinstance(v, bool)}
+
+    for k, r in rollouts.items():
+        if not isinstance(r, dict):
+            errors.append(f"rollouts.{k}: expected a mapping")
+            continue
+        percent, start_ts, end_ts = r.get("percent", 100), r.get("start_ts"), r.get("end_ts")
+        if isinstance(percent, bool) or not isinstance(percent, int) or not 0 <= percent <= 100:
+            errors.append(f"rollouts.{k}.percent: expected an integer 0-100, got {percent!r}")
+        elif not (_is_ts(start_ts) and _is_ts(end_ts)):
+            errors.append(f"rollouts.{k}: start_ts/end_ts must be epoch seconds")
+        elif start_ts and end_ts and end_ts <= start_ts:
+            errors.append(f"rollouts.{k}: end_ts must be after start_ts")
+        else:
+            rollouts_out[k] = FlagRollout(percent=percent, start_ts=start_ts, end_ts=end_ts)
+
+    if errors:
+        raise FlagConfigError("; ".join(errors))
+    return FlagSnapshot.build(values, user_overrides, rollouts_out, mtime)
+
+@dataclass(frozen=True)
+class FlagChange:
+    """Passed to subscribers after a snapshot with different flags is published."""
+    old: FlagSnapshot
+    new: FlagSnapshot
+    keys: FrozenSet[str]    # flags whose value, rollout or any user override changed
+
+    @classmethod
+    def between(cls, old: FlagSnapshot, new: FlagSnapshot) -> "FlagChange":
+        keys = {k for k in old.values.keys() | new.values.keys() if old.values.get(k) != new.values.get(k)}
+        keys |= {k for k in old.rollouts.keys() | new.rollouts.keys() if old.rollouts.get(k) != new.rollouts.get(k)}
+        for uid in old.user_overrides.keys() | new.user_overrides.keys():
+            a, b = old.user_overrides.get(uid, {}), new.user_overrides.get(uid, {})
+            keys |= {k for k in a.keys() | b.keys() if a.get(k) != b.get(k)}
+        return cls(old, new, frozenset(keys))
+
+    def turned_on(self, key: str) -> bool:
+        return key in self.keys and bool(self.new.values.get(key)) and not self.old.values.get(key)
+
+    def turned_off(self, key: str) -> bool:
+        return key in self.keys and bool(self.old.values.get(key)) and not self.new.values.get(key)
+
+# ---------- Telemetry: evaluation counts + if_flag latency ----------
+# Off by default: counting costs about as much as the memoized lookup itself (see benchmarks/flag_eval.py)
+TELEMETRY_ENABLED = os.getenv("FLAGS_TELEMETRY", "0").lower() in ("1","true","yes","on")
+TELEMETRY_SAMPLE = float(os.getenv("FLAGS_TELEMETRY_SAMPLE", "1"))     # fraction of get() calls counted
+METRICS_SINK = os.getenv("FLAGS_METRICS_SINK", "log").lower()          # log | db | none
+METRICS_FLUSH_S = float(os.getenv("FLAGS_METRICS_FLUSH_S", "60"))
+
+def user_bucket(user_id: Optional[str]) -> str:
+    """Coarse user bucket for telemetry: tens of the rollout bucket ("b0".."b9"), or "anon"."""
+    if not user_id:
+        return "anon"
+    return f"b{(sum(ord(c) for c in str(user_id)) % 100) // 10}"
+
+def log_sink(rows: List[Dict]) -> None:
+    top = sorted(rows, key=lambda r: r["evaluations"], reverse=True)[:10]
+    summary = ", ".join(f"{r['flag']}[{r['bucket']}]={r['evaluations']}" for r in top)
+    calls = ", ".join(f"{r['flag']}={r['calls']}x/{r['call_ms']:.0f}ms" for r in rows if r["calls"])
+    logging.info(f"[flags] telemetry: {len(rows)} rows; top: {summary}" + (f"; calls: {calls}" if calls else ""))
+
+class DbSink:
+    """Appends one row per (flag, bucket) per flush to flag_metrics."""
+
+    def __init__(self):
+        self._schema_ready = False
+
+    def ensure_schema(self, db) -> None:
+        if self._schema_ready:
+            return
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS flag_metrics (
+                    flushed_at  TIMESTAMPTZ      NOT NULL DEFAULT NOW(),
+                    flag        TEXT             NOT NULL,
+                    bucket      TEXT             NOT NULL,
+                    evaluations BIGINT           NOT NULL,
+                    true_count  BIGINT           NOT NULL,
+                    calls       BIGINT           NOT NULL,
+                    call_ms     DOUBLE PRECISION NOT NULL
+                )
+            """)
+            conn.commit()
+        self._schema_ready = True
+
+    def __call__(self, rows: List[Dict]) -> None:
+        import beia_core.models.timebox as db  # not needed unless this sink is used
+        self.ensure_schema(db)
+        with db.get_conn() as conn, conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO flag_metrics (flag, bucket, evaluations, true_count, calls, call_ms) "
+                "VALUES (%(flag)s, %(bucket)s, %(evaluations)s, %(true_count)s, %(calls)s, %(call_ms)s)",
+                rows,
+            )
+            conn.commit()
+
+def _default_sink() -> Optional[Callable[[List[Dict]], None]]:
+    return {"log": log_sink, "db": DbSink(), "none": None}.get(METRICS_SINK, log_sink)
+
+class FlagTelemetry:
+    """
+    Per-flag, per-user-bucket counters: [evaluations, true, if_flag calls, call seconds].
+    Each thread bumps its own dict (no lock on the hot path); counters only
+    grow, and flush() sends the difference since the previous flush to the
+    sink in one batch, from a background thread. With sample < 1 only that
+    fraction of get() calls is counted and evaluations/true_count are scaled
+    back up (estimates); if_flag calls are always counted.
+    """
+
+    def __init__(self, sink: Optional[Callable[[List[Dict]], None]] = None, *,
+                 sample: float = TELEMETRY_SAMPLE):
+        self.sink = sink
+        self.sample = min(1.0, max(sample, 1e-6))
+        self._local = threading.local()
+        self._threads: List[Dict[Tuple[str, str], list]] = []
+        self._register_lock = threading.Lock()
+        self._flushed: Dict[Tuple[int, Tuple[str, str]], Tuple] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _counts(self) -> Dict[Tuple[str, str], list]:
+        try:
+            return self._local.counts
+        except AttributeError:
+            counts = self._local.counts = {}
+            with self._register_lock:
+                self._threads.append(counts)
+            return counts
+
+    def record_eval(self, key: str, bucket: str, value: bool) -> None:
+        counts = self._counts()
+        c = counts.get((key, bucket))
+        if c is None:
+            c = counts[(key, bucket)] = [0, 0, 0, 0.0]
+        c[0] += 1
+        if value:
+            c[1] += 1
+
+    def record_call(self, key: str, bucket: str, seconds: float) -> None:
+        counts = self._counts()
+        c = counts.get((key, bucket))
+        if c is None:
+            c = counts[(key, bucket)] = [0, 0, 0, 0.0]
+        c[2] += 1
+        c[3] += seconds
+
+    def collect(self) -> List[Dict]:
+        """Rows with what changed since the last collect(); totals summed across threads."""
+        with self._register_lock:
+            threads = list(self._threads)
+        totals: Dict[Tuple[str, str], list] = {}
+        for i, counts in enumerate(threads):
+            for k, c in list(counts.items()):
+                cur = tuple(c)
+                prev = self._flushed.get((i, k), (0, 0, 0, 0.0))
+                if cur == prev:
+                    continue
+                self._flushed[(i, k)] = cur
+                t = totals.setdefault(k, [0, 0, 0, 0.0])
+                for j in range(4):
+                    t[j] += cur[j] - prev[j]
+        scale = 1.0 / self.sample
+        return [{"flag": k[0], "bucket": k[1], "evaluations": round(t[0] * scale), "true_count": round(t[1] * scale),
+                 "calls": t[2], "call_ms": round(t[3] * 1000, 3)}
+                for k, t in sorted(totals.items())]
+
+    def flush(self) -> int:
+        rows = self.collect()
+        if rows and self.sink is not None:
+            try:
+                self.sink(rows)
+            except Exception as e:
+                logging.warning(f"[flags] telemetry sink failed, dropped {len(rows)} rows: {e}")
+        return len(rows)
+
+    def start(self, interval: float = METRICS_FLUSH_S) -> "FlagTelemetry":
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.flush()
+            self.flush()  # final partial interval on stop
+
+        self._thread = threading.Thread(target=run, name="flag-telemetry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
 # ---------- Core Flags manager ----------
-# ---------- Core Flags manager ----------
+MEMO_MAX_USERS = int(os.getenv("FLAGS_MEMO_MAX_USERS", "4096"))
+
 class Flags:
     def __init__(self):
-        self._lock = threading.RLock()
-        self._store = FlagStore()
-        self.reload()  # env/file overrides at boot
+        self._lock = threading.Lock()      # writers only; get() never takes it
+        self._snap = FlagSnapshot.build(_env_values(), {}, {})
+        self._subscribers: List[Callable[[FlagChange], None]] = []
+        # user -> (snapshot version, valid_until, {(key, default): value}, telemetry bucket)
+        self._memo: Dict[Optional[str], Tuple[int, float, Dict[Tuple[str, bool], bool], str]] = {}
+        self.telemetry = FlagTelemetry(_default_sink()) if TELEMETRY_ENABLED else None
+        self.reload()  # file overrides at boot; a bad file leaves env/defaults in place
 
     # public API
     def get(self, key: str, default: bool = False, user_id: Optional[str]=None) -> bool:
+        snap = self._snap                  # one atomic read; the snapshot never changes under us
+        uid = str(user_id) if user_id else None
+        entry = self._memo.get(uid)
+        if entry is None or entry[0] != snap.version or (snap.rollouts and time.time() >= entry[1]):
+            if len(self._memo) >= MEMO_MAX_USERS:
+                self._memo.clear()
+            now = time.time()
+            entry = self._memo[uid] = (snap.version, snap.valid_until(now), {}, user_bucket(uid))
+        cache = entry[2]
+        value = cache.get((key, default))
+        if value is None:
+            value = cache[(key, default)] = snap.evaluate(key, default, uid, time.time())
+        tel = self.telemetry
+        if tel is not None and (tel.sample >= 1.0 or random.random() < tel.sample):
+            tel.record_eval(key, entry[3], value)
+        return value
+
+    def snapshot(self) -> FlagSnapshot:
+        return self._snap
+
+    def publish(self, snap: FlagSnapshot) -> None:
+        """Make `snap` current. Readers see either the old or the new one, never a mix."""
+        self._update(lambda _old: snap)
+
+    def subscribe(self, fn: Callable[[FlagChange], None]) -> Callable[[], None]:
+        """Call `fn(change)` after every publish that changes a flag. Returns an unsubscribe."""
+        with self._lock:
+            if fn not in self._subscribers:
+                self._subscribers = [*self._subscribers, fn]
+        def unsubscribe():
+            with self._lock:
+                self._subscribers = [f for f in self._subscribers if f is not fn]
+        return unsubscribe
+
+    def _update(self, build: Callable[[FlagSnapshot], FlagSnapshot]) -> FlagSnapshot:
         with self._lock:
-            if user_id and key in self._store.user_overrides.get(str(user_id), {}):
-                return self._store.user_overrides[str(user_id)][key]
-            base = self._store.values.get(key, default)
-            if key in self._store.rollouts:
-                if not self._rollout_allows(user_id, self._store.rollouts[key]):
-                    return False
-            return base
+            old = self._snap
+            new = self._snap = build(old)
+            subscribers = self._subscribers
+        # notify outside the lock: a subscriber may read or even write flags
+        change = FlagChange.between(old, new)
+        if change.keys:
+            for fn in subscribers:
+                try:
+                    fn(change)
+                except Exception:
+                    logging.exception(f"[flags] subscriber {getattr(fn, '__name__', fn)} failed")
+        return new
 
     def set(self, key: str, value: bool, user_id: Optional[str]=None):
-        with self._lock:
-            if user_id:
-                self._store.user_overrides.setdefault(str(user_id), {})[key] = value
-            else:
-                self._store.values[key] = value
+        if user_id:
+            def build(snap):
+                overrides = {u: dict(f) for u, f in snap.user_overrides.items()}
+                overrides.setdefault(str(user_id), {})[key] = value
+                return snap.replace(user_overrides=overrides)
+            self._update(build)
+        else:
+            self._update(lambda snap: snap.replace(values={**snap.values, key: value}))
 
     def set_rollout(self, key: str, percent: int, start_ts: Optional[int]=None, end_ts: Optional[int]=None):
-        with self._lock:
-            self._store.rollouts[key] = FlagRollout(percent=percent, start_ts=start_ts, end_ts=end_ts)
+        rollout = FlagRollout(percent=percent, start_ts=start_ts, end_ts=end_ts)
+        self._update(lambda snap: snap.replace(rollouts={**snap.rollouts, key: rollout}))
 
     def bulk(self) -> Dict[str, bool]:
-        with self._lock:
-            return self._store.values.copy()
+        return dict(self._snap.values)
 
-    def reload(self):
-        with self._lock:
-            store = FlagStore(values=DEFAULT_FLAGS.copy())
-
-            # env overrides
-            for k in list(store.values.keys()):
-                envv = os.getenv(f"FLAG_{k}")
-                if envv is not None:
-                    store.values[k] = envv.lower() in ("1","true","yes","on")
-
-            # file overrides
-            path = Path(FLAGS_FILE)
-            cfg = _load_config_file(path)
-            cfg = cfg if isinstance(cfg, dict) else {}
-
-            flags_map = cfg.get("flags") or {}
-            user_overrides = cfg.get("user_overrides") or {}
-            rollouts = cfg.get("rollouts") or {}
-
-            if not isinstance(flags_map, dict): flags_map = {}
-            if not isinstance(user_overrides, dict): user_overrides = {}
-            if not isinstance(rollouts, dict): rollouts = {}
-
-            for k, v in flags_map.items():
-                if isinstance(v, bool):
-                    store.values[k] = v
-
-            for uid, flags in user_overrides.items():
-                if isinstance(flags, dict):
-                    store.user_overrides[str(uid)] = {k: bool(v) for k, v in flags.items()}
-
-            for k, r in rollouts.items():
-                if isinstance(r, dict):
-                    store.rollouts[k] = FlagRollout(
-                        percent=int(r.get("percent", 100)),
-                        start_ts=r.get("start_ts"),
-                        end_ts=r.get("end_ts")
-                    )
-
-            self._store = store
-            self._store._mtime = path.stat().st_mtime if path.exists() else time.time()
+    def reload(self) -> bool:
+        """
+        Re-read FLAGS_FILE and publish it. On a parse/validation error the
+        current snapshot stays in place and False is returned.
+        """
+        path = Path(FLAGS_FILE)
+        try:
+            mtime = path.stat().st_mtime if path.exists() else time.time()
+            snap = load_snapshot(path, mtime)
+        except (OSError, FlagConfigError) as e:
+            logging.warning(f"[flags] {path}: {e}; keeping snapshot v{self._snap.version}")
+            return False
+        self.publish(snap)
+        return True
 
     def maybe_hot_reload(self):
         path = Path(FLAGS_FILE)
@@ -197,44 +524,161 @@ class Flags:
             return
         try:
             mtime = path.stat().st_mtime
-            if mtime > self._store._mtime:
+            if mtime > self._snap.mtime:
                 self.reload()
         except Exception:
             pass
 
     def if_flag(self, flag_name: str):
+        """Run the wrapped call only when the flag is on; its latency is recorded per flag."""
         def deco(fn: Callable):
+            if inspect.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    user_id = kwargs.get("user_id") or kwargs.get("uid")
+                    if not self.get(flag_name, default=False, user_id=user_id):
+                        return None
+                    t0 = time.perf_counter()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        self._record_call(flag_name, user_id, time.perf_counter() - t0)
+                return async_wrapper
+
             @wraps(fn)
             def wrapper(*args, **kwargs):
                 user_id = kwargs.get("user_id") or kwargs.get("uid")
-                if self.get(flag_name, default=False, user_id=user_id):
+                if not self.get(flag_name, default=False, user_id=user_id):
+                    return None
+                t0 = time.perf_counter()
+                try:
                     return fn(*args, **kwargs)
-                return None
+                finally:
+                    self._record_call(flag_name, user_id, time.perf_counter() - t0)
             return wrapper
         return deco
 
+    def _record_call(self, flag_name: str, user_id, seconds: float) -> None:
+        if self.telemetry is not None:
+            self.telemetry.record_call(flag_name, user_bucket(str(user_id) if user_id else None), seconds)
+
     def temp(self, overrides: Dict[str, bool]):
         class _Ctx:
             def __init__(_self, outer: Flags, ov: Dict[str, bool]):
                 _self.outer = outer; _self.ov = ov; _self.prev = None
             def __enter__(_self):
-                with _self.outer._lock:
-                    _self.prev = _self.outer._store.values.copy()
-                    _self.outer._store.values.update(_self.ov)
+                def build(snap):
+                    _self.prev = snap.values
+                    return snap.replace(values={**snap.values, **_self.ov})
+                _self.outer._update(build)
             def __exit__(_self, exc_type, exc, tb):
-                with _self.outer._lock:
-                    _self.outer._store.values = _self.prev
+                # re-publish (new version) so memoized evaluations from inside are dropped
+                _self.outer._update(lambda snap: snap.replace(values=_self.prev))
         return _Ctx(self, overrides)
 
     def _rollout_allows(self, user_id: Optional[str], r: FlagRollout) -> bool:
-        now = int(time.time())
-        if r.start_ts and now < r.start_ts: return False
-        if r.end_ts and now > r.end_ts: return False
-        if r.percent >= 100: return True
-        if r.percent <= 0: return False
-        bucket_source = str(user_id or "0")
-        bucket = (sum(ord(c) for c in bucket_source) % 100)
-        return bucket < r.percent
+        return _rollout_allows(user_id, r, time.time())
+
+
+# ---------- Background file watcher ----------
+WATCH_ENABLED = os.getenv("FLAGS_WATCH", "1").lower() in ("1","true","yes","on")
+WATCH_INTERVAL_S = float(os.getenv("FLAGS_WATCH_INTERVAL_S", "2"))
+WATCH_DEBOUNCE_S = float(os.getenv("FLAGS_WATCH_DEBOUNCE_S", "0.25"))
+
+class FlagWatcher:
+    """
+    Reloads the flags file in a daemon thread when it changes, so parsing and
+    validation never run on a caller's path. Uses inotify (the optional
+    `inotify_simple` package) on the file's directory when available, which
+    also catches editors that save via rename; otherwise a stat loop every
+    `interval` seconds. Either way a change is applied only after the file
+    has been quiet for `debounce` seconds.
+    """
+
+    def __init__(self, flags: Flags, path: Optional[str] = None, *,
+                 interval: float = WATCH_INTERVAL_S, debounce: float = WATCH_DEBOUNCE_S):
+        self.flags = flags
+        self.path = Path(path or FLAGS_FILE)
+        self.interval = interval
+        self.debounce = debounce
+        self.mode: Optional[str] = None
+        self.reloads = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FlagWatcher":
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="flag-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        return {"mode": self.mode, "reloads": self.reloads, "errors": self.errors,
+                "version": self.flags.snapshot().version}
+
+    def _fingerprint(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _apply(self) -> None:
+        if self.flags.reload():
+            self.reloads += 1
+        else:
+            self.errors += 1
+
+    def _run(self) -> None:
+        last = self._fingerprint()
+        if last is not None and os.stat(self.path).st_mtime > self.flags.snapshot().mtime:
+            self._apply()   # changed between boot load and watcher start
+        try:
+            from inotify_simple import INotify, flags as iflags  # type: ignore
+            ino = INotify()
+            ino.add_watch(str(self.path.parent), iflags.CLOSE_WRITE | iflags.MOVED_TO | iflags.CREATE
+                          | iflags.DELETE | iflags.MOVED_FROM)
+        except Exception:
+            self.mode = "stat"
+            self._run_stat(last)
+            return
+        self.mode = "inotify"
+        try:
+            self._run_inotify(ino)
+        finally:
+            ino.close()
+
+    def _run_inotify(self, ino) -> None:
+        name = self.path.name
+        while not self._stop.is_set():
+            events = ino.read(timeout=int(self.interval * 1000))
+            if not any(e.name == name for e in events):
+                continue
+            while any(e.name == name for e in ino.read(timeout=int(self.debounce * 1000))):
+                pass
+            self._apply()
+
+    def _run_stat(self, last) -> None:
+        while not self._stop.wait(self.interval):
+            fp = self._fingerprint()
+            if fp == last:
+                continue
+            # editors write in several steps: wait until the file stops changing
+            while not self._stop.wait(self.debounce):
+                settled = self._fingerprint()
+                if settled == fp:
+                    break
+                fp = settled
+            last = fp
+            self._apply()
 
 
 # Singleton
@@ -248,4 +692,26 @@ def ff_is_enabled(name: str, user_id: Optional[str] = None) -> bool:
     return FLAGS.get(name, False, user_id)
 
 # so `from feature_flags import ff` continues to work
-ff = FLAGS
\ No newline at end of file
+ff = FLAGS
+
+_WATCHER: Optional[FlagWatcher] = None
+
+def start_watcher() -> FlagWatcher:
+    """Start (once) the background reload of FLAGS_FILE for the singleton."""
+    global _WATCHER
+    if _WATCHER is None:
+        _WATCHER = FlagWatcher(FLAGS)
+    return _WATCHER.start()
+
+def stop_watcher() -> None:
+    if _WATCHER is not None:
+        _WATCHER.stop()
+
+def subscribe(fn: Callable[[FlagChange], None]) -> Callable[[], None]:
+    return FLAGS.subscribe(fn)
+
+def start_telemetry() -> Optional[FlagTelemetry]:
+    """Start the periodic flush of the singleton's evaluation counters (None if disabled)."""
+    if FLAGS.telemetry is None:
+        return None
+    return FLAGS.telemetry.start()
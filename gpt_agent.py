@@ -2,32 +2,39 @@ import os
 import json
 import re
 from typing import Dict, Any, Optional
-from openai import OpenAI
 from dotenv import load_dotenv
 import zoneinfo
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from agent_brain.principles import COVEY_SYSTEM_PROMPT
 from feature_flags import ff
+import llm_cache
+import llm_client
+from agent_brain import memory
 
 load_dotenv()
 
 # Timezone-aware datetime
 TZ = zoneinfo.ZoneInfo(os.getenv("TIMEZONE", "Europe/London"))
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Per-chat tool-call history, trimmed by token budget (plain trim, no summary:
+# the parser only needs the last few exchanges to resolve "it"/"that one").
+PARSE_MEMORY = memory.MemoryStore(budget_tokens=int(os.getenv("PARSE_MEMORY_TOKENS", "600")))
 
-conversation_history = []
+def _default_user() -> str:
+    return os.getenv("TELEGRAM_CHAT_ID") or "default"
 
-def reset_conversation():
-    """Clears the in-memory conversation history (useful between tasks)."""
-    global conversation_history
-    conversation_history.clear()
+def reset_conversation(user_id: Optional[str] = None):
+    """Clears the in-memory conversation history for one chat (default: the configured chat)."""
+    PARSE_MEMORY.clear(user_id or _default_user())
 
+# Prompt layout: SYSTEM (and TOOL_DEFS) are byte-stable so the provider can
+# cache the prefix; anything that changes per request (date/time, context)
+# goes into a small system message placed right before the latest user turn.
 SYSTEM = """
 You are a highly capable personal AI calendar assistant, working for a busy entrepreneur.
 
-🕒 Today is {today}, and the current time is {current_time} ({timezone} timezone).
-Always use this as your reference when interpreting phrases like "tomorrow", "next Friday", or "after lunch".
+🕒 The current date, time and timezone are given in the "Now:" message just before the user's latest message.
+Always use that as your reference when interpreting phrases like "tomorrow", "next Friday", or "after lunch".
 
 🎯 Your job is to convert natural, casual human speech into structured scheduling instructions, using a function call.
 
@@ -61,6 +68,8 @@ You can respond to these time-based queries with the `get_agenda` tool:
 - "What am I doing now?" → range = "now"
 """
 
+SYSTEM_CONTEXT = "Now: {today}, {current_time} ({timezone} timezone)."
+
 CONVERSATION_MODE_SYSTEM = """
 You are a warm, intelligent personal assistant for a busy entrepreneur.
 
@@ -209,118 +218,168 @@ TOOL_DEFS = [
     }
 ]
 
-def parse(text: str) -> Optional[Dict[str, Any]]:
-        # 🧹 Listen for memory reset commands
-    if text.strip().lower() in ["reset", "clear memory", "start over", "forget what i said"]:
-        reset_conversation()
-        return {
-            "action": "reset",
-            "reply": "🧠 Conversation memory cleared. Let’s start fresh — what would you like to do?"
-        }
-    try:
-        # 🕒 Always fetch fresh timestamp
-        now = datetime.now(TZ)
-        system_prompt = SYSTEM.format(
-            today=now.strftime('%A, %d %B %Y'),
-            current_time=now.strftime('%H:%M'),
-            timezone=TZ
-        )
+_RESET_PHRASES = ["reset", "clear memory", "start over", "forget what i said"]
 
-        # 💬 Save this user message
-        conversation_history.append({"role": "user", "content": text})
-        if len(conversation_history) > 6:
-            conversation_history.pop(0)
+def _parse_messages(text: str, now: Optional[datetime] = None, user_id: Optional[str] = None):
+    # 🕒 Always fetch fresh timestamp
+    now = now or datetime.now(TZ)
+    context = SYSTEM_CONTEXT.format(
+        today=now.strftime('%A, %d %B %Y'),
+        current_time=now.strftime('%H:%M'),
+        timezone=TZ
+    )
 
-        # 🧠 Build full message list with memory
-        messages = [{"role": "system", "content": system_prompt}] + conversation_history
+    # 💬 Save this user message
+    PARSE_MEMORY.append(user_id or _default_user(), "user", text)
+    history = PARSE_MEMORY.context(user_id or _default_user())
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            tools=[{"type": "function", "function": tool} for tool in TOOL_DEFS],
-            tool_choice="auto",
-            temperature=0.3,
-        )
+    # 🧠 Static prefix + memory, then the dynamic context right before the new message
+    return (
+        [{"role": "system", "content": SYSTEM}]
+        + history[:-1]
+        + [{"role": "system", "content": context}, history[-1]]
+    )
 
-        message = response.choices[0].message
+_PARSE_KW = dict(
+    site="parse",
+    model="gpt-4o",
+    tools=[{"type": "function", "function": tool} for tool in TOOL_DEFS],
+    tool_choice="auto",
+    temperature=0.3,
+)
+
+def _parse_result(response, user_id: Optional[str] = None) -> Dict[str, Any]:
+    message = response.choices[0].message
+
+    if message.tool_calls:
+        function_call = message.tool_calls[0].function
+        args = json.loads(function_call.arguments)
+        args["action"] = function_call.name
+        args["reply"] = message.content or f"✅ {function_call.name.replace('_', ' ').title()} complete."
+    else:
+        args = {
+            "action": "chat_fallback",
+            "reply": message.content
+        }
 
-        if message.tool_calls:
-            function_call = message.tool_calls[0].function
-            args = json.loads(function_call.arguments)
-            args["action"] = function_call.name
-            args["reply"] = message.content or f"✅ {function_call.name.replace('_', ' ').title()} complete."
-        else:
-            args = {
-                "action": "chat_fallback",
-                "reply": message.content
-            }
+    # 💬 Save assistant reply
+    PARSE_MEMORY.append(user_id or _default_user(), "assistant", args["reply"] or "")
+
+    return args
 
-        # 💬 Save assistant reply
-        conversation_history.append({"role": "assistant", "content": args["reply"]})
-        if len(conversation_history) > 6:
-            conversation_history.pop(0)
+def _reset_result(user_id: Optional[str] = None) -> Dict[str, Any]:
+    reset_conversation(user_id)
+    return {
+        "action": "reset",
+        "reply": "🧠 Conversation memory cleared. Let’s start fresh — what would you like to do?"
+    }
 
-        return args
+_PARSE_ERROR = {
+    "action": "error",
+    "reply": "⚠️ Sorry, something went wrong while processing your request."
+}
 
+def parse(text: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Blocking LLM tool-call parse (CLI / worker threads). Handlers use aparse()."""
+    # 🧹 Listen for memory reset commands
+    if text.strip().lower() in _RESET_PHRASES:
+        return _reset_result(user_id)
+    try:
+        response = llm_client.chat_sync(_parse_messages(text, user_id=user_id), user_id=user_id, **_PARSE_KW)
+        return _parse_result(response, user_id)
     except Exception as e:
         print("OpenAI error:", e)
-        return {
-            "action": "error",
-            "reply": "⚠️ Sorry, something went wrong while processing your request."
-        }
+        return dict(_PARSE_ERROR)
+
+async def aparse(text: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """parse() on the shared async client, so the event loop is never blocked."""
+    if text.strip().lower() in _RESET_PHRASES:
+        return _reset_result(user_id)
+    try:
+        response = await llm_client.chat(_parse_messages(text, user_id=user_id), user_id=user_id, **_PARSE_KW)
+        return _parse_result(response, user_id)
+    except Exception as e:
+        print("OpenAI error:", e)
+        return dict(_PARSE_ERROR)
+
+def conversation_reply(text: str) -> str:
+    """Uncached conversation-mode reply (raises on error)."""
+    response = llm_client.chat_sync(
+        [
+            {"role": "system", "content": CONVERSATION_MODE_SYSTEM},
+            {"role": "user", "content": text}
+        ],
+        model="gpt-4o",
+        temperature=0.6,
+        site="conversation"
+    )
+    return response.choices[0].message.content
 
 def fallback_reply(text: str) -> Optional[str]:
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": CONVERSATION_MODE_SYSTEM},
-                {"role": "user", "content": text}
-            ],
-            temperature=0.6
-        )
-        return response.choices[0].message.content
+        return conversation_reply(text)
     except Exception as e:
         print("OpenAI fallback error:", e)
         return "Hmm, I wasn’t sure how to help with that, but I’m here if you need help with your day."
 
-def create_reminder_message(event_title: str, phase: str = "before") -> str:
-    """
-    Use GPT to generate motivational reminder message for a given event.
-    """
+REMINDER_MODEL = "gpt-4o"
+REMINDER_TEMPLATE_ID = "reminder.v1"
+
+_REMINDER_PREFIX = f"""{COVEY_SYSTEM_PROMPT}
+
+You're a motivational, time-aware assistant helping a busy entrepreneur steward their time.
+
+Generate a short message (1–2 lines) to send as a reminder for the event below.
+Respond with only the message to send. Be natural, supportive, and purpose-aligned.
+"""
+
+def _reminder_prompt(event_title: str, phase: str) -> str:
     phase_text = {
         "before": "10 mins before the event",
         "during": "in the first few minutes of the event",
         "after": "just after the scheduled end time"
     }.get(phase, "at the appropriate time")
 
-    prompt = f"""{COVEY_SYSTEM_PROMPT}
+    return _REMINDER_PREFIX + f"""
+⏰ It's currently the *{phase}* phase — {phase_text}.
 
-You're a motivational, time-aware assistant helping a busy entrepreneur steward their time.
+Event: “{event_title}”
+"""
 
-⏰ It's currently the *{phase}* phase — {phase_text}.
+def _reminder_fallback(event_title: str, phase: str) -> str:
+    if phase == "before":
+        return f"⏰ Reminder: {event_title} is starting soon."
+    elif phase == "during":
+        return f"🚀 Just checking in — are you focused on {event_title}?"
+    else:
+        return f"✅ Finished with {event_title}? Great job!"
+
+def generate_reminder_text(event_title: str, phase: str = "before") -> str:
+    """Uncached GPT call (raises on error). Used to fill the reminder cache."""
+    response = llm_client.chat_sync(
+        [{"role": "system", "content": _reminder_prompt(event_title, phase)}],
+        model=REMINDER_MODEL,
+        temperature=0.7,
+        site="reminder"
+    )
+    return response.choices[0].message.content.strip()
 
-Generate a short message (1–2 lines) to send as a reminder for this event:
-“{event_title}”
+def reminder_cache_key(event_title: str, phase: str, tone: str = "") -> str:
+    return llm_cache.make_key(REMINDER_TEMPLATE_ID, title=event_title, phase=phase, tone=tone, model=REMINDER_MODEL)
 
-Respond with only the message to send. Be natural, supportive, and purpose-aligned.
-"""
+def create_reminder_message(event_title: str, phase: str = "before", *, block: bool = True) -> str:
+    """
+    Motivational reminder message for a given event, served from the LLM cache.
+    With block=False a cache miss returns the deterministic fallback right away
+    and the cache is filled in the background (used by reminder dispatch).
+    """
+    return llm_cache.cached_text(
+        reminder_cache_key(event_title, phase),
+        lambda: generate_reminder_text(event_title, phase),
+        fallback=lambda: _reminder_fallback(event_title, phase),
+        block=block,
+    )
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": prompt}],
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print("GPT Reminder error:", e)
-        if phase == "before":
-            return f"⏰ Reminder: {event_title} is starting soon."
-        elif phase == "during":
-            return f"🚀 Just checking in — are you focused on {event_title}?"
-        else:
-            return f"✅ Finished with {event_title}? Great job!"
         
 def generate_nudge(event, context):
     from jinja2 import Template
@@ -328,14 +387,21 @@ def generate_nudge(event, context):
         template = Template(f.read())
 
     body = template.render(event=event, context=context)
-    full_prompt = COVEY_SYSTEM_PROMPT + "\n" + body
 
-    res = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": full_prompt}]
-    )
+    # Static principles first (cacheable prefix), rendered event/context after
+    try:
+        res = llm_client.chat_sync(
+            [{"role": "system", "content": COVEY_SYSTEM_PROMPT}, {"role": "user", "content": body}],
+            model="gpt-4",
+            site="nudge",
+            user_id=event.get("user_id"),
+        )
+    except Exception as e:
+        # No nudge this round; the event stays unreviewed and is retried on the next loop
+        print("OpenAI nudge error:", e)
+        return None
 
-    reply = res.choices[0].message["content"]
+    reply = res.choices[0].message.content
     return reply.strip() if "❌" not in reply else None
 
 
@@ -347,9 +413,18 @@ def llm_tone_polish(text: str, tone: str, context: dict | None = None) -> str:
     Optional: Rewrite a short message in the requested tone ('gentle'|'coach'|'ds').
     Guarded by WF0_LLM_TONE. Returns input text unchanged if flag is off or error occurs.
     """
-    if not ff.enabled("WF0_LLM_TONE"):
+    if not ff.get("WF0_LLM_TONE"):
         return text
 
+    key = llm_cache.make_key(
+        "tone_polish.v1",
+        title=f"{text}\n{json.dumps(context or {}, sort_keys=True, default=str)}",
+        tone=tone,
+        model="gpt-4o",
+    )
+    return llm_cache.cached_text(key, lambda: _tone_polish_call(text, tone, context), fallback=lambda: text)
+
+def _tone_polish_call(text: str, tone: str, context: dict | None) -> str:
     try:
         system = (
             "You are a time-discipline assistant. Rewrite the user's short message "
@@ -363,15 +438,11 @@ def llm_tone_polish(text: str, tone: str, context: dict | None = None) -> str:
             {"role": "system", "content": system},
             {"role": "user", "content": f"TONE={tone}\nCONTEXT={context or {}}\nTEXT:\n{text}"}
         ]
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            messages=msgs,
-            temperature=0.3
-        )
+        resp = llm_client.chat_sync(msgs, model="gpt-4o", temperature=0.3, site="tone_polish")
         return resp.choices[0].message.content.strip()
     except Exception as e:
         print("LLM tone polish error:", e)
-        return text
+        raise
     
 # ----------------------------
 # Deterministic Chat Protocol (Contract)
@@ -473,4 +544,180 @@ def parse_command(text: str) -> Optional[Dict[str, Any]]:
         prefix_len = len("I'M DOING ") if upper.startswith("I'M DOING ") else len("IM DOING ")
         return {"action": "drift", "title": raw[prefix_len:].strip()}
 
-    return None
\ No newline at end of file
+    return None
+
+# ----------------------------
+# Rule-based intent fast path (skips the LLM round trip)
+# ----------------------------
+# Emits the same dicts as the TOOL_DEFS tool calls, plus a `confidence` score.
+# Anything below INTENT_MIN_CONFIDENCE goes to parse() as before.
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.8"))
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+_RANGE_WORDS = {
+    "today": "today",
+    "tomorrow": "tomorrow",
+    "yesterday": "yesterday",
+    "this week": "this week",
+    "morning": "morning",
+    "this morning": "morning",
+    "afternoon": "afternoon",
+    "this afternoon": "afternoon",
+    "evening": "evening",
+    "this evening": "evening",
+    "tonight": "evening",
+}
+_RANGE_ALT = "|".join(sorted((re.escape(k) for k in _RANGE_WORDS), key=len, reverse=True))
+
+_WHATS_NEXT_RE = re.compile(
+    r"^(?:(?:what'?s|what is|whats)\s+(?:next|up next|coming up)"
+    r"|(?:my\s+)?next\s+(?:event|meeting|block)"
+    r"|what\s+(?:do i have|have i got)\s+next)\s*[?.!]*$"
+)
+_AGENDA_RE = re.compile(
+    r"^(?:(?:show|give|send)\s+(?:me\s+)?)?(?:my\s+|the\s+)?(?:agenda|schedule|calendar|plan)"
+    r"(?:\s+for)?(?:\s+(?P<r1>" + _RANGE_ALT + r"))?$"
+    r"|^(?:what'?s|what is|whats)\s+(?:on\s+|on my calendar\s+|on my agenda\s+)?(?P<r2>" + _RANGE_ALT + r")$"
+    r"|^what\s+(?:do i have|have i got|am i doing|was i doing)\s+(?:on\s+)?(?P<r3>" + _RANGE_ALT + r")$"
+)
+_DAY_ALT = r"today|tomorrow|on\s+\d{4}-\d{2}-\d{2}|(?:on\s+|this\s+|next\s+)?(?:" + "|".join(_WEEKDAYS) + r")"
+# Words that belong to the when, not the what: a title may not run through them
+_TIME_WORD = (
+    r"\b(?:today|tomorrow|tonight|yesterday|morning|afternoon|evening|noon|midnight|at|"
+    + "|".join(_WEEKDAYS) +
+    r"|\d{4}-\d{2}-\d{2}|\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}:\d{2})\b"
+)
+_CANCEL_RE = re.compile(
+    r"^(?:cancel|delete|remove|drop)\s+(?:my\s+|the\s+)?(?P<title>(?:(?!" + _TIME_WORD + r").)+?)"
+    r"(?:\s+(?P<day>" + _DAY_ALT + r"))?$"
+)
+# "cancel it today": the title refers back to the conversation, only the LLM knows what
+_VAGUE_TITLE_RE = re.compile(r"^(?:it|that|this|them|these|those|one|(?:that|this|the|next)\s+one)$")
+_CLOCK = r"(?P<h>[01]?\d|2[0-3])(?::(?P<m>[0-5]\d))?\s*(?P<ampm>am|pm)?"
+_DURATION = r"(?P<dur>\d{1,3})\s*(?P<unit>m|min|mins|minutes|h|hr|hrs|hour|hours)"
+_CREATE_RE = re.compile(
+    r"^(?:add|schedule|book|create|put|block)\s+(?:in\s+)?(?:an?\s+)?(?P<title>.+?)"
+    r"(?:\s+(?P<day>" + _DAY_ALT + r"))?"
+    r"\s+at\s+" + _CLOCK +
+    r"(?:\s+(?P<day2>" + _DAY_ALT + r"))?"
+    r"(?:\s+for\s+" + _DURATION + r")?$"
+)
+# Phrases that need the LLM's judgement (attendees, recurrence, bulk ops, relative shifts)
+_NEEDS_LLM_RE = re.compile(r"\b(?:with|every|each|daily|weekly|all|everything|and|after|before|instead)\b")
+
+
+def _resolve_day(day: Optional[str], now: datetime) -> Optional[date]:
+    if not day:
+        return None
+    day = day.strip()
+    if day == "today":
+        return now.date()
+    if day == "tomorrow":
+        return (now + timedelta(days=1)).date()
+    m = re.match(r"^on\s+(\d{4}-\d{2}-\d{2})$", day)
+    if m:
+        try:
+            return date.fromisoformat(m.group(1))
+        except ValueError:
+            return None
+    m = re.match(r"^(?:(on|this|next)\s+)?(\w+)$", day)
+    if m and m.group(2) in _WEEKDAYS:
+        ahead = (_WEEKDAYS.index(m.group(2)) - now.weekday()) % 7
+        if ahead == 0 or m.group(1) == "next":
+            ahead = ahead or 7
+        return (now + timedelta(days=ahead)).date()
+    return None
+
+
+def _clean_title(title: str) -> str:
+    return re.sub(r"\s+", " ", title).strip(" .!?,")
+
+
+def parse_intent(text: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """Grammar-based recognizer for common calendar requests.
+
+    Returns a TOOL_DEFS-shaped dict with an extra `confidence` in [0, 1], or
+    None when nothing matched. Never calls OpenAI.
+    """
+    raw = (text or "").strip()
+    if not raw:
+        return None
+    now = now or datetime.now(TZ)
+    low = re.sub(r"\s+", " ", raw.lower()).rstrip(" ?!.")
+
+    if _WHATS_NEXT_RE.match(low):
+        return {"action": "whats_next", "confidence": 0.95}
+
+    m = _AGENDA_RE.match(low)
+    if m:
+        word = m.group("r1") or m.group("r2") or m.group("r3")
+        if word:
+            return {"action": "get_agenda", "range": _RANGE_WORDS[word], "confidence": 0.95}
+        return {"action": "get_agenda", "range": "today", "confidence": 0.85}
+
+    m = _CREATE_RE.match(low)
+    if m:
+        title = _clean_title(raw[m.start("title"):m.end("title")])
+        hour = int(m.group("h"))
+        minute = int(m.group("m") or 0)
+        ampm = m.group("ampm")
+        if ampm == "pm" and hour < 12:
+            hour += 12
+        elif ampm == "am" and hour == 12:
+            hour = 0
+        confidence = 0.9
+        if not ampm and hour < 7:
+            confidence -= 0.2  # "at 3" / "at 3:30" — morning or afternoon?
+        day_phrase = m.group("day") or m.group("day2")
+        day = _resolve_day(day_phrase, now)
+        if day_phrase and day_phrase.startswith("next "):
+            confidence -= 0.2  # "next tuesday": this week's or next week's?
+        if day is None:
+            day = now.date()
+            confidence -= 0.05
+        duration = 60
+        if m.group("dur"):
+            duration = int(m.group("dur"))
+            if m.group("unit").startswith("h"):
+                duration *= 60
+        else:
+            confidence -= 0.05
+        if not title or _NEEDS_LLM_RE.search(title.lower()):
+            confidence = min(confidence, 0.5)
+        if datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute, tzinfo=TZ) <= now:
+            confidence = min(confidence, 0.5)  # never create in the past; let the LLM ask
+        return {
+            "action": "create_event",
+            "title": title,
+            "date": day.isoformat(),
+            "time": f"{hour:02d}:{minute:02d}",
+            "duration_minutes": duration,
+            "confidence": round(confidence, 2),
+        }
+
+    m = _CANCEL_RE.match(low)
+    if m:
+        title = _clean_title(raw[m.start("title"):m.end("title")])
+        day = _resolve_day(m.group("day"), now)
+        confidence = 0.9 if day else 0.6
+        if m.group("day") and m.group("day").startswith("next "):
+            confidence -= 0.2
+        if not title or _NEEDS_LLM_RE.search(title.lower()) or _VAGUE_TITLE_RE.match(title.lower()):
+            confidence = min(confidence, 0.4)
+        return {
+            "action": "cancel_event",
+            "title": title,
+            "date": (day or now.date()).isoformat(),
+            "confidence": confidence,
+        }
+
+    return None
+
+
+def fast_parse(text: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """parse_intent() gated on INTENT_MIN_CONFIDENCE; None means 'ask the LLM'."""
+    intent = parse_intent(text, now=now)
+    if intent and intent.get("confidence", 0) >= INTENT_MIN_CONFIDENCE:
+        return intent
+    return None
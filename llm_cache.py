@@ -0,0 +1,191 @@
+# llm_cache.py
+"""
+Persistent cache for short LLM-generated texts (reminders, nudges, tone polish).
+
+Entries are keyed by a normalized hash of (template id, title, phase, tone,
+model) and hold up to LLM_CACHE_VARIANTS texts per key so recurring events
+don't get the same line every week. Rows expire after LLM_CACHE_TTL_DAYS and
+the least recently used rows are evicted past LLM_CACHE_MAX_ROWS.
+
+Backed by sqlite so it survives restarts without touching Postgres.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+TTL_SECONDS = int(float(os.getenv("LLM_CACHE_TTL_DAYS", "14")) * 86400)
+MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "2000"))
+VARIANTS = int(os.getenv("LLM_CACHE_VARIANTS", "3"))
+
+
+def _norm(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+
+def make_key(template_id: str, *, title: str = "", phase: str = "", tone: str = "", model: str = "") -> str:
+    blob = "\x1f".join(_norm(v) for v in (template_id, title, phase, tone, model))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str = CACHE_PATH, *, ttl: int = TTL_SECONDS,
+                 max_rows: int = MAX_ROWS, variants: int = VARIANTS):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.variants = variants
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key        TEXT    NOT NULL,
+                variant    INTEGER NOT NULL,
+                text       TEXT    NOT NULL,
+                created_at REAL    NOT NULL,
+                last_used  REAL    NOT NULL,
+                PRIMARY KEY (key, variant)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """A live variant for `key` (the least recently served one, for rotation), or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT variant, text FROM llm_cache WHERE key=? AND created_at > ? "
+                "ORDER BY last_used ASC LIMIT 1",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used=? WHERE key=? AND variant=?", (now, key, row[0]))
+            self._conn.commit()
+        return row[1]
+
+    def variant_count(self, key: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM llm_cache WHERE key=? AND created_at > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()[0]
+
+    def put(self, key: str, text: str) -> None:
+        """Add a variant; once full, the oldest variant slot is overwritten."""
+        text = (text or "").strip()
+        if not text:
+            return
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT variant, text, created_at FROM llm_cache WHERE key=? ORDER BY created_at ASC",
+                (key,),
+            ).fetchall()
+            if any(r[1] == text for r in rows):
+                return
+            used = {r[0] for r in rows}
+            free = [v for v in range(self.variants) if v not in used]
+            slot = free[0] if free else rows[0][0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, variant, text, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, slot, text, now, now),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop expired rows, then least recently used rows beyond max_rows."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (time.time() - self.ttl,))
+            removed = cur.rowcount
+            total = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if total > self.max_rows:
+                cur = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE rowid IN "
+                    "(SELECT rowid FROM llm_cache ORDER BY last_used ASC LIMIT ?)",
+                    (total - self.max_rows,),
+                )
+                removed += cur.rowcount
+            self._conn.commit()
+        return removed
+
+
+_CACHE: Optional[LLMCache] = None
+_CACHE_LOCK = threading.Lock()
+_INFLIGHT: set = set()
+
+
+def get_cache() -> LLMCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = LLMCache()
+    return _CACHE
+
+
+def fill(key: str, generate: Callable[[], str], variants: int = 1) -> int:
+    """Generate until `key` holds `variants` texts (capped at the cache's variant count)."""
+    cache = get_cache()
+    target = min(variants, cache.variants)
+    added = 0
+    for _ in range(max(0, target - cache.variant_count(key))):
+        cache.put(key, generate())
+        added += 1
+    return added
+
+
+def _fill_in_background(key: str, generate: Callable[[], str]) -> None:
+    with _CACHE_LOCK:
+        if key in _INFLIGHT:
+            return
+        _INFLIGHT.add(key)
+
+    def _run():
+        try:
+            fill(key, generate)
+        except Exception as e:
+            print(f"[llm_cache] background fill failed: {e}")
+        finally:
+            with _CACHE_LOCK:
+                _INFLIGHT.discard(key)
+
+    threading.Thread(target=_run, name=f"llm-cache-{key[:8]}", daemon=True).start()
+
+
+def cached_text(key: str, generate: Callable[[], str], *, fallback: Callable[[], str],
+                block: bool = True) -> str:
+    """
+    Cached variant for `key`. On a miss either generate inline (block=True) or
+    return `fallback()` immediately and fill the cache in the background.
+    Any generation error also yields the fallback.
+    """
+    try:
+        hit = get_cache().get(key)
+    except Exception as e:
+        print(f"[llm_cache] read failed: {e}")
+        hit = None
+    if hit is not None:
+        return hit
+    if not block:
+        _fill_in_background(key, generate)
+        return fallback()
+    try:
+        text = generate()
+    except Exception as e:
+        print(f"[llm_cache] generate failed: {e}")
+        return fallback()
+    try:
+        get_cache().put(key, text)
+    except Exception as e:
+        print(f"[llm_cache] write failed: {e}")
+    return text
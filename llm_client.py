@@ -0,0 +1,559 @@
+# llm_client.py
+"""
+Shared OpenAI client layer.
+
+One AsyncOpenAI (for handlers running on the bot's event loop) and one sync
+OpenAI (for scheduler threads / asyncio.to_thread work), each on a pooled
+keep-alive httpx client. Every call gets a timeout and goes through a
+concurrency limit, so a burst of messages can't open a connection per call
+or pile up unbounded requests.
+
+All LLM call sites go through chat() / chat_sync(). Pass `site=` so
+prompt_report() can show prompt size, provider-cached prefix tokens and
+latency per call site, and `user_id=` so one chat can't take every slot.
+
+With REPLAY_MODE=record|replay the pooled clients run on replay.py's
+transports (offline benchmarks).
+
+Resilience: each call has an overall deadline (queueing included), slow
+async calls can be hedged with a second request, and a circuit breaker
+fails calls fast with LLMUnavailable while the provider is degraded so
+callers drop straight to their deterministic fallbacks. health() exposes
+breaker state and per-site latency histograms.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+import replay
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+
+def __getattr__(name: str):
+    # The openai SDK is slow to import; load it when the first client is built
+    if name in ("AsyncOpenAI", "OpenAI"):
+        import openai
+        return getattr(openai, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _sdk(name: str):
+    # Module attribute lookup, so tests patching llm_client.AsyncOpenAI still win
+    return getattr(sys.modules[__name__], name)
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "20"))
+CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+KEEPALIVE_S = float(os.getenv("LLM_KEEPALIVE_S", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+PER_USER_CONCURRENCY = int(os.getenv("LLM_PER_USER_CONCURRENCY", "2"))
+DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "30"))          # whole call, incl. waiting for a slot
+HEDGE_AFTER_S = float(os.getenv("LLM_HEDGE_AFTER_S", "0"))     # 0 = no hedged requests
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # consecutive failures to open
+BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "60"))  # open -> half-open after this
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 5000, 10000, 30000)
+
+class _Slots:
+    """
+    Counting semaphore shared by worker threads and event loops, so chat(),
+    chat_sync() and chat_stream() draw from one budget. A released slot goes
+    to a waiting coroutine first, then to a waiting thread.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.refs = 0  # per-user slots: calls holding or waiting, for cleanup
+        self._cond = threading.Condition()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_use < self.limit, timeout):
+                return False
+            self.in_use += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            while self._waiters:
+                loop, fut = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, fut)  # the slot passes on as is
+                    return
+                except RuntimeError:
+                    continue  # that loop is closed
+            self.in_use -= 1
+            self._cond.notify()
+
+    def _grant(self, fut: asyncio.Future) -> None:
+        if fut.done():  # cancelled while the hand-over was in flight
+            self.release()
+        else:
+            fut.set_result(True)
+
+    async def __aenter__(self) -> "_Slots":
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return self
+            fut = loop.create_future()
+            self._waiters.append((loop, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            with self._cond:
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove((loop, fut))
+            if fut.done() and not fut.cancelled():
+                self.release()  # granted just before the cancel landed
+            raise
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+_LOCK = threading.Lock()
+_async_client: Optional[AsyncOpenAI] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_client: Optional[OpenAI] = None
+_SLOTS = _Slots(MAX_CONCURRENCY)        # global budget, sync and async together
+_user_slots: Dict[str, _Slots] = {}     # only users with a call in flight
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised instead of calling the provider: breaker open or deadline exceeded."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive errors; open -> half_open after
+    `reset_s`, when one trial call is let through; its result closes or reopens.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_s: float = BREAKER_RESET_S):
+        self.failures = failures
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self._errors = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.opened_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            st = self._state()
+            if st == "closed":
+                return True
+            if st == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._errors = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._errors += 1
+            reopen = self._trial
+            self._trial = False
+            if reopen or (self._opened_at is None and self._errors >= self.failures):
+                self._opened_at = time.monotonic()
+                self.opened_count += 1
+
+    def abandon(self) -> None:
+        """A call was cancelled before it said anything about the provider."""
+        with self._lock:
+            self._trial = False
+
+    def reset(self) -> None:
+        self.record_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state(), "consecutive_errors": self._errors,
+                    "times_opened": self.opened_count}
+
+
+BREAKER = CircuitBreaker()
+
+
+def _is_provider_failure(exc: BaseException) -> bool:
+    """Our own bad requests (4xx other than 408/429) say nothing about provider health."""
+    status = getattr(exc, "status_code", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status not in (408, 429))
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(TIMEOUT_S, connect=CONNECT_TIMEOUT_S)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_S,
+    )
+
+
+def _api_key() -> Optional[str]:
+    # replay mode never talks to OpenAI, but the SDK still insists on a key
+    return os.getenv("OPENAI_API_KEY") or ("replay" if replay.mode() == "replay" else None)
+
+
+def get_async_client() -> AsyncOpenAI:
+    """The shared async client, bound to the running loop (rebuilt if the loop changed)."""
+    global _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop:
+        with _LOCK:
+            if _async_client is None or _async_loop is not loop:
+                _async_client = _sdk("AsyncOpenAI")(
+                    api_key=_api_key(),
+                    timeout=_timeout(),
+                    max_retries=MAX_RETRIES,
+                    http_client=httpx.AsyncClient(
+                        limits=_limits(), timeout=_timeout(),
+                        transport=replay.httpx_transport(is_async=True, limits=_limits()),
+                    ),
+                )
+                _async_loop = loop
+    return _async_client
+
+
+def get_sync_client() -> OpenAI:
+    global _sync_client
+    if _sync_client is None:
+        with _LOCK:
+            if _sync_client is None:
+                _sync_client = _sdk("OpenAI")(
+                    api_key=_api_key(),
+                    timeout=_timeout(),
+                    max_retries=MAX_RETRIES,
+                    http_client=httpx.Client(
+                        limits=_limits(), timeout=_timeout(),
+                        transport=replay.httpx_transport(is_async=False, limits=_limits()),
+                    ),
+                )
+    return _sync_client
+
+
+@dataclass
+class SiteStats:
+    calls: int = 0
+    prompt_chars: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    latency_s: float = 0.0
+    errors: int = 0
+    latency_hist: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        n = self.calls or 1
+        return {
+            "calls": self.calls,
+            "avg_prompt_chars": self.prompt_chars // n,
+            "avg_prompt_tokens": self.prompt_tokens // n,
+            "avg_cached_tokens": self.cached_tokens // n,
+            "cache_hit_ratio": round(self.cache_hit_ratio, 3),
+            "avg_latency_ms": round(self.latency_s * 1000 / n, 1),
+            "errors": self.errors,
+        }
+
+    def histogram(self) -> Dict[str, int]:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return dict(zip(labels, self.latency_hist))
+
+
+_STATS: Dict[str, SiteStats] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _prompt_chars(messages) -> int:
+    return sum(len(str(m.get("content") or "")) for m in messages)
+
+
+def _record(site: str, messages, response, started: float) -> None:
+    usage = getattr(response, "usage", None)
+    prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = int(getattr(details, "cached_tokens", 0) or 0)
+    completion = int(getattr(usage, "completion_tokens", 0) or 0)
+    elapsed = time.perf_counter() - started
+    bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed * 1000)
+    with _STATS_LOCK:
+        st = _STATS.setdefault(site, SiteStats())
+        st.calls += 1
+        st.latency_hist[bucket] += 1
+        st.prompt_chars += _prompt_chars(messages)
+        st.prompt_tokens += prompt_tokens
+        st.cached_tokens += cached
+        st.completion_tokens += completion
+        st.latency_s += elapsed
+    logging.debug(f"[llm] site={site} prompt={prompt_tokens} cached={cached} "
+                  f"completion={completion} latency={elapsed * 1000:.0f}ms")
+
+
+def prompt_report() -> Dict[str, Dict[str, Any]]:
+    """Per call site: averages of prompt size, cached prefix tokens and latency."""
+    with _STATS_LOCK:
+        return {site: st.as_dict() for site, st in sorted(_STATS.items())}
+
+
+def _record_error(site: str, exc: BaseException) -> None:
+    with _STATS_LOCK:
+        _STATS.setdefault(site, SiteStats()).errors += 1
+    if _is_provider_failure(exc):
+        BREAKER.record_failure()
+    else:
+        BREAKER.record_success()  # the provider answered; the request itself was bad
+    logging.warning(f"[llm] site={site} failed: {exc!r} (breaker={BREAKER.state})")
+
+
+def _record_congestion(site: str) -> None:
+    """Timed out waiting for a local concurrency slot: says nothing about the provider."""
+    BREAKER.abandon()
+    logging.warning(f"[llm] site={site} gave up waiting for a free slot (breaker={BREAKER.state})")
+
+
+def health() -> Dict[str, Any]:
+    """Breaker state plus per-site error counts and latency histograms."""
+    with _STATS_LOCK:
+        sites = {site: {"errors": st.errors, "latency_ms": st.histogram()}
+                 for site, st in sorted(_STATS.items())}
+    return {"breaker": BREAKER.snapshot(), "sites": sites}
+
+
+def reset_stats() -> None:
+    with _STATS_LOCK:
+        _STATS.clear()
+
+
+def _admit(site: str) -> None:
+    if not BREAKER.allow():
+        raise LLMUnavailable(f"LLM circuit open; skipping {site}")
+
+
+@contextlib.contextmanager
+def _user_slots_for(user_id):
+    """Per-user slots, dropped again once no call holds or waits on them."""
+    if user_id is None:
+        yield None
+        return
+    key = str(user_id)
+    with _LOCK:
+        slots = _user_slots.get(key)
+        if slots is None:
+            slots = _user_slots[key] = _Slots(PER_USER_CONCURRENCY)
+        slots.refs += 1
+    try:
+        yield slots
+    finally:
+        with _LOCK:
+            slots.refs -= 1
+            if slots.refs == 0 and _user_slots.get(key) is slots:
+                del _user_slots[key]
+
+
+def _kwargs(messages, model, temperature, timeout, extra) -> Dict[str, Any]:
+    kw: Dict[str, Any] = {"model": model or DEFAULT_MODEL, "messages": messages}
+    if temperature is not None:
+        kw["temperature"] = temperature
+    if timeout is not None:
+        kw["timeout"] = timeout
+    kw.update({k: v for k, v in extra.items() if v is not None})
+    return kw
+
+
+async def _create_hedged(client, kw: Dict[str, Any], hedge_after: float):
+    """Fire a second identical request if the first is slower than `hedge_after`; first answer wins."""
+    first = asyncio.ensure_future(client.chat.completions.create(**kw))
+    if hedge_after <= 0:
+        return await first
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+    second = asyncio.ensure_future(client.chat.completions.create(**kw))
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        return first.result()  # both failed: surface the primary's error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def chat(messages: List[Dict[str, Any]], *, model: Optional[str] = None,
+               temperature: Optional[float] = None, timeout: Optional[float] = None,
+               site: str = "unknown", user_id=None, deadline: Optional[float] = None,
+               hedge_after: Optional[float] = None, **extra):
+    """
+    chat.completions.create on the shared async client, under the global and
+    per-user concurrency limits and an overall `deadline` (LLM_DEADLINE_S).
+    Raises LLMUnavailable when the breaker is open or the deadline passes.
+    """
+    _admit(site)
+    client = get_async_client()
+    kw = _kwargs(messages, model, temperature, timeout, extra)
+    hedge = HEDGE_AFTER_S if hedge_after is None else hedge_after
+
+    asked = []  # non-empty once a slot was acquired and the provider was called
+
+    async def _call():
+        with _user_slots_for(user_id) as user_slots:
+            async with user_slots or contextlib.nullcontext(), _SLOTS:
+                started = time.perf_counter()
+                asked.append(started)
+                return await _create_hedged(client, kw, hedge), started
+
+    try:
+        response, started = await asyncio.wait_for(_call(), deadline or DEADLINE_S)
+    except asyncio.TimeoutError as e:
+        if asked:
+            _record_error(site, e)
+            raise LLMUnavailable(f"{site}: no answer within {deadline or DEADLINE_S}s") from e
+        # still queued for a local slot: our congestion, not a provider failure
+        _record_congestion(site)
+        raise LLMUnavailable(f"{site}: no free LLM slot within {deadline or DEADLINE_S}s") from e
+    except Exception as e:
+        _record_error(site, e)
+        raise
+    except asyncio.CancelledError:
+        BREAKER.abandon()
+        raise
+    BREAKER.record_success()
+    _record(site, messages, response, started)
+    return response
+
+
+def chat_sync(messages: List[Dict[str, Any]], *, model: Optional[str] = None,
+              temperature: Optional[float] = None, timeout: Optional[float] = None,
+              site: str = "unknown", user_id=None, deadline: Optional[float] = None, **extra):
+    """
+    Blocking variant for worker threads; never call this on the event loop.
+    The deadline bounds the wait for a slot, and the request timeout is
+    clipped to whatever is left of it.
+    """
+    _admit(site)
+    client = get_sync_client()
+    ends = time.monotonic() + (deadline or DEADLINE_S)
+    held = []
+    answered = False  # the provider returned or failed; the breaker has been told
+    with contextlib.ExitStack() as stack:
+        user_slots = stack.enter_context(_user_slots_for(user_id))
+        try:
+            for slots in (user_slots, _SLOTS):
+                if slots is None:
+                    continue
+                if not slots.acquire(timeout=max(0.0, ends - time.monotonic())):
+                    _record_congestion(site)
+                    raise LLMUnavailable(f"{site}: no free LLM slot within {deadline or DEADLINE_S}s")
+                held.append(slots)
+            remaining = max(0.1, ends - time.monotonic())
+            started = time.perf_counter()
+            try:
+                response = client.chat.completions.create(
+                    **_kwargs(messages, model, temperature, min(timeout or remaining, remaining), extra))
+            except Exception as e:
+                answered = True
+                _record_error(site, e)
+                raise
+            answered = True
+        finally:
+            for slots in reversed(held):
+                slots.release()
+            if not answered:
+                BREAKER.abandon()  # never reached the provider: free a half-open trial slot
+    BREAKER.record_success()
+    _record(site, messages, response, started)
+    return response
+
+
+async def chat_stream(messages: List[Dict[str, Any]], *, model: Optional[str] = None,
+                      temperature: Optional[float] = None, timeout: Optional[float] = None,
+                      site: str = "unknown", user_id=None, **extra) -> AsyncIterator[str]:
+    """
+    Stream a completion, yielding text deltas. Holds a concurrency slot until
+    the stream is exhausted; usage (incl. cached tokens) arrives in the final chunk.
+    No overall deadline here: the request timeout bounds each read instead.
+    """
+    _admit(site)
+    client = get_async_client()
+    kw = _kwargs(messages, model, temperature, timeout, extra)
+    kw["stream"] = True
+    kw["stream_options"] = {"include_usage": True}
+    with _user_slots_for(user_id) as user_slots:
+        async with user_slots or contextlib.nullcontext(), _SLOTS:
+            started = time.perf_counter()
+            usage_chunk = None
+            try:
+                stream = await client.chat.completions.create(**kw)
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        usage_chunk = chunk
+                    for choice in getattr(chunk, "choices", None) or []:
+                        delta = getattr(choice.delta, "content", None)
+                        if delta:
+                            yield delta
+            except Exception as e:
+                _record_error(site, e)
+                raise
+            except BaseException:
+                BREAKER.abandon()  # consumer stopped early / cancelled
+                raise
+    BREAKER.record_success()
+    _record(site, messages, usage_chunk, started)
+
+
+async def aclose() -> None:
+    """Close pooled connections (call on shutdown)."""
+    global _async_client, _sync_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.close()
+    sync, _sync_client = _sync_client, None
+    if sync is not None:
+        sync.close()
@@ -0,0 +1,326 @@
+# replay.py
+"""
+Record/replay stand-ins for the OpenAI and Google Calendar HTTP traffic.
+
+REPLAY_MODE=record  real requests go out; each request/response pair is
+                    appended to a fixture file with its timing.
+REPLAY_MODE=replay  nothing leaves the box; responses come from the fixture
+                    files, optionally with the recorded latency
+                    (REPLAY_LATENCY=recorded, or a multiplier like 0.5).
+unset / off         both clients behave as usual.
+
+OpenAI goes through an httpx transport plugged into llm_client's pooled
+clients; Calendar goes through an httplib2-compatible object handed to
+googleapiclient's build(). Requests are matched on method, URL and body with
+timestamps and batch boundaries masked, so a recording made yesterday still
+matches today's "Now: ..." context and timeMin/timeMax parameters.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+import httpx
+
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off").lower()
+REPLAY_DIR = os.getenv("REPLAY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  "benchmarks", "fixtures"))
+REPLAY_LATENCY = os.getenv("REPLAY_LATENCY", "none")  # none | recorded | <multiplier>
+
+_MASKS = [
+    # ISO datetimes / dates (with optional offset) and "Now: Tuesday 14 May ..." style stamps
+    (re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"), "<ts>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}%3A\d{2}%3A\d{2}(?:\.\d+)?(?:Z|%2B\d{2}%3A\d{2}|-\d{2}%3A\d{2})?"), "<ts>"),
+    (re.compile(r"\b\d{1,2}:\d{2}\b"), "<hh:mm>"),
+    # multipart boundaries and batch Content-IDs are random per request
+    (re.compile(r"=+\d{6,}=+"), "<boundary>"),
+    (re.compile(r"batch_[A-Za-z0-9_]+"), "<boundary>"),
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"), "<uuid>"),
+]
+_BATCH_ID = re.compile(r"<([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\+")
+
+
+def mode() -> str:
+    return REPLAY_MODE if REPLAY_MODE in ("record", "replay") else "off"
+
+
+def normalize(text: str) -> str:
+    for pattern, repl in _MASKS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def _body_text(body) -> str:
+    if body is None:
+        return ""
+    if isinstance(body, (bytes, bytearray)):
+        body = bytes(body).decode("utf-8", errors="replace")
+    try:
+        # stable key for JSON bodies regardless of key order
+        return json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+    except (ValueError, TypeError):
+        return str(body)
+
+
+def request_key(method: str, url: str, body) -> str:
+    blob = "\x1f".join([method.upper(), normalize(str(url)), normalize(_body_text(body))])
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class ReplayMiss(LookupError):
+    """Replay mode got a request that is not in the fixture file."""
+
+
+class Cassette:
+    """
+    One JSON-lines fixture file. Recording appends as it goes; replay serves
+    recordings for the same key in order and repeats the last one once they
+    run out, so a benchmark can loop over a short recording.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        self._by_key[rec["key"]].append(rec)
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._by_key.values())
+
+    def record(self, method: str, url: str, body, status: int, headers: Dict[str, str],
+               content: bytes, elapsed_s: float) -> Dict[str, Any]:
+        rec = {
+            "key": request_key(method, url, body),
+            "method": method.upper(),
+            "url": str(url),
+            "request": _body_text(body),
+            "status": status,
+            "headers": headers,
+            "body": content.decode("utf-8", errors="replace"),
+            "elapsed_s": round(elapsed_s, 4),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._by_key[rec["key"]].append(rec)
+        return rec
+
+    def match(self, method: str, url: str, body) -> Dict[str, Any]:
+        key = request_key(method, url, body)
+        with self._lock:
+            queue = self._by_key.get(key)
+            if queue:
+                rec = queue.popleft()
+                self._last[key] = rec
+                return rec
+            if key in self._last:
+                return self._last[key]
+            self.misses += 1
+        raise ReplayMiss(f"no recording for {method.upper()} {normalize(str(url))} in {self.path}")
+
+
+def simulated_delay(rec: Dict[str, Any]) -> float:
+    if REPLAY_LATENCY == "none":
+        return 0.0
+    if REPLAY_LATENCY == "recorded":
+        return float(rec.get("elapsed_s") or 0.0)
+    try:
+        return float(rec.get("elapsed_s") or 0.0) * float(REPLAY_LATENCY)
+    except ValueError:
+        return 0.0
+
+
+_CASSETTES: Dict[str, Cassette] = {}
+_CASSETTES_LOCK = threading.Lock()
+
+
+def cassette(name: str) -> Cassette:
+    path = os.path.join(REPLAY_DIR, f"{name}.jsonl")
+    with _CASSETTES_LOCK:
+        if path not in _CASSETTES:
+            _CASSETTES[path] = Cassette(path)
+        return _CASSETTES[path]
+
+
+# ---------- OpenAI: httpx transports ----------
+
+def _httpx_response(rec: Dict[str, Any], request):
+    headers = {k: v for k, v in (rec.get("headers") or {}).items()
+               if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+    return httpx.Response(rec["status"], headers=headers, content=rec["body"].encode("utf-8"), request=request)
+
+
+def _headers(response) -> Dict[str, str]:
+    return {k: v for k, v in response.headers.items()}
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Sync httpx transport: forwards to `inner` and records every exchange."""
+
+    def __init__(self, inner, tape: Cassette):
+        self.inner = inner
+        self.tape = tape
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        content = response.read()
+        self.tape.record(request.method, request.url, request.content, response.status_code,
+                         _headers(response), content, time.perf_counter() - started)
+        return _httpx_response({"status": response.status_code, "headers": _headers(response),
+                                "body": content.decode("utf-8", errors="replace")}, request)
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner, tape: Cassette):
+        self.inner = inner
+        self.tape = tape
+
+    async def handle_async_request(self, request):
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        self.tape.record(request.method, request.url, request.content, response.status_code,
+                         _headers(response), content, time.perf_counter() - started)
+        return _httpx_response({"status": response.status_code, "headers": _headers(response),
+                                "body": content.decode("utf-8", errors="replace")}, request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    def __init__(self, tape: Cassette):
+        self.tape = tape
+
+    def handle_request(self, request):
+        rec = self.tape.match(request.method, request.url, request.read())
+        delay = simulated_delay(rec)
+        if delay:
+            time.sleep(delay)
+        return _httpx_response(rec, request)
+
+    def close(self):
+        pass
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, tape: Cassette):
+        self.tape = tape
+
+    async def handle_async_request(self, request):
+        rec = self.tape.match(request.method, request.url, await request.aread())
+        delay = simulated_delay(rec)
+        if delay:
+            await asyncio.sleep(delay)
+        return _httpx_response(rec, request)
+
+    async def aclose(self):
+        pass
+
+
+def httpx_transport(*, is_async: bool, limits=None):
+    """Transport for llm_client's httpx clients, or None when replay is off."""
+    m = mode()
+    if m == "off":
+        return None
+    tape = cassette("openai")
+    if m == "replay":
+        return AsyncReplayTransport(tape) if is_async else ReplayTransport(tape)
+    if is_async:
+        return AsyncRecordingTransport(httpx.AsyncHTTPTransport(limits=limits), tape)
+    return RecordingTransport(httpx.HTTPTransport(limits=limits), tape)
+
+
+# ---------- Calendar: httplib2-compatible objects ----------
+
+def _httplib2_response(status: int, headers: Dict[str, str]):
+    import httplib2
+    info = dict(headers)
+    info["status"] = str(status)
+    return httplib2.Response(info)
+
+
+def _rewrite_batch_ids(recorded_request: str, body, content: str) -> str:
+    """Batch responses refer to the request's random Content-ID base; swap in the live one."""
+    old = _BATCH_ID.search(recorded_request or "")
+    new = _BATCH_ID.search(_body_text(body))
+    if old and new and old.group(1) != new.group(1):
+        return content.replace(old.group(1), new.group(1))
+    return content
+
+
+class RecordingHttp:
+    """Wraps an httplib2.Http (or AuthorizedHttp) and records each request()."""
+
+    def __init__(self, inner, tape: Cassette):
+        self.inner = inner
+        self.tape = tape
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        started = time.perf_counter()
+        resp, content = self.inner.request(uri, method, body=body, headers=headers,
+                                           redirections=redirections, connection_type=connection_type)
+        headers_out = {k: v for k, v in dict(resp).items() if k != "status"}
+        self.tape.record(method, uri, body, int(resp.status), headers_out, content or b"",
+                         time.perf_counter() - started)
+        return resp, content
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class ReplayHttp:
+    """Serves Calendar API calls from the fixture file; never opens a socket."""
+
+    def __init__(self, tape: Cassette):
+        self.tape = tape
+        self.timeout = None
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        rec = self.tape.match(method, uri, body)
+        delay = simulated_delay(rec)
+        if delay:
+            time.sleep(delay)
+        content = _rewrite_batch_ids(rec.get("request", ""), body, rec["body"])
+        return _httplib2_response(rec["status"], rec.get("headers") or {}), content.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+def calendar_http(creds_factory: Callable[[], Any]):
+    """http= object for googleapiclient.discovery.build, or None when replay is off."""
+    m = mode()
+    if m == "off":
+        return None
+    tape = cassette("calendar")
+    if m == "replay":
+        return ReplayHttp(tape)
+    import google_auth_httplib2
+    import httplib2
+    return google_auth_httplib2.AuthorizedHttp(creds_factory(), http=RecordingHttp(httplib2.Http(), tape))
+
+
+def summary() -> List[Tuple[str, int, int]]:
+    """(fixture path, interactions left, misses) for every cassette in use."""
+    with _CASSETTES_LOCK:
+        return [(path, len(c), c.misses) for path, c in _CASSETTES.items()]
@@ -30,6 +30,7 @@ def test_main_sets_up_bot(
     builder_instance = MagicMock()
     builder_instance.token.return_value = builder_instance
     builder_instance.post_init.return_value = builder_instance
+    builder_instance.post_shutdown.return_value = builder_instance
     builder_instance.build.return_value = mock_app
     mock_app_builder.return_value = builder_instance
 
@@ -38,8 +39,11 @@ def test_main_sets_up_bot(
 
     # Assert bot setup
     mock_getenv.assert_called_with("TELEGRAM_BOT_TOKEN")
-    mock_send_daily_agenda.assert_called_once_with(mock_app)
-    mock_send_time_reminders.assert_called_once_with(mock_app)
+    # DB-backed jobs start from the post_init hook (after init_db), not from main()
+    builder_instance.post_init.assert_called_once_with(bot.on_startup)
+    builder_instance.post_shutdown.assert_called_once_with(bot.on_shutdown)
+    mock_send_daily_agenda.assert_not_called()
+    mock_send_time_reminders.assert_not_called()
     # Bot schedules two repeating jobs: the AI loop + workflow #0 tick.
     assert mock_job_queue.run_repeating.call_count == 2
 
@@ -48,4 +52,12 @@ def test_main_sets_up_bot(
     assert 3600 in intervals  # ai_loop_job
     assert 60 in intervals    # wf0_tick
     assert mock_job_queue.run_daily.call_count == 2
-    mock_app.run_polling.assert_called_once()
\ No newline at end of file
+    mock_app.run_polling.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_on_shutdown_flushes_history_then_closes_llm_clients():
+    order = []
+    with patch("bot.flush_history", new=AsyncMock(side_effect=lambda: order.append("flush"))), \
+         patch("bot.llm_client.aclose", new=AsyncMock(side_effect=lambda: order.append("aclose"))):
+        await bot.on_shutdown(MagicMock())
+    assert order == ["flush", "aclose"]
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 
-from agent_brain.core import run_brain, conversational_brain
+from agent_brain.core import run_brain, conversational_brain, flush_history
 
 @pytest.mark.asyncio
 @patch("agent_brain.core.Bot")
@@ -30,19 +30,82 @@ async def test_run_brain_with_drift(mock_drift, mock_adjust, mock_nudge, mock_lo
 @patch("agent_brain.core.get_recent_conversation")
 @patch("agent_brain.core.calendar_client.get_current_and_next_event")
 @patch("agent_brain.core.get_user_context")
-@patch("agent_brain.core.AsyncOpenAI")
-async def test_conversational_brain_flow(mock_openai, mock_context, mock_calendar, mock_history, mock_save):
+@patch("agent_brain.core.llm_client.chat", new_callable=AsyncMock)
+async def test_conversational_brain_flow(mock_chat, mock_context, mock_calendar, mock_history, mock_save):
     mock_context.return_value = {"focus": "Build Ruoth", "energy": "High"}
     mock_calendar.return_value = {"current": {"summary": "Design Sprint"}}
     mock_history.return_value = [{"role": "assistant", "content": "Hi!"}]
 
-    mock_openai.return_value.chat.completions.create = AsyncMock(return_value=MagicMock(
+    mock_chat.return_value = MagicMock(
         choices=[MagicMock(message=MagicMock(content="🗓️ Here's your next task."))]
-    ))
+    )
 
     user_input = "What's on my schedule today?"
     response = await conversational_brain(user_input)
+    await flush_history()  # turns are persisted in the background
 
     assert "🗓️" in response
     mock_save.assert_called()
-    mock_openai.return_value.chat.completions.create.assert_awaited_once()
\ No newline at end of file
+    mock_chat.assert_awaited_once()
+
+@pytest.mark.asyncio
+@patch("agent_brain.core.save_conversation_turn")
+@patch("agent_brain.core.get_recent_conversation", return_value=[])
+@patch("agent_brain.core.calendar_client.get_current_and_next_event")
+@patch("agent_brain.core.get_user_context")
+@patch("agent_brain.core.llm_client.chat", new_callable=AsyncMock)
+async def test_context_is_gathered_concurrently_and_cached(mock_chat, mock_context, mock_calendar, mock_history, mock_save):
+    import threading
+    from agent_brain import core
+
+    core.invalidate_context()
+    core.BRAIN_MEMORY.clear()
+    barrier = threading.Barrier(2, timeout=2)  # both lookups must be in flight at once
+
+    def _context(**kw):
+        barrier.wait()
+        return {"focus": "Hiring"}
+
+    def _calendar():
+        barrier.wait()
+        return {"current": None}
+
+    mock_context.side_effect = _context
+    mock_calendar.side_effect = _calendar
+    mock_chat.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content="ok"))])
+
+    await conversational_brain("hi")
+    await conversational_brain("again")
+    await flush_history()
+
+    assert mock_context.call_count == 1 and mock_calendar.call_count == 1
+    assert "Hiring" in mock_chat.await_args.args[0][-2]["content"]
+    assert [c.args[1] for c in mock_save.call_args_list] == ["user", "assistant", "user", "assistant"]
+    core.invalidate_context()
+
+
+@pytest.mark.asyncio
+@patch("agent_brain.core.save_conversation_turn")
+@patch("agent_brain.core.get_recent_conversation")
+@patch("agent_brain.core.calendar_client.get_current_and_next_event", return_value={})
+@patch("agent_brain.core.get_user_context", return_value={})
+@patch("agent_brain.core.llm_client.chat", new_callable=AsyncMock)
+async def test_failed_history_load_is_retried_not_wiped(mock_chat, _context, _calendar, mock_history, _save):
+    from agent_brain import core
+
+    core.invalidate_context()
+    core.BRAIN_MEMORY.clear()
+    mock_history.side_effect = [RuntimeError("db blip"), [{"role": "user", "content": "earlier"},
+                                                         {"role": "assistant", "content": "noted"}]]
+    mock_chat.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content="ok"))])
+
+    await conversational_brain("first")
+    core.invalidate_context()
+    await conversational_brain("second")
+    await flush_history()
+
+    assert mock_history.call_count == 2
+    contents = [m["content"] for m in mock_chat.await_args.args[0] if m["role"] in ("user", "assistant")]
+    assert contents[:4] == ["earlier", "noted", "first", "ok"]
+    core.invalidate_context()
+    core.BRAIN_MEMORY.clear()
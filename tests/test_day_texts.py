@@ -0,0 +1,91 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache
+from agent_brain import day_texts
+from gpt_agent import reminder_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = LLMCache(str(tmp_path / "c.sqlite3"), ttl=3600, max_rows=100, variants=1)
+    with patch.object(llm_cache, "_CACHE", c):
+        yield c
+
+
+def _reply(items_texts):
+    def _chat(messages, **kw):
+        items = json.loads(messages[-1]["content"])["items"]
+        texts = [{"id": it["id"], "text": f"{it['kind']}:{it['title']}"} for it in items]
+        items_texts.append(items)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({"texts": texts})))])
+    return _chat
+
+
+SEGMENTS = [{"title": "Deep Work", "tone_at_start": "coach"}, {"title": "Gym", "tone_at_start": None}]
+
+
+def test_whole_day_in_one_call_then_cached(cache):
+    calls = []
+    with patch("agent_brain.day_texts.llm_client.chat_sync", side_effect=_reply(calls)) as chat:
+        stored = day_texts.precompute(SEGMENTS, ["Standup"])
+        assert stored == 2 * 3 + 3
+        assert chat.call_count == 1
+        assert chat.call_args.kwargs["response_format"]["type"] == "json_schema"
+
+        # nothing changed: no LLM call
+        assert day_texts.precompute(SEGMENTS, ["Standup"]) == 0
+        assert chat.call_count == 1
+
+        # plan changed: only the new block is generated
+        day_texts.precompute(SEGMENTS + [{"title": "Review", "tone_at_start": "ds"}], ["Standup"])
+        assert chat.call_count == 2
+        assert {it["title"] for it in calls[-1]} == {"Review"}
+
+    assert day_texts.lookup("mid", "Deep Work", "coach") == "mid:Deep Work"
+    assert day_texts.lookup("start", "Gym", "gentle") == "start:Gym"
+    assert day_texts.lookup("start", "Gym", "ds") is None
+    # reminders land under the keys create_reminder_message reads
+    assert cache.get(reminder_cache_key("Standup", "before")) == "before:Standup"
+
+
+def test_missing_entries_are_not_stored(cache):
+    resp = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+        content=json.dumps({"texts": [{"id": 0, "text": "Go."}, {"id": 99, "text": "bogus"}, {"id": 1, "text": " "}]})))])
+    with patch("agent_brain.day_texts.llm_client.chat_sync", return_value=resp):
+        assert day_texts.precompute([{"title": "Gym"}]) == 1
+    assert day_texts.lookup("start", "Gym", "gentle") == "Go."
+    assert day_texts.lookup("mid", "Gym", "gentle") is None
+
+
+@pytest.mark.asyncio
+async def test_boundary_handler_uses_precomputed_text():
+    from agent_brain import actions
+    seg = {"id": "s1", "title": "Deep Work", "tone_at_start": "coach"}
+    with patch.object(actions, "_fetch_segment", return_value=seg), \
+         patch.object(actions, "_llm_tone", return_value=True), \
+         patch.object(actions.day_texts, "lookup", return_value="Time for Deep Work 💪") as lookup, \
+         patch.object(actions, "send_text_safe", new=AsyncMock()) as send, \
+         patch.object(actions, "_send_llm_payload", new=AsyncMock()) as llm:
+        await actions.fsm_send_mid("s1", MagicMock(), MagicMock())
+    lookup.assert_called_once_with("mid", "Deep Work", "coach")
+    send.assert_awaited_once()
+    llm.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_boundary_handler_falls_back_to_llm_on_miss():
+    from agent_brain import actions
+    seg = {"id": "s1", "title": "Deep Work", "tone_at_start": None}
+    with patch.object(actions, "_fetch_segment", return_value=seg), \
+         patch.object(actions, "_llm_tone", return_value=True), \
+         patch.object(actions.day_texts, "lookup", return_value=None), \
+         patch.object(actions, "send_text_safe", new=AsyncMock()) as send, \
+         patch.object(actions, "_send_llm_payload", new=AsyncMock()) as llm:
+        await actions.fsm_send_end("s1", MagicMock(), MagicMock())
+    send.assert_not_awaited()
+    assert llm.await_args.args[2] == "fsm_send_end"
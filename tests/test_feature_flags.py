@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import feature_flags
+from feature_flags import Flags
+
+
+def test_writes_publish_new_snapshot_and_old_one_is_unchanged():
+    flags = Flags()
+    before = flags.snapshot()
+    flags.set("WF3_QUADRANTS", True)
+    after = flags.snapshot()
+    assert after.version > before.version
+    assert before.values["WF3_QUADRANTS"] is False
+    assert after.values["WF3_QUADRANTS"] is True
+    assert flags.get("WF3_QUADRANTS") is True
+
+
+def test_memo_is_per_user_and_invalidated_by_new_version():
+    flags = Flags()
+    assert flags.get("WF2_STREAMING", user_id=7) is False
+    flags.set("WF2_STREAMING", True, user_id=7)
+    assert flags.get("WF2_STREAMING", user_id=7) is True
+    assert flags.get("WF2_STREAMING", user_id=8) is False
+    assert flags.get("UNKNOWN", True) is True and flags.get("UNKNOWN", False) is False
+
+
+def test_rollout_window_edge_expires_memo():
+    flags = Flags()
+    now = time.time()
+    flags.set("NEW_THING", True)
+    flags.set_rollout("NEW_THING", 100, start_ts=int(now) + 60)
+    assert flags.get("NEW_THING") is False
+    with patch.object(feature_flags.time, "time", return_value=now + 120):
+        assert flags.get("NEW_THING") is True
+
+
+def test_temp_restores_values():
+    flags = Flags()
+    with flags.temp({"WF0_DS_MODE": True}):
+        assert flags.get("WF0_DS_MODE") is True
+    assert flags.get("WF0_DS_MODE") is False
+
+
+def test_readers_never_see_torn_snapshot():
+    flags = Flags()
+    stop = threading.Event()
+    torn = []
+
+    def writer():
+        v = False
+        while not stop.is_set():
+            v = not v
+            flags.publish(flags.snapshot().replace(values={**flags.snapshot().values, "A": v, "B": v}))
+
+    def reader():
+        for _ in range(20000):
+            snap = flags.snapshot()
+            if snap.values.get("A") != snap.values.get("B"):
+                torn.append(snap.version)
+
+    w = threading.Thread(target=writer)
+    w.start()
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for r in readers:
+        r.start()
+    for r in readers:
+        r.join()
+    stop.set()
+    w.join()
+    assert torn == []
+
+
+def test_invalid_file_keeps_previous_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "flags.yml"
+    path.write_text("flags:\n  WF3_QUADRANTS: true\n")
+    monkeypatch.setattr(feature_flags, "FLAGS_FILE", str(path))
+    flags = Flags()
+    good = flags.snapshot()
+    assert good.values["WF3_QUADRANTS"] is True
+
+    path.write_text("flags:\n  WF3_QUADRANTS: maybe\nrollouts:\n  X:\n    percent: 150\n")
+    assert flags.reload() is False
+    assert flags.snapshot() is good
+
+
+def test_subscribers_get_changed_keys_only_on_real_changes():
+    flags = Flags()
+    seen = []
+    unsubscribe = flags.subscribe(seen.append)
+    flags.set("WF3_QUADRANTS", True)
+    flags.set("WF3_QUADRANTS", True)
+    flags.set_rollout("WF3_QUADRANTS", 50)
+    unsubscribe()
+    flags.set("WF3_QUADRANTS", False)
+    assert [c.keys for c in seen] == [{"WF3_QUADRANTS"}, {"WF3_QUADRANTS"}]
+    assert seen[0].turned_on("WF3_QUADRANTS")
+
+
+def test_watcher_reloads_after_edit(tmp_path, monkeypatch):
+    path = tmp_path / "flags.yml"
+    path.write_text("flags:\n  WF3_QUADRANTS: false\n")
+    monkeypatch.setattr(feature_flags, "FLAGS_FILE", str(path))
+    flags = Flags()
+    changed = threading.Event()
+    flags.subscribe(lambda change: changed.set())
+    watcher = feature_flags.FlagWatcher(flags, str(path), interval=0.02, debounce=0.02).start()
+    try:
+        time.sleep(0.05)
+        path.write_text("flags:\n  WF3_QUADRANTS: true\n")
+        assert changed.wait(5)
+        assert flags.get("WF3_QUADRANTS") is True
+        assert watcher.stats()["reloads"] == 1
+    finally:
+        watcher.stop()
+
+
+def test_telemetry_counts_per_bucket_and_flushes_deltas():
+    flags = Flags()
+    sink = []
+    flags.telemetry = feature_flags.FlagTelemetry(sink.extend)
+    flags.set("WF2_STREAMING", True, user_id="u1")
+    for _ in range(3):
+        flags.get("WF2_STREAMING", user_id="u1")
+    flags.get("WF2_STREAMING")
+
+    def worker():
+        for _ in range(1000):
+            flags.get("WF2_STREAMING")
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert flags.telemetry.flush() == 2
+    rows = {r["bucket"]: r for r in sink}
+    u1 = rows[feature_flags.user_bucket("u1")]
+    assert (u1["evaluations"], u1["true_count"]) == (3, 3)
+    assert (rows["anon"]["evaluations"], rows["anon"]["true_count"]) == (4001, 0)
+
+    flags.get("WF2_STREAMING")
+    assert flags.telemetry.collect() == [{"flag": "WF2_STREAMING", "bucket": "anon", "evaluations": 1,
+                                         "true_count": 0, "calls": 0, "call_ms": 0.0}]
+
+
+@pytest.mark.asyncio
+async def test_if_flag_records_call_latency_for_sync_and_async():
+    flags = Flags()
+    flags.telemetry = feature_flags.FlagTelemetry()
+    flags.set("WF8_MICRO_COACH", True)
+
+    @flags.if_flag("WF8_MICRO_COACH")
+    def coach(user_id=None):
+        return "hi"
+
+    @flags.if_flag("WF8_MICRO_COACH")
+    async def coach_async(user_id=None):
+        await asyncio.sleep(0.01)
+        return "hey"
+
+    assert coach(user_id=5) == "hi"
+    assert await coach_async(user_id=5) == "hey"
+    (row,) = flags.telemetry.collect()
+    assert row["calls"] == 2 and row["call_ms"] >= 10
+
+    flags.set("WF8_MICRO_COACH", False)
+    assert coach(user_id=5) is None
+    assert flags.telemetry.collect()[0]["calls"] == 0
+
+
+def test_failing_sink_does_not_raise():
+    telemetry = feature_flags.FlagTelemetry(lambda rows: 1 / 0)
+    telemetry.record_eval("X", "anon", True)
+    assert telemetry.flush() == 1
+
+
+def test_sampled_telemetry_scales_counts_up():
+    flags = Flags()
+    flags.telemetry = feature_flags.FlagTelemetry(sample=0.5)
+    draws = iter([0.1, 0.9] * 50)
+    with patch.object(feature_flags.random, "random", side_effect=lambda: next(draws)):
+        for _ in range(100):
+            flags.get("WF9_MEMORY")
+    (row,) = flags.telemetry.collect()
+    assert row["evaluations"] == 100 and row["true_count"] == 100
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from unittest.mock import patch
+
+from agent_brain import gating
+from agent_brain import scheduler
+
+TZ = ZoneInfo("Europe/London")
+
+
+def test_quiet_hours_wrap_past_midnight():
+    now = datetime(2025, 6, 2, 12, 0, tzinfo=TZ)  # Monday
+    pol = gating.GatingPolicy.compile(now, quiet_hours="22:00-06:00")
+    assert pol.is_gated(datetime(2025, 6, 2, 23, 30, tzinfo=TZ))
+    assert pol.is_gated(datetime(2025, 6, 3, 5, 59, tzinfo=TZ))
+    assert not pol.is_gated(datetime(2025, 6, 3, 6, 0, tzinfo=TZ))
+    assert pol.next_allowed(datetime(2025, 6, 2, 23, 0, tzinfo=TZ)) == datetime(2025, 6, 3, 6, 0, tzinfo=TZ)
+
+
+def test_sabbath_and_ooo_merge_with_quiet_hours():
+    now = datetime(2025, 6, 2, 12, 0, tzinfo=TZ)  # Monday
+    ooo = [(datetime(2025, 6, 3, 14, 0, tzinfo=TZ), datetime(2025, 6, 3, 16, 0, tzinfo=TZ))]
+    pol = gating.GatingPolicy.compile(now, quiet_hours="22:00-06:00", sabbath_day="saturday", ooo=ooo)
+
+    assert pol.reason(datetime(2025, 6, 3, 15, 0, tzinfo=TZ)) == "ooo"
+    assert pol.next_allowed(datetime(2025, 6, 3, 15, 0, tzinfo=TZ)) == datetime(2025, 6, 3, 16, 0, tzinfo=TZ)
+    # Fri 22:00 quiet → all of Saturday → Sun 06:00 collapse into one interval
+    assert pol.next_allowed(datetime(2025, 6, 6, 23, 0, tzinfo=TZ)) == datetime(2025, 6, 8, 6, 0, tzinfo=TZ)
+    assert pol.next_allowed(datetime(2025, 6, 4, 10, 0, tzinfo=TZ)) == datetime(2025, 6, 4, 10, 0, tzinfo=TZ)
+
+
+def test_policy_is_cached_until_ooo_changes():
+    gating.invalidate()
+    now = datetime(2025, 6, 2, 12, 0, tzinfo=TZ)
+    first = gating.policy_for("42", now)
+    assert gating.policy_for("42", now + timedelta(hours=3)) is first
+
+    gating.set_ooo([(now + timedelta(hours=1), now + timedelta(hours=2))])
+    second = gating.policy_for("42", now)
+    assert second is not first
+    assert second.is_gated(now + timedelta(minutes=90))
+    gating.set_ooo([])
+
+
+@patch("agent_brain.scheduler.observer")
+@patch("agent_brain.scheduler.schedule_boundary_job")
+@patch("agent_brain.scheduler.job_store")
+@patch("agent_brain.scheduler._gated", return_value=True)
+def test_gated_midpoint_is_deferred_not_dropped(_gated, _store, mock_schedule, mock_observer):
+    now = datetime.now(scheduler.TZ)
+    resume = now + timedelta(minutes=20)
+    with patch("agent_brain.scheduler._next_allowed", return_value=resume):
+        scheduler._midpoint_cb("gcal:abc", now + timedelta(hours=1))
+        mock_schedule.assert_called_once_with("gcal:abc", "mid", resume, expires_at=now + timedelta(hours=1))
+
+        # segment would be over by the time gating lifts → drop
+        mock_schedule.reset_mock()
+        scheduler._midpoint_cb("gcal:abc", now + timedelta(minutes=10))
+        mock_schedule.assert_not_called()
+    mock_observer.emit_midpoint.assert_not_called()
@@ -0,0 +1,83 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from agent_brain import idempotency, outbox
+from agent_brain.idempotency import MemoryStore, make_key, run_once
+
+
+@pytest.fixture(autouse=True)
+def _fresh_store():
+    idempotency.set_store(MemoryStore())
+    yield
+    idempotency.set_store(None)
+
+
+def test_key_normalizes_command_and_separates_chats_and_buckets():
+    a = make_key(1, {"action": "done", "title": "Deep  Work "}, bucket=10)
+    assert a == make_key(1, {"action": "done", "title": "deep work"}, bucket=10)
+    assert a != make_key(2, {"action": "done", "title": "deep work"}, bucket=10)
+    assert a != make_key(1, {"action": "done", "title": "deep work"}, bucket=11)
+    assert make_key(1, {"segment_id": "s1"}, source="wf0:s1:mark_done", bucket=1) != \
+        make_key(1, {"segment_id": "s2"}, source="wf0:s1:mark_done", bucket=1)
+
+
+def test_memory_store_is_bounded_lru_with_ttl():
+    store = MemoryStore(ttl=60, max_entries=2)
+    assert store.claim("a")[0] and store.claim("b")[0]
+    store.peek("a")                      # touch a -> b is least recently used
+    assert store.claim("c")[0]
+    assert store.peek("b") == (None, None)
+    assert store.claim("a") == (False, idempotency.PENDING, None)
+
+    with patch.object(idempotency.time, "monotonic", return_value=10**9):
+        assert store.claim("a")[0]       # expired
+
+
+@pytest.mark.asyncio
+async def test_duplicate_replays_reply_without_rerunning():
+    calls = []
+
+    async def action():
+        calls.append(1)
+        outbox.record("✅ Marked done.", "Markdown")
+        return "ok"
+
+    with patch.object(idempotency.outbox, "send", new=AsyncMock()) as send:
+        parsed = {"action": "done", "title": "Deep Work"}
+        assert await run_once(7, parsed, action, bot="BOT") == "ok"
+        assert await run_once(7, {"action": "done", "title": "deep work"}, action, bot="BOT") is None
+
+    assert calls == [1]
+    send.assert_awaited_once_with("BOT", 7, "✅ Marked done.", parse_mode="Markdown")
+
+
+@pytest.mark.asyncio
+async def test_duplicate_while_first_runs_is_dropped():
+    gate = asyncio.Event()
+    calls = []
+
+    async def action():
+        calls.append(1)
+        await gate.wait()
+
+    first = asyncio.create_task(run_once(7, {}, action, bot=None, source="wf0:s1:extend_15"))
+    await asyncio.sleep(0)
+    await run_once(7, {}, action, bot=None, source="wf0:s1:extend_15")
+    gate.set()
+    await first
+    assert calls == [1]
+
+
+@pytest.mark.asyncio
+async def test_failure_releases_key_and_chat_is_never_deduplicated():
+    action = AsyncMock(side_effect=[RuntimeError("calendar down"), "ok"])
+    with pytest.raises(RuntimeError):
+        await run_once(7, {"action": "mark_done", "segment_id": "s1"}, action, bot=None)
+    assert await run_once(7, {"action": "mark_done", "segment_id": "s1"}, action, bot=None) == "ok"
+
+    chat = AsyncMock(return_value="hi")
+    for _ in range(2):
+        await run_once(7, {"action": "chat_fallback", "user_prompt": "hi"}, chat, bot=None)
+    assert chat.await_count == 2
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import gpt_agent
+
+NOW = datetime(2026, 1, 12, 10, 0, tzinfo=gpt_agent.TZ)  # Monday
+
+
+def test_fast_path_emits_tool_def_shapes():
+    assert gpt_agent.fast_parse("what's next?", now=NOW)["action"] == "whats_next"
+
+    agenda = gpt_agent.fast_parse("agenda tomorrow", now=NOW)
+    assert agenda["action"] == "get_agenda" and agenda["range"] == "tomorrow"
+
+    cancel = gpt_agent.fast_parse("cancel gym today", now=NOW)
+    assert cancel == {"action": "cancel_event", "title": "gym", "date": "2026-01-12", "confidence": 0.9}
+
+    create = gpt_agent.fast_parse("add Dentist tomorrow at 3pm for 30 min", now=NOW)
+    assert {k: create[k] for k in ("action", "title", "date", "time", "duration_minutes")} == {
+        "action": "create_event", "title": "Dentist", "date": "2026-01-13",
+        "time": "15:00", "duration_minutes": 30,
+    }
+
+
+def test_low_confidence_falls_back_to_llm():
+    # no date, attendees, recurrence, past time, or no match at all
+    for text in ["cancel gym", "book lunch with Sam at 1pm", "add team sync every monday at 10am",
+                 "add standup today at 8am", "move gym to 5pm", "hey"]:
+        assert gpt_agent.fast_parse(text, now=NOW) is None, text
+    assert gpt_agent.parse_intent("cancel gym", now=NOW)["confidence"] < gpt_agent.INTENT_MIN_CONFIDENCE
+
+
+def test_cancel_title_stops_at_time_words():
+    # a pronoun title or a time phrase left in the title is never a confident cancel
+    for text in ["cancel it today", "cancel that tomorrow", "cancel gym today at 5pm",
+                 "cancel gym tonight", "cancel the 3pm today"]:
+        assert gpt_agent.fast_parse(text, now=NOW) is None, text
+        intent = gpt_agent.parse_intent(text, now=NOW)
+        assert intent is None or not any(w in intent["title"] for w in ("today", "tonight", "pm")), text
+    assert gpt_agent.fast_parse("cancel gym on friday", now=NOW)["title"] == "gym"
+
+
+def test_whats_next_is_anchored():
+    assert gpt_agent.fast_parse("what's next", now=NOW)["action"] == "whats_next"
+    for text in ["what's next friday", "what is next week", "what is next month"]:
+        intent = gpt_agent.fast_parse(text, now=NOW)
+        assert intent is None or intent["action"] != "whats_next", text
+
+
+def test_early_hour_without_am_pm_goes_to_llm():
+    for text in ["schedule call at 3:30 tomorrow for 30 min", "add call at 2:30 tomorrow",
+                 "add call tomorrow at 3 for 30 min"]:
+        assert gpt_agent.fast_parse(text, now=NOW) is None, text
+    assert gpt_agent.fast_parse("add call tomorrow at 3:30pm for 30 min", now=NOW)["time"] == "15:30"
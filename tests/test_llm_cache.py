@@ -0,0 +1,53 @@
+import time
+from unittest.mock import patch, MagicMock
+
+import llm_cache
+from llm_cache import LLMCache, make_key
+
+
+def test_key_is_normalized():
+    a = make_key("reminder.v1", title="  Bible   Study ", phase="before", model="gpt-4o")
+    b = make_key("reminder.v1", title="bible study", phase="BEFORE", model="gpt-4o")
+    assert a == b
+    assert a != make_key("reminder.v1", title="bible study", phase="after", model="gpt-4o")
+
+
+def test_variants_rotate_and_expire(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), ttl=60, max_rows=100, variants=2)
+    key = make_key("reminder.v1", title="Gym", phase="before")
+    cache.put(key, "one")
+    cache.put(key, "two")
+    cache.put(key, "three")          # overwrites the oldest slot
+    assert cache.variant_count(key) == 2
+    served = {cache.get(key), cache.get(key)}
+    assert served == {"two", "three"}
+
+    with patch("llm_cache.time.time", return_value=time.time() + 120):
+        assert cache.get(key) is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), ttl=3600, max_rows=2, variants=1)
+    cache.put("a", "A")
+    time.sleep(0.01)
+    cache.put("b", "B")
+    time.sleep(0.01)
+    cache.get("a")                   # touch a, so b is least recently used
+    time.sleep(0.01)
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+
+
+def test_non_blocking_miss_returns_fallback(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"))
+    generate = MagicMock(return_value="LLM text")
+    with patch("llm_cache._CACHE", cache), patch("llm_cache._fill_in_background") as bg:
+        out = llm_cache.cached_text("k", generate, fallback=lambda: "fallback", block=False)
+        assert out == "fallback"
+        bg.assert_called_once()
+        generate.assert_not_called()
+
+        assert llm_cache.cached_text("k", generate, fallback=lambda: "fallback") == "LLM text"
+        assert llm_cache.cached_text("k", generate, fallback=lambda: "fallback", block=False) == "LLM text"
+        generate.assert_called_once()
@@ -0,0 +1,225 @@
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock
+
+import llm_client
+
+
+@pytest.mark.asyncio
+async def test_async_client_is_shared_and_calls_are_bounded():
+    active = {"now": 0, "max": 0}
+
+    async def fake_create(**kwargs):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return kwargs
+
+    fake = MagicMock()
+    fake.chat.completions.create = fake_create
+    with patch.object(llm_client, "_async_client", None), \
+         patch.object(llm_client, "_SLOTS", llm_client._Slots(2)), \
+         patch("llm_client.httpx"), \
+         patch("llm_client.AsyncOpenAI", return_value=fake) as ctor:
+        results = await asyncio.gather(*[
+            llm_client.chat([{"role": "user", "content": str(i)}], temperature=0.2, timeout=3)
+            for i in range(6)
+        ])
+
+    ctor.assert_called_once()
+    assert active["max"] == 2
+    assert results[0]["model"] == llm_client.DEFAULT_MODEL
+    assert results[0]["temperature"] == 0.2 and results[0]["timeout"] == 3
+
+
+def test_prompt_report_tracks_cached_tokens_per_site():
+    llm_client.reset_stats()
+    usage = MagicMock(prompt_tokens=2000, completion_tokens=40)
+    usage.prompt_tokens_details.cached_tokens = 1536
+    response = MagicMock(usage=usage)
+    sync = MagicMock()
+    sync.chat.completions.create.return_value = response
+    with patch.object(llm_client, "_sync_client", sync):
+        llm_client.chat_sync([{"role": "system", "content": "x" * 100}], site="parse")
+        llm_client.chat_sync([{"role": "system", "content": "x" * 100}], site="parse")
+
+    report = llm_client.prompt_report()["parse"]
+    assert report["calls"] == 2
+    assert report["avg_prompt_tokens"] == 2000
+    assert report["avg_cached_tokens"] == 1536
+    assert report["cache_hit_ratio"] == 0.768
+    assert "site" not in sync.chat.completions.create.call_args.kwargs
+    llm_client.reset_stats()
+
+
+def _fake_async(create):
+    fake = MagicMock()
+    fake.chat.completions.create = create
+    return fake
+
+
+def test_breaker_opens_then_half_open_trial_closes_it():
+    breaker = llm_client.CircuitBreaker(failures=2, reset_s=60)
+    sync = MagicMock()
+    sync.chat.completions.create.side_effect = ConnectionError("down")
+    with patch.object(llm_client, "BREAKER", breaker), patch.object(llm_client, "_sync_client", sync):
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                llm_client.chat_sync([{"role": "user", "content": "hi"}], site="t")
+        assert breaker.state == "open"
+        with pytest.raises(llm_client.LLMUnavailable):
+            llm_client.chat_sync([{"role": "user", "content": "hi"}], site="t")
+        assert sync.chat.completions.create.call_count == 2      # failed fast, no provider call
+
+        sync.chat.completions.create.side_effect = None
+        with patch("llm_client.time.monotonic", return_value=llm_client.time.monotonic() + 120):
+            assert breaker.state == "half_open"
+            llm_client.chat_sync([{"role": "user", "content": "hi"}], site="t")
+        assert breaker.state == "closed"
+    assert llm_client.health()["sites"]["t"]["errors"] == 2
+    llm_client.reset_stats()
+
+
+def test_client_errors_do_not_trip_breaker():
+    breaker = llm_client.CircuitBreaker(failures=1, reset_s=60)
+    err = ValueError("bad request")
+    err.status_code = 400
+    sync = MagicMock()
+    sync.chat.completions.create.side_effect = err
+    with patch.object(llm_client, "BREAKER", breaker), patch.object(llm_client, "_sync_client", sync):
+        with pytest.raises(ValueError):
+            llm_client.chat_sync([{"role": "user", "content": "hi"}], site="t")
+    assert breaker.state == "closed"
+    llm_client.reset_stats()
+
+
+@pytest.mark.asyncio
+async def test_deadline_and_per_user_limit():
+    active = {"now": 0, "max": 0}
+
+    async def slow_create(**kwargs):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.02)
+        active["now"] -= 1
+        return MagicMock(usage=None)
+
+    with patch.object(llm_client, "_async_client", None), \
+         patch.object(llm_client, "BREAKER", llm_client.CircuitBreaker()), \
+         patch.object(llm_client, "PER_USER_CONCURRENCY", 1), \
+         patch("llm_client.httpx"), \
+         patch("llm_client.AsyncOpenAI", return_value=_fake_async(slow_create)):
+        await asyncio.gather(*[
+            llm_client.chat([{"role": "user", "content": "x"}], site="t", user_id="u1") for _ in range(3)
+        ])
+        assert active["max"] == 1
+
+        with pytest.raises(llm_client.LLMUnavailable):
+            await llm_client.chat([{"role": "user", "content": "x"}], site="t", deadline=0.005)
+    llm_client.reset_stats()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_the_faster_answer():
+    delays = iter([0.5, 0.01])
+
+    async def create(**kwargs):
+        d = next(delays)
+        await asyncio.sleep(d)
+        return MagicMock(usage=None, delay=d)
+
+    with patch.object(llm_client, "_async_client", None), \
+         patch.object(llm_client, "BREAKER", llm_client.CircuitBreaker()), \
+         patch("llm_client.httpx"), \
+         patch("llm_client.AsyncOpenAI", return_value=_fake_async(create)):
+        res = await llm_client.chat([{"role": "user", "content": "x"}], site="hedge", hedge_after=0.02)
+    assert res.delay == 0.01
+    hist = llm_client.health()["sites"]["hedge"]["latency_ms"]
+    assert hist["<=250ms"] == 1
+    llm_client.reset_stats()
+
+
+def test_half_open_trial_that_never_gets_a_slot_frees_the_trial():
+    breaker = llm_client.CircuitBreaker(failures=1, reset_s=60)
+    breaker.record_failure()
+    sync = MagicMock()
+    later = llm_client.time.monotonic() + 120
+    with patch.object(llm_client, "BREAKER", breaker), patch.object(llm_client, "_sync_client", sync), \
+         patch.object(llm_client, "_SLOTS", llm_client._Slots(1)) as sem, \
+         patch("llm_client.time.monotonic", side_effect=lambda: later):
+        sem.acquire()                               # every slot busy
+        with pytest.raises(llm_client.LLMUnavailable):
+            llm_client.chat_sync([{"role": "user", "content": "hi"}], site="t", deadline=0.01)
+        assert breaker.state == "half_open"         # congestion neither reopened nor stuck the breaker
+        sem.release()
+        llm_client.chat_sync([{"role": "user", "content": "hi"}], site="t")
+        assert breaker.state == "closed"
+    sync.chat.completions.create.assert_called_once()
+    llm_client.reset_stats()
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_a_local_slot_is_not_a_provider_failure():
+    breaker = llm_client.CircuitBreaker(failures=1, reset_s=60)
+
+    async def slow_create(**kwargs):
+        await asyncio.sleep(0.05)
+        return MagicMock(usage=None)
+
+    with patch.object(llm_client, "_async_client", None), \
+         patch.object(llm_client, "BREAKER", breaker), \
+         patch.object(llm_client, "_SLOTS", llm_client._Slots(1)), \
+         patch("llm_client.httpx"), \
+         patch("llm_client.AsyncOpenAI", return_value=_fake_async(slow_create)):
+        first = asyncio.create_task(llm_client.chat([{"role": "user", "content": "a"}], site="t"))
+        await asyncio.sleep(0)
+        with pytest.raises(llm_client.LLMUnavailable, match="no free LLM slot"):
+            await llm_client.chat([{"role": "user", "content": "b"}], site="t", deadline=0.01)
+        await first
+    assert breaker.state == "closed"
+    llm_client.reset_stats()
+
+
+@pytest.mark.asyncio
+async def test_sync_and_async_calls_share_one_budget():
+    active = {"now": 0, "max": 0}
+    lock = llm_client.threading.Lock()
+
+    def enter():
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+
+    def leave():
+        with lock:
+            active["now"] -= 1
+
+    async def slow_async(**kwargs):
+        enter()
+        await asyncio.sleep(0.03)
+        leave()
+        return MagicMock(usage=None)
+
+    def slow_sync(**kwargs):
+        enter()
+        llm_client.time.sleep(0.03)
+        leave()
+        return MagicMock(usage=None)
+
+    sync = MagicMock()
+    sync.chat.completions.create.side_effect = slow_sync
+    with patch.object(llm_client, "_async_client", None), \
+         patch.object(llm_client, "_sync_client", sync), \
+         patch.object(llm_client, "BREAKER", llm_client.CircuitBreaker()), \
+         patch.object(llm_client, "_SLOTS", llm_client._Slots(2)), \
+         patch("llm_client.httpx"), \
+         patch("llm_client.AsyncOpenAI", return_value=_fake_async(slow_async)):
+        msgs = [{"role": "user", "content": "x"}]
+        await asyncio.gather(
+            *[llm_client.chat(msgs, site="t", user_id=f"u{i}") for i in range(3)],
+            *[asyncio.to_thread(llm_client.chat_sync, msgs, site="t", user_id=f"u{i}") for i in range(3)],
+        )
+    assert active["max"] == 2
+    assert llm_client._user_slots == {}          # idle per-user slots are not kept
+    llm_client.reset_stats()
@@ -0,0 +1,47 @@
+import pytest
+
+from agent_brain.memory import MemoryStore, estimate_tokens
+
+
+def test_trims_by_tokens_not_message_count():
+    store = MemoryStore(budget_tokens=40)
+    for i in range(10):
+        store.append("u1", "user", f"short {i}")
+    ctx = store.context("u1")
+    assert 1 < len(ctx) < 10
+    assert ctx[-1]["content"] == "short 9"
+
+    store.append("u1", "user", "x" * 400)       # one big turn evicts everything older
+    assert store.context("u1") == [{"role": "user", "content": "x" * 400}]
+
+
+def test_users_are_isolated_and_loader_runs_once():
+    store = MemoryStore(budget_tokens=100)
+    calls = []
+    loader = lambda: calls.append(1) or [{"role": "user", "content": "hi"}]
+    store.load("a", loader)
+    store.load("a", loader)
+    store.append("b", "user", "other chat")
+    assert len(calls) == 1
+    assert [m["content"] for m in store.context("a")] == ["hi"]
+    assert [m["content"] for m in store.context("b")] == ["other chat"]
+
+
+@pytest.mark.asyncio
+async def test_evicted_turns_fold_into_rolling_summary():
+    seen = []
+
+    async def summarizer(previous, turns):
+        seen.append([t["content"] for t in turns])
+        return (previous + " " + " ".join(t["content"] for t in turns)).strip()
+
+    store = MemoryStore(budget_tokens=3 * (estimate_tokens("turn 0") + 4), summarizer=summarizer)
+    for i in range(6):
+        store.append("u", "user", f"turn {i}")
+    await store.drain()
+
+    ctx = store.context("u")
+    assert ctx[0]["role"] == "system"
+    assert ctx[0]["content"] == "Earlier in this conversation: turn 0 turn 1 turn 2"
+    assert [m["content"] for m in ctx[1:]] == ["turn 3", "turn 4", "turn 5"]
+    assert seen == [["turn 0"], ["turn 1"], ["turn 2"]]
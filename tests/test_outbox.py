@@ -0,0 +1,127 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from agent_brain.outbox import OutMessage, Outbox, TokenBucket, merge
+
+
+def _bot():
+    bot = MagicMock()
+    bot.send_message = AsyncMock(side_effect=lambda **kw: SimpleNamespace(text=kw["text"]))
+    return bot
+
+
+def test_token_bucket_waits_after_burst():
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0.0
+
+
+def test_merge_joins_per_chat_and_keyboard_closes_group():
+    bot = object()
+    kb = object()
+    msgs = [
+        OutMessage(bot, 1, "a"),
+        OutMessage(bot, 2, "x"),
+        OutMessage(bot, 1, "b", reply_markup=kb),
+        OutMessage(bot, 1, "c"),
+        OutMessage(bot, 1, "d", parse_mode="Markdown"),
+    ]
+    out = merge(msgs)
+    assert [(m.chat_id, m.text) for m in out] == [(1, "a\n\nb"), (2, "x"), (1, "c"), (1, "d")]
+    assert out[0].reply_markup is kb and out[0].merged == 2
+
+
+@pytest.mark.asyncio
+async def test_coalesce_sends_one_message_per_chat():
+    box, bot = Outbox(), _bot()
+    async with box.coalesce():
+        assert await box.send(bot, 1, "first") is None
+        await box.send(bot, 2, "other chat")
+        await box.send(bot, 1, "second")
+    await box.drain()
+
+    texts = sorted(c.kwargs["text"] for c in bot.send_message.await_args_list)
+    assert texts == ["first\n\nsecond", "other chat"]
+    assert box.stats()["merged"] == 1 and box.stats()["sent"] == 2
+
+
+@pytest.mark.asyncio
+async def test_markdown_rejected_falls_back_to_plain_text():
+    box, bot = Outbox(), _bot()
+    bot.send_message.side_effect = [BadRequest("Can't parse entities"), SimpleNamespace(text="*x")]
+    msg = await box.send(bot, 1, "*x", parse_mode="Markdown")
+
+    assert msg.text == "*x"
+    assert bot.send_message.await_args.kwargs["parse_mode"] is None
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_resends():
+    box, bot = Outbox(), _bot()
+    bot.send_message.side_effect = [RetryAfter(0.05), SimpleNamespace(text="hi")]
+    t0 = time.monotonic()
+    msg = await box.send(bot, 1, "hi")
+
+    assert msg.text == "hi"
+    assert time.monotonic() - t0 >= 0.05
+    assert box.stats()["retries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_per_chat_rate_limit_paces_sends_and_records_delay():
+    box, bot = Outbox(per_chat_rate=20.0, per_chat_burst=1), _bot()
+    t0 = time.monotonic()
+    await asyncio.gather(*(box.send(bot, 1, f"m{i}") for i in range(3)))
+
+    assert time.monotonic() - t0 >= 0.09  # 2 waits of 50ms after the first token
+    assert [c.kwargs["text"] for c in bot.send_message.await_args_list] == ["m0", "m1", "m2"]
+    stats = box.stats()
+    assert stats["sent"] == 3 and stats["delay_ms_max"] >= 90
+
+
+@pytest.mark.asyncio
+async def test_send_error_reaches_caller():
+    box, bot = Outbox(), _bot()
+    bot.send_message.side_effect = RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        await box.send(bot, 1, "hi")
+    assert box.stats()["failed"] == 1
+
+
+def test_merge_never_exceeds_telegram_limit():
+    bot = object()
+    msgs = [OutMessage(bot, 1, "x" * 3000), OutMessage(bot, 1, "y" * 1000), OutMessage(bot, 1, "z" * 200)]
+    out = merge(msgs)
+    assert [len(m.text) for m in out] == [3000 + 2 + 1000, 200]
+    assert all(len(m.text) <= 4096 for m in out)
+
+
+@pytest.mark.asyncio
+async def test_on_sent_runs_only_after_delivery():
+    box, bot = Outbox(), _bot()
+    done = []
+
+    def deliver(**kw):
+        if kw["chat_id"] == 2:
+            raise RuntimeError("chat not found")
+        return SimpleNamespace(text=kw["text"])
+
+    bot.send_message.side_effect = deliver
+    async with box.coalesce():
+        await box.send(bot, 1, "a", on_sent=lambda: done.append("a"))
+        assert done == []                       # queued, not delivered yet
+        await box.send(bot, 1, "b", on_sent=lambda: done.append("b"))
+        await box.send(bot, 2, "c", on_sent=AsyncMock(side_effect=lambda: done.append("c")),
+                       on_failed=lambda: done.append("c failed"))
+    await box.drain()
+
+    assert sorted(done) == ["a", "b", "c failed"]  # chat 2's send failed: only on_failed ran
+    assert box.stats()["failed"] == 1
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+
+import gpt_agent
+from agent_brain import core
+
+
+def test_parse_prompt_has_stable_prefix_and_dynamic_suffix():
+    t1 = datetime(2026, 1, 12, 9, 5, tzinfo=gpt_agent.TZ)
+    gpt_agent.reset_conversation()
+    first = gpt_agent._parse_messages("agenda tomorrow", now=t1)
+    second = gpt_agent._parse_messages("cancel gym today", now=t1 + timedelta(hours=3))
+    gpt_agent.reset_conversation()
+
+    assert first[0] == second[0] == {"role": "system", "content": gpt_agent.SYSTEM}
+    assert "{" not in gpt_agent.SYSTEM  # nothing left to interpolate
+    # history stays in front of the per-request context
+    assert second[1] == {"role": "user", "content": "agenda tomorrow"}
+    assert second[-2]["content"].startswith("Now: Monday, 12 January 2026, 12:05")
+    assert second[-1] == {"role": "user", "content": "cancel gym today"}
+
+
+def test_brain_system_prompt_is_static():
+    assert "{" not in core.BRAIN_SYSTEM_PROMPT
+    assert "Current Event" not in core.BRAIN_SYSTEM_PROMPT
@@ -0,0 +1,53 @@
+# tests/test_reconcile.py
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from agent_brain.reconcile import normalize_event, fingerprint, diff_segments
+
+TZ = ZoneInfo("Europe/London")
+
+
+def _event(eid, hour, **extra):
+    start = dt.datetime(2026, 1, 12, hour, 0, tzinfo=TZ)
+    ev = {
+        "id": eid,
+        "summary": f"Block {eid}",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + dt.timedelta(hours=1)).isoformat()},
+    }
+    ev.update(extra)
+    return ev
+
+
+def test_normalize_prefers_stored_rigidity_over_attendees():
+    ev = _event("a", 9, attendees=[{"email": "x@example.com"}],
+                extendedProperties={"private": {"rigidity": "hard"}})
+    assert normalize_event(ev, TZ)["rigidity"] == "hard"
+    assert normalize_event(_event("b", 9, attendees=[{"email": "x@example.com"}]), TZ)["rigidity"] == "firm"
+    assert normalize_event(_event("c", 9), TZ)["rigidity"] == "soft"
+    assert normalize_event(_event("d", 9), TZ)["id"] == "gcal:d"
+
+
+def test_normalize_skips_all_day_events():
+    ev = {"id": "x", "summary": "Holiday", "start": {"date": "2026-01-12"}, "end": {"date": "2026-01-13"}}
+    assert normalize_event(ev, TZ) is None
+
+
+def test_diff_emits_only_changes():
+    same = normalize_event(_event("same", 9), TZ)
+    moved = normalize_event(_event("moved", 11), TZ)
+    new = normalize_event(_event("new", 13), TZ)
+
+    stored = {
+        "gcal:same": fingerprint(same),
+        "gcal:moved": fingerprint(normalize_event(_event("moved", 10), TZ)),
+        "gcal:gone": "stale",
+        "gcal:done": "stale",
+    }
+    plan = diff_segments([same, moved, new], stored, deletable=["gcal:gone", "gcal:same"])
+
+    assert [s["id"] for s in plan.inserts] == ["gcal:new"]
+    assert [s["id"] for s in plan.updates] == ["gcal:moved"]
+    assert plan.deletes == ["gcal:gone"]  # closed/started rows are never deleted
+    assert plan.unchanged == 1
+    assert all("fingerprint" in s for s in plan.changed)
@@ -0,0 +1,110 @@
+# tests/test_recovery.py
+import datetime as dt
+from zoneinfo import ZoneInfo
+from unittest.mock import patch
+
+from agent_brain.recovery import Candidate, plan_placements, run_batch
+
+TZ = ZoneInfo("Europe/London")
+DAY = dt.datetime(2026, 1, 12, 0, 0, tzinfo=TZ)
+
+
+def _at(h, m=0):
+    return DAY.replace(hour=h, minute=m)
+
+
+def test_q1_picks_first_and_blocks_do_not_overlap():
+    now = _at(8)
+    gaps = [(_at(9), _at(10)), (_at(14), _at(16))]
+    cands = [
+        Candidate("admin", "Email inbox", "III", 30),
+        Candidate("urgent", "Fix deadline bug", "I", 60),
+        Candidate("deep", "Write chapter", "II", 60),
+    ]
+    placements, unplaced = plan_placements(cands, gaps, now=now, budget=3, peak_hours="09:00-12:00")
+
+    by_id = {p.seg_id: p for p in placements}
+    assert by_id["urgent"].start == _at(9)        # Q1 takes the peak slot first
+    assert "deep" in by_id and by_id["deep"].start >= _at(14)
+    spans = sorted((p.start, p.end) for p in placements)
+    for (s1, e1), (s2, _) in zip(spans, spans[1:]):
+        assert s2 >= e1
+    assert [c.seg_id for c in unplaced] == []
+
+
+def test_budget_caps_bookings():
+    now = _at(8)
+    gaps = [(_at(9), _at(17))]
+    cands = [Candidate(f"s{i}", "Task", "II", 30) for i in range(4)]
+    placements, unplaced = plan_placements(cands, gaps, now=now, budget=2)
+    assert len(placements) == 2
+    assert len(unplaced) == 2
+
+
+@patch("agent_brain.recovery.state")
+@patch("agent_brain.recovery.book")
+@patch("agent_brain.recovery.free_gaps")
+@patch("agent_brain.recovery.remaining_budget", return_value=1)
+@patch("agent_brain.recovery.load_segments")
+@patch("agent_brain.recovery.pending_missed", return_value=["gcal:q"])
+def test_run_batch_drains_queue_and_consumes_budget(_pending, mock_load, _budget, mock_gaps, mock_book, mock_state):
+    now = _at(8)
+    mock_load.return_value = [{"id": "gcal:q", "title": "Deep work", "start_at": _at(7), "end_at": _at(8)}]
+    mock_gaps.return_value = [(_at(9), _at(12))]
+    mock_book.side_effect = lambda placements, tz: {p.seg_id: p for p in placements}
+
+    booked = run_batch(now, TZ)
+
+    assert list(booked) == ["gcal:q"]
+    assert mock_load.call_args.args[0] == ["gcal:q"]
+    mock_state.increment_recovery_blocks_used.assert_called_once_with(1)
+
+
+@patch("agent_brain.recovery.state")
+@patch("agent_brain.recovery.book")
+@patch("agent_brain.recovery.load_segments")
+@patch("agent_brain.recovery.pending_missed", return_value=[])
+def test_second_batch_before_reconcile_does_not_reuse_booked_gap(_pending, mock_load, mock_book, _state):
+    from agent_brain import timeline
+    now = _at(8)
+    timeline.publish_index(timeline.FreeSlotIndex(
+        [{"id": "a", "start_at": _at(8), "end_at": _at(9)}, {"id": "b", "start_at": _at(10), "end_at": _at(18)}],
+        {}, DAY, DAY + dt.timedelta(days=1)))
+    mock_load.side_effect = lambda ids: [{"id": i, "title": "Task", "start_at": _at(7), "end_at": _at(8)} for i in ids]
+    mock_book.side_effect = lambda placements, tz: {p.seg_id: p for p in placements}
+    try:
+        with patch.object(timeline.FreeSlotIndex, "covers", return_value=True):
+            first = run_batch(now, TZ, extra=["s1"], use_budget=False)["s1"]
+            second = run_batch(now, TZ, extra=["s2"], use_budget=False).get("s2")
+    finally:
+        timeline.publish_index(None)
+    assert first.start == _at(9)
+    assert second is None or second.start >= first.end or second.end <= first.start
+
+
+@patch("agent_brain.recovery.state")
+@patch("agent_brain.recovery.book")
+@patch("agent_brain.recovery.free_gaps")
+@patch("agent_brain.recovery.remaining_budget", return_value=1)
+@patch("agent_brain.recovery.load_segments")
+@patch("agent_brain.recovery.pending_missed", return_value=["old", "today-q1"])
+def test_requested_segment_gets_the_budget_and_other_days_stay_queued(
+        _pending, mock_load, _budget, mock_gaps, mock_book, _state):
+    now = _at(8)
+    yesterday = DAY - dt.timedelta(days=1)
+    mock_load.return_value = [
+        {"id": "asked", "title": "Write chapter", "start_at": _at(7), "end_at": _at(8)},
+        {"id": "old", "title": "Urgent deadline fix", "start_at": yesterday.replace(hour=9),
+         "end_at": yesterday.replace(hour=10)},
+        {"id": "today-q1", "title": "Urgent deadline fix", "start_at": _at(6), "end_at": _at(7)},
+    ]
+    mock_gaps.return_value = [(_at(9), _at(17))]
+    mock_book.side_effect = lambda placements, tz: {p.seg_id: p for p in placements}
+
+    from agent_brain import recovery
+    with patch.object(recovery, "plan_placements", wraps=recovery.plan_placements) as plan:
+        booked = run_batch(now, TZ, extra=["asked"])
+
+    assert list(booked) == ["asked"]            # budget of 1 went to the segment the user asked about
+    considered = {c.seg_id for c in plan.call_args.args[0]}
+    assert considered == {"asked", "today-q1"}  # yesterday's miss is left for the drain job
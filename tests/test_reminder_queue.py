@@ -0,0 +1,105 @@
+# tests/test_reminder_queue.py
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from agent_brain.reminder_queue import ReminderQueue, ReminderItem, plan_reminders
+
+TZ = ZoneInfo("Europe/London")
+
+
+def _fire_time(start_at, minutes_before, tz):
+    return start_at - dt.timedelta(minutes=minutes_before)
+
+
+def _event(eid, start, minutes=60, title="Deep Work"):
+    return {
+        "id": eid,
+        "summary": title,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + dt.timedelta(minutes=minutes)).isoformat()},
+    }
+
+
+def test_plan_reminders_computes_all_phases():
+    now = dt.datetime(2026, 1, 12, 8, 0, tzinfo=TZ)
+    start = dt.datetime(2026, 1, 12, 10, 0, tzinfo=TZ)
+
+    items = plan_reminders([_event("e1", start)], now, tz=TZ, minutes_before=10, min_before=9,
+                           fire_time_fn=_fire_time)
+
+    by_phase = {it.phase: it.fire_at for it in items}
+    assert by_phase["before"] == dt.datetime(2026, 1, 12, 9, 50, tzinfo=TZ)
+    assert by_phase["during"] == dt.datetime(2026, 1, 12, 10, 1, tzinfo=TZ)
+    assert by_phase["after"] == dt.datetime(2026, 1, 12, 11, 1, tzinfo=TZ)
+
+
+def test_plan_reminders_skips_notified_and_closed_windows():
+    now = dt.datetime(2026, 1, 12, 9, 55, tzinfo=TZ)
+    start = dt.datetime(2026, 1, 12, 10, 0, tzinfo=TZ)
+    events = [_event("e1", start), _event("e2", start, title="Gym")]
+
+    items = plan_reminders(events, now, tz=TZ, minutes_before=10, min_before=9, fire_time_fn=_fire_time,
+                           notified={("e1", "during")})
+
+    keys = {(it.event_id, it.phase) for it in items}
+    # 'before' window (until 09:51) already closed for both events
+    assert keys == {("e1", "after"), ("e2", "during"), ("e2", "after")}
+
+
+def test_queue_pops_in_order_and_never_refires():
+    now = dt.datetime(2026, 1, 12, 10, 0, tzinfo=TZ)
+    q = ReminderQueue()
+    late = ReminderItem(fire_at=now + dt.timedelta(minutes=5), event_id="b", phase="during")
+    early = ReminderItem(fire_at=now - dt.timedelta(minutes=1), event_id="a", phase="during")
+    q.replace([late, early], now=now)
+
+    assert q.next_fire_at() == early.fire_at
+    assert [it.event_id for it in q.pop_due(now)] == ["a"]
+
+    # A replan that still contains the fired item must not queue it again
+    q.replace([late, early], now=now)
+    assert len(q) == 1
+    assert q.pop_due(now) == []
+    assert [it.event_id for it in q.pop_due(now + dt.timedelta(minutes=5))] == ["b"]
+
+
+def test_queue_drops_items_past_deadline():
+    now = dt.datetime(2026, 1, 12, 10, 0, tzinfo=TZ)
+    q = ReminderQueue()
+    q.push(ReminderItem(fire_at=now - dt.timedelta(minutes=10), event_id="x", phase="after",
+                        deadline=now - dt.timedelta(minutes=5)))
+    assert q.pop_due(now) == []
+    assert len(q) == 0
+
+
+def test_notified_state_is_loaded_once_per_event():
+    calls = []
+
+    def lookup(event_id, phase):
+        calls.append((event_id, phase))
+        return (event_id, phase) == ("a", "before")
+
+    q = ReminderQueue()
+    assert q.notified_for(["a"], lookup) == {("a", "before")}
+    q.mark_notified("a", "during")
+    assert q.notified_for(["a", "b"], lookup) == {("a", "before"), ("a", "during")}
+    assert q.notified_for(["a", "b"], lookup) == {("a", "before"), ("a", "during")}
+    # three phases per event, each event looked up exactly once
+    assert sorted({eid for eid, _ in calls}) == ["a", "b"] and len(calls) == 6
+
+
+def test_failed_delivery_is_retried_and_survives_replan():
+    now = dt.datetime(2026, 1, 12, 10, 1, tzinfo=TZ)
+    item = ReminderItem(fire_at=now, event_id="a", phase="during", deadline=now + dt.timedelta(minutes=2))
+    q = ReminderQueue()
+    q.replace([item], now=now)
+    [popped] = q.pop_due(now)
+
+    assert q.retry(popped, now)
+    q.replace([item], now=now)                  # replan: the retry replaces the planned item
+    assert len(q) == 1 and q.pop_due(now) == []
+    [again] = q.pop_due(now + dt.timedelta(minutes=1))
+    assert again.attempt == 1 and again.key == item.key
+
+    q.replace([item], now=now)                  # delivered retry is fired like any other item
+    assert len(q) == 0
@@ -0,0 +1,55 @@
+import json
+
+import httpx
+import pytest
+
+import replay
+from replay import Cassette, ReplayMiss, request_key
+
+
+def test_key_ignores_timestamps_and_json_key_order():
+    a = request_key("post", "https://x/v1/chat", json.dumps({"model": "m", "now": "2026-10-19T09:00:00+01:00"}))
+    b = request_key("POST", "https://x/v1/chat", json.dumps({"now": "2026-11-02T17:30:00+00:00", "model": "m"}))
+    assert a == b
+    assert a != request_key("POST", "https://x/v1/chat", json.dumps({"model": "other"}))
+
+
+def test_cassette_replays_in_order_then_repeats_last(tmp_path):
+    path = str(tmp_path / "t.jsonl")
+    tape = Cassette(path)
+    tape.record("GET", "https://cal/events?timeMin=2026-10-19T00:00:00Z", None, 200, {}, b"one", 0.1)
+    tape.record("GET", "https://cal/events?timeMin=2026-10-19T00:00:00Z", None, 200, {}, b"two", 0.2)
+
+    loaded = Cassette(path)
+    url = "https://cal/events?timeMin=2026-12-01T00:00:00Z"
+    assert [loaded.match("GET", url, None)["body"] for _ in range(3)] == ["one", "two", "two"]
+    with pytest.raises(ReplayMiss):
+        loaded.match("GET", "https://cal/other", None)
+    assert loaded.misses == 1
+
+
+def test_batch_content_ids_are_rewritten():
+    recorded = "Content-ID: <11111111-2222-3333-4444-555555555555+1>"
+    live = b"Content-ID: <aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee+1>"
+    content = "Content-ID: <response-11111111-2222-3333-4444-555555555555+1>"
+    out = replay._rewrite_batch_ids(recorded, live, content)
+    assert "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee+1" in out
+
+
+def test_httpx_record_then_replay_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(replay, "REPLAY_LATENCY", "none")
+    calls = []
+
+    def upstream(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "hi"}}]})
+
+    tape = Cassette(str(tmp_path / "openai.jsonl"))
+    with httpx.Client(transport=replay.RecordingTransport(httpx.MockTransport(upstream), tape)) as client:
+        client.post("https://api/v1/chat/completions", json={"messages": [{"content": "Now: 2026-10-19 09:00"}]})
+
+    offline = Cassette(str(tmp_path / "openai.jsonl"))
+    with httpx.Client(transport=replay.ReplayTransport(offline)) as client:
+        res = client.post("https://api/v1/chat/completions", json={"messages": [{"content": "Now: 2026-10-20 10:15"}]})
+    assert res.json()["choices"][0]["message"]["content"] == "hi"
+    assert len(calls) == 1
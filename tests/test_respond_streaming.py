@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from agent_brain import respond
+
+
+@pytest.fixture(autouse=True)
+def _fresh_outbox():
+    # one queue per test: the shared per-chat bucket would pace later tests
+    with patch.object(respond.outbox, "OUTBOX", respond.outbox.Outbox()):
+        yield
+
+
+async def _chunks(parts, delay=0.0):
+    for p in parts:
+        if delay:
+            await asyncio.sleep(delay)
+        yield p
+
+
+def _ctx():
+    bot = MagicMock()
+    bot.send_message = AsyncMock(return_value=SimpleNamespace(message_id=42))
+    bot.edit_message_text = AsyncMock()
+    return SimpleNamespace(bot=bot, job=None)
+
+
+def _update():
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=7))
+
+
+@pytest.mark.asyncio
+async def test_first_sentence_sent_then_final_markdown_edit():
+    ctx = _ctx()
+    with patch.object(respond, "STREAM_EDIT_INTERVAL_S", 60):
+        text = await respond.stream_text_safe(
+            _update(), ctx, _chunks(["Next up: ", "*Deep work* ", "at 10:00.", " Ready?"]))
+
+    assert text == "Next up: *Deep work* at 10:00. Ready?"
+    ctx.bot.send_message.assert_awaited_once()
+    assert ctx.bot.send_message.await_args.kwargs["text"] == "Next up: "
+    assert ctx.bot.send_message.await_args.kwargs["parse_mode"] is None
+    # edits throttled away; only the final one goes out, with Markdown
+    ctx.bot.edit_message_text.assert_awaited_once()
+    final = ctx.bot.edit_message_text.await_args.kwargs
+    assert final["message_id"] == 42 and final["text"] == text and final["parse_mode"] == "Markdown"
+
+
+@pytest.mark.asyncio
+async def test_intermediate_edits_are_throttled():
+    ctx = _ctx()
+    parts = ["Hi. "] + ["word "] * 10
+    with patch.object(respond, "STREAM_EDIT_INTERVAL_S", 0.02):
+        await respond.stream_text_safe(_update(), ctx, _chunks(parts, delay=0.005))
+    # ~50ms of streaming at one edit per 20ms, plus the final edit
+    assert 2 <= ctx.bot.edit_message_text.await_count <= 5
+
+
+@pytest.mark.asyncio
+async def test_unbalanced_markdown_final_edit_is_plain():
+    ctx = _ctx()
+    with patch.object(respond, "STREAM_EDIT_INTERVAL_S", 60):
+        await respond.stream_text_safe(_update(), ctx, _chunks(["Done. ", "snake_case name"]))
+    assert ctx.bot.edit_message_text.await_args.kwargs["parse_mode"] is None
+
+
+@pytest.mark.asyncio
+async def test_markdown_rejected_falls_back_to_plain():
+    ctx = _ctx()
+    ctx.bot.edit_message_text.side_effect = [BadRequest("Can't parse entities"), None]
+    with patch.object(respond, "STREAM_EDIT_INTERVAL_S", 60):
+        await respond.stream_text_safe(_update(), ctx, _chunks(["Ok. ", "*bold*"]))
+    modes = [c.kwargs["parse_mode"] for c in ctx.bot.edit_message_text.await_args_list]
+    assert modes == ["Markdown", None]
+
+
+@pytest.mark.asyncio
+async def test_short_reply_without_boundary_is_sent_once():
+    ctx = _ctx()
+    with patch.object(respond, "STREAM_FIRST_CHUNK_S", 60):
+        await respond.stream_text_safe(_update(), ctx, _chunks(["Sure", "thing"]))
+    ctx.bot.send_message.assert_awaited_once()
+    assert ctx.bot.send_message.await_args.kwargs["text"] == "Surething"
+    ctx.bot.edit_message_text.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_respond_with_brain_streams_when_flag_on():
+    ctx = _ctx()
+    with patch.object(respond.ff, "enabled", return_value=True), \
+         patch.object(respond, "conversational_brain_stream", return_value=_chunks(["All set. ", "Anything else?"])), \
+         patch.object(respond, "conversational_brain", new=AsyncMock()) as brain:
+        text = await respond.respond_with_brain(_update(), ctx, {"user_prompt": "thanks"}, user="thanks")
+    assert text == "All set. Anything else?"
+    brain.assert_not_awaited()
+    ctx.bot.send_message.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_final_edit_retried_after_retry_after():
+    ctx = _ctx()
+    ctx.bot.edit_message_text.side_effect = [RetryAfter(0.01), None]
+    with patch.object(respond, "STREAM_EDIT_INTERVAL_S", 60):
+        await respond.stream_text_safe(_update(), ctx, _chunks(["Ok. ", "*bold*"]))
+    calls = ctx.bot.edit_message_text.await_args_list
+    assert len(calls) == 2
+    assert calls[-1].kwargs["text"] == "Ok. *bold*" and calls[-1].kwargs["parse_mode"] == "Markdown"
+
+
+async def _broken_after(parts):
+    for p in parts:
+        yield p
+    raise ConnectionError("stream dropped")
+
+
+@pytest.mark.asyncio
+async def test_stream_failure_after_first_message_finishes_it_without_second_reply():
+    ctx = _ctx()
+    with patch.object(respond.ff, "enabled", return_value=True), \
+         patch.object(respond, "STREAM_EDIT_INTERVAL_S", 60), \
+         patch.object(respond, "conversational_brain_stream", return_value=_broken_after(["All set. ", "More"])), \
+         patch.object(respond, "conversational_brain", new=AsyncMock(return_value="full")) as brain:
+        text = await respond.respond_with_brain(_update(), ctx, {"user_prompt": "thanks"}, user="thanks")
+    assert text == "All set. More"
+    brain.assert_not_awaited()
+    ctx.bot.send_message.assert_awaited_once()
+    assert ctx.bot.edit_message_text.await_args.kwargs["text"] == "All set. More"
+
+
+@pytest.mark.asyncio
+async def test_stream_failure_before_any_text_falls_back():
+    ctx = _ctx()
+    with patch.object(respond.ff, "enabled", return_value=True), \
+         patch.object(respond, "conversational_brain_stream", return_value=_broken_after([])), \
+         patch.object(respond, "conversational_brain", new=AsyncMock(return_value="Full reply.")) as brain:
+        text = await respond.respond_with_brain(_update(), ctx, {"user_prompt": "thanks"}, user="thanks")
+    assert text == "Full reply."
+    brain.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_stream_inside_coalesce_is_queued_in_order():
+    ctx = _ctx()
+    async with respond.outbox.coalesce():
+        await respond.outbox.send(ctx.bot, 7, "Earlier message", parse_mode="Markdown")
+        text = await respond.stream_text_safe(_update(), ctx, _chunks(["Streamed. ", "Reply."]))
+        ctx.bot.send_message.assert_not_awaited()
+    await respond.outbox.OUTBOX.drain()
+
+    assert text == "Streamed. Reply."
+    ctx.bot.send_message.assert_awaited_once()
+    assert ctx.bot.send_message.await_args.kwargs["text"] == "Earlier message\n\nStreamed. Reply."
+    ctx.bot.edit_message_text.assert_not_awaited()
@@ -1,5 +1,10 @@
 from agent_brain.scheduler import propose_adjustment
-from datetime import datetime
+from agent_brain import scheduler
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
 
 def test_propose_adjustment():
     drift = {"summary": "Morning Planning"}
@@ -8,4 +13,84 @@ def test_propose_adjustment():
     assert "Morning Planning" in suggestion["reason"]
 
     dt_obj = datetime.fromisoformat(suggestion["new_time"])
-    assert dt_obj.minute == 0 and dt_obj.second == 0  # Ensures it's top of the hour
\ No newline at end of file
+    assert dt_obj.minute == 0 and dt_obj.second == 0  # Ensures it's top of the hour
+
+@patch("agent_brain.scheduler.SCHED")
+@patch("agent_brain.scheduler.job_store")
+def test_midpoint_tick_is_upserted_not_stacked(mock_store, mock_sched):
+    mock_store.job_id.side_effect = lambda seg_id, kind: f"seg:{seg_id}:{kind}"
+    start = datetime.now(scheduler.TZ) + timedelta(minutes=10)
+    end = start + timedelta(minutes=60)
+
+    scheduler.schedule_midpoint_tick("gcal:abc", start, end)
+    scheduler.schedule_midpoint_tick("gcal:abc", start, end)
+
+    assert mock_store.upsert_job.call_count == 2
+    ids = {c.kwargs["id"] for c in mock_sched.add_job.call_args_list}
+    assert ids == {"seg:gcal:abc:mid"}
+    assert all(c.kwargs["replace_existing"] for c in mock_sched.add_job.call_args_list)
+    assert mock_store.upsert_job.call_args.args[2] == start + timedelta(minutes=30)
+
+@patch("agent_brain.scheduler._arm_reminder_dispatch")
+@patch("agent_brain.scheduler.time_service")
+@patch("agent_brain.scheduler.db")
+@patch("agent_brain.scheduler.cal")
+def test_replan_reads_notified_state_once_per_event(mock_cal, mock_db, mock_time, _arm):
+    mock_time.compute_reminder_fire_time.side_effect = lambda start_at, minutes_before, tz: \
+        start_at - timedelta(minutes=minutes_before)
+    start = datetime.now(scheduler.TZ) + timedelta(hours=1)
+    mock_cal.get_agenda.return_value = [{
+        "id": "e1", "summary": "Deep Work",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+    }]
+    mock_db.was_event_notified.return_value = False
+    mock_db.get_due_postponed_reminders.return_value = []
+
+    with patch.object(scheduler, "REMINDERS", scheduler.reminder_queue.ReminderQueue()):
+        assert scheduler.replan_reminders() == 3
+        assert scheduler.replan_reminders() == 3
+
+    assert mock_db.was_event_notified.call_count == 3
+    mock_db.is_event_blocked.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_failed_reminder_send_is_retried():
+    now = datetime.now(scheduler.TZ)
+    item = scheduler.reminder_queue.ReminderItem(
+        fire_at=now, event_id="e1", phase="during", title="Deep Work", deadline=now + timedelta(minutes=2))
+    bot = MagicMock()
+    bot.send_message = AsyncMock(side_effect=[RuntimeError("network down"), SimpleNamespace(message_id=1)])
+    app = SimpleNamespace(bot=bot)
+    queue = scheduler.reminder_queue.ReminderQueue()
+    queue.replace([item], now=now)
+
+    with patch.object(scheduler, "REMINDERS", queue), patch.object(scheduler, "_REMINDER_APP", app), \
+         patch.object(scheduler.outbox, "OUTBOX", scheduler.outbox.Outbox()), \
+         patch.object(scheduler, "_arm_reminder_dispatch"), \
+         patch.object(scheduler, "create_reminder_message", return_value="Deep Work started"), \
+         patch.object(scheduler, "db") as mock_db:
+        await scheduler._send_reminders(queue.pop_due(now))
+        await scheduler.outbox.OUTBOX.drain()
+        mock_db.mark_event_as_notified.assert_not_called()
+
+        retry = queue.pop_due(now + timedelta(minutes=1))
+        assert [it.attempt for it in retry] == [1]
+        await scheduler._send_reminders(retry)
+        await scheduler.outbox.OUTBOX.drain()
+
+    assert bot.send_message.await_count == 2
+    mock_db.mark_event_as_notified.assert_called_once_with("e1", "during")
+
+@pytest.mark.asyncio
+async def test_blocked_before_reminder_skips_text_generation():
+    now = datetime.now(scheduler.TZ)
+    item = scheduler.reminder_queue.ReminderItem(fire_at=now, event_id="e1", phase="before", title="Gym")
+    app = SimpleNamespace(bot=MagicMock())
+    with patch.object(scheduler, "create_reminder_message") as gen, \
+         patch.object(scheduler.outbox, "send", new=AsyncMock()) as send, \
+         patch.object(scheduler, "db") as mock_db:
+        mock_db.is_event_blocked.return_value = True
+        await scheduler._send_reminder(app, "7", item)
+    gen.assert_not_called()
+    send.assert_not_awaited()
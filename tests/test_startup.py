@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# apscheduler is not listed: python-telegram-bot 20.7's job queue imports it at import time
+HEAVY = {"openai", "googleapiclient", "google_auth_oauthlib", "dateparser", "jinja2"}
+
+
+def test_importing_bot_defers_heavy_sdks():
+    code = (
+        "import sys, json, bot; "
+        f"print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({sorted(HEAVY)!r}))))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
+
+
+@pytest.mark.asyncio
+async def test_schema_init_runs_in_startup_hook_before_db_jobs():
+    import bot
+    order = []
+    app = object()
+    with patch("bot.db.init_db", side_effect=lambda: order.append("init_db")), \
+         patch("bot.send_daily_agenda", side_effect=lambda a: order.append(("agenda", a))), \
+         patch("bot.send_time_reminders", side_effect=lambda a: order.append(("reminders", a))), \
+         patch("bot.feature_flags.WATCH_ENABLED", False):
+        await bot.on_startup(app)
+    assert order == ["init_db", ("agenda", app), ("reminders", app)]
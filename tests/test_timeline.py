@@ -0,0 +1,98 @@
+# tests/test_timeline.py
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from agent_brain.timeline import FreeSlotIndex, plan_buffers
+
+TZ = ZoneInfo("Europe/London")
+DAY = dt.datetime(2026, 1, 12, 0, 0, tzinfo=TZ)
+
+
+def _seg(sid, h, m, minutes, rigidity="soft", location=None, type_="scheduled"):
+    start = DAY.replace(hour=h, minute=m)
+    return {"id": sid, "type": type_, "rigidity": rigidity, "location": location,
+            "start_at": start, "end_at": start + dt.timedelta(minutes=minutes)}
+
+
+def test_plan_buffers_uses_rigidity_and_location():
+    segs = [
+        _seg("c", 11, 0, 60, location="Gym"),
+        _seg("a", 9, 0, 60, location="Home"),
+        _seg("b", 10, 0, 30, rigidity="firm", location="Home"),
+        _seg("ftw", 12, 0, 30, type_="free"),
+    ]
+    buffers = plan_buffers(segs)
+    assert buffers == {"a": 0, "b": 10, "c": 15}
+
+
+def test_free_slot_index_applies_buffers():
+    segs = [_seg("a", 9, 0, 60), _seg("b", 10, 30, 60, rigidity="firm")]
+    idx = FreeSlotIndex(segs, plan_buffers(segs), DAY, DAY + dt.timedelta(days=1))
+
+    # 10:00-10:25 collides with b's 10-minute lead-in buffer (10:20)
+    assert idx.conflicts(DAY.replace(hour=10, minute=5), DAY.replace(hour=10, minute=25)) == ["b"]
+    # ...and with a's end once the default transition buffer is applied
+    assert idx.conflicts(DAY.replace(hour=10), DAY.replace(hour=10, minute=15)) == ["a"]
+    assert idx.is_free(DAY.replace(hour=10, minute=5), DAY.replace(hour=10, minute=15))
+    assert idx.prev_end(DAY.replace(hour=10, minute=5)) == DAY.replace(hour=10)
+
+    gaps = idx.gaps(after=DAY.replace(hour=8), min_minutes=15)
+    assert gaps[0] == (DAY.replace(hour=8), DAY.replace(hour=9))
+    assert gaps[1] == (DAY.replace(hour=10), DAY.replace(hour=10, minute=20))
+    assert gaps[2][0] == DAY.replace(hour=11, minute=30)
+
+
+def test_move_block_later_ignores_its_own_old_end():
+    from unittest.mock import MagicMock, patch
+    import calendar_client as cal
+    from agent_brain import timeline
+
+    segs = [_seg("gcal:prev", 8, 0, 60), _seg("gcal:ev1", 9, 30, 60)]
+    idx = FreeSlotIndex(segs, {}, DAY, DAY + dt.timedelta(days=1))
+    assert idx.prev_end(DAY.replace(hour=10), ignore_id="gcal:ev1") == DAY.replace(hour=9)
+
+    new_start, new_end = DAY.replace(hour=10), DAY.replace(hour=11)   # 30 min later, < its own 60 min
+    service = MagicMock()
+    service.events().update.side_effect = lambda **kw: MagicMock(execute=lambda: kw["body"])
+    ev = {"id": "ev1", "start": {}, "end": {}}
+    timeline.publish_index(idx)
+    try:
+        with patch.object(cal, "_service", return_value=service), \
+             patch.object(cal, "get_event_by_id", return_value=ev), \
+             patch.object(cal, "_get_rigidity_from_event", return_value="soft"), \
+             patch.object(cal, "_has_conflict", return_value=False), \
+             patch.object(cal, "log_event_action"), \
+             patch.object(timeline.FreeSlotIndex, "covers", return_value=True):
+            updated = cal.move_block("ev1", new_start, new_end)
+            moved = timeline._INDEX
+    finally:
+        timeline.publish_index(None)
+    assert updated["start"]["dateTime"] == new_start.isoformat()
+    assert updated["end"]["dateTime"] == new_end.isoformat()
+    # the published index follows the move: old slot free, new slot busy
+    assert moved.is_free(DAY.replace(hour=9, minute=30), DAY.replace(hour=10), buffer_min=0)
+    assert moved.conflicts(new_start, new_end, buffer_min=0) == ["gcal:ev1"]
+
+
+def test_move_block_fallback_skips_the_moved_event():
+    from unittest.mock import MagicMock, patch
+    import calendar_client as cal
+
+    new_start, new_end = DAY.replace(hour=10), DAY.replace(hour=11)
+    service = MagicMock()
+    service.events().list.return_value.execute.return_value = {"items": [
+        {"id": "ev1", "end": {"dateTime": DAY.replace(hour=10, minute=30).isoformat()}},
+        {"id": "prev", "end": {"dateTime": new_start.isoformat()}},
+    ]}
+    service.events().update.side_effect = lambda **kw: MagicMock(execute=lambda: kw["body"])
+    with patch.object(cal, "_service", return_value=service), \
+         patch.object(cal, "get_event_by_id", return_value={"id": "ev1", "start": {}, "end": {}}), \
+         patch.object(cal, "_get_rigidity_from_event", return_value="soft"), \
+         patch.object(cal, "_has_conflict", return_value=False), \
+         patch.object(cal, "log_event_action"), \
+         patch.object(cal.timeline, "current_index", return_value=None):
+        updated = cal.move_block("ev1", new_start, new_end)
+
+    assert service.events().list.call_args.kwargs["maxResults"] == 2
+    # the previous event ends right at the new start, so the transition buffer applies
+    assert updated["start"]["dateTime"] != new_start.isoformat()
@@ -0,0 +1,60 @@
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from agent_brain import tone_templates
+from agent_brain import messages
+
+BANNED = ("should", "must", "need to", "have to")
+
+
+def test_every_kind_and_tone_renders_without_guilt_words():
+    for kind, tones in tone_templates.SOURCES.items():
+        for tone in tone_templates.TONES:
+            for i in range(len(tones[tone])):
+                txt = tone_templates.render(kind, tone, variant=i, title="Deep Work", minutes=25)
+                assert txt and "{{" not in txt
+                assert not any(w in txt.lower() for w in BANNED), txt
+
+
+def test_rotation_is_deterministic_and_variant_zero_is_canonical():
+    tone_templates.reset_rotation()
+    first = [tone_templates.render("mid", "coach", title="Gym") for _ in range(4)]
+    tone_templates.reset_rotation()
+    again = [tone_templates.render("mid", "coach", title="Gym") for _ in range(4)]
+    assert first == again
+    assert first[0] == "Halfway through *Gym*. On track to finish?"
+    assert len(set(first[:3])) == 3 and first[3] == first[0]
+
+
+def test_ds_falls_back_to_gentle_when_ds_mode_off():
+    assert tone_templates.render("end", "ds", ds_on=False, variant=0, title="X") == "Wrap up *X*?"
+    assert tone_templates.render("end", "unknown", variant=0, title="X") == "Wrap up *X*?"
+
+
+def test_render_is_fast():
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        tone_templates.render("start", "gentle", title="Deep Work", meta=" — QII")
+    assert (time.perf_counter() - t0) / 1000 < 0.001
+
+
+def test_message_builders_use_templates():
+    tone_templates.reset_rotation()
+    with patch.object(messages, "ff_is_enabled", return_value=False):
+        payload = messages.build_start_message("s1", "Deep Work", "coach", "u1", qii=True)
+    assert payload["text"] == "Starting *Deep Work* — QII. This matters — shall we begin?"
+
+
+@pytest.mark.asyncio
+async def test_fsm_prompt_has_no_llm_call_by_default():
+    from agent_brain import actions
+    seg = {"id": "s1", "title": "Deep Work", "tone_at_start": "gentle"}
+    with patch.object(actions, "_fetch_segment", return_value=seg), \
+         patch.object(actions.ff, "get", return_value=False), \
+         patch.object(actions, "send_text_safe", new=AsyncMock()) as send, \
+         patch.object(actions, "_send_llm_payload", new=AsyncMock()) as llm:
+        await actions.fsm_send_end("s1", MagicMock(), MagicMock())
+    llm.assert_not_awaited()
+    assert "Deep Work" in send.await_args.args[2]
@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from agent_brain.update_processor import PerChatUpdateProcessor, chat_key
+
+
+def _update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+def test_chat_key_falls_back_to_user():
+    assert chat_key(_update(5)) == 5
+    user_only = SimpleNamespace(effective_chat=None, effective_user=SimpleNamespace(id=9))
+    assert chat_key(user_only) == ("user", 9)
+    assert chat_key(object()) is None
+
+
+@pytest.mark.asyncio
+async def test_same_chat_in_order_other_chats_not_blocked():
+    proc = PerChatUpdateProcessor(max_concurrent=4)
+    await proc.initialize()
+    log = []
+    slow_started = asyncio.Event()
+
+    async def handler(name, delay):
+        log.append(f"start {name}")
+        if name == "a1":
+            slow_started.set()
+        await asyncio.sleep(delay)
+        log.append(f"end {name}")
+
+    tasks = [
+        asyncio.create_task(proc.process_update(_update(1), handler("a1", 0.05))),
+        asyncio.create_task(proc.process_update(_update(1), handler("a2", 0))),
+        asyncio.create_task(proc.process_update(_update(2), handler("b1", 0))),
+    ]
+    await slow_started.wait()
+    assert proc.stats()["busy_chats"] == 2
+    await asyncio.gather(*tasks)
+
+    # chat 2 finished while chat 1's slow update was still running
+    assert log.index("end b1") < log.index("end a1")
+    # chat 1 stays strictly ordered
+    assert log.index("end a1") < log.index("start a2")
+    stats = proc.stats()
+    assert stats["processed"] == 3 and stats["max_depth"] == 2 and stats["busy_chats"] == 0
+
+
+@pytest.mark.asyncio
+async def test_global_cap_limits_running_handlers():
+    proc = PerChatUpdateProcessor(max_concurrent=2)
+    await proc.initialize()
+    peak = 0
+
+    async def handler():
+        nonlocal peak
+        peak = max(peak, proc.running)
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(proc.process_update(_update(i), handler()) for i in range(6)))
+    assert peak == 2
+    assert proc.stats()["processed"] == 6
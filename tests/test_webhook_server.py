@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import webhook_server
+
+SECRET = "s3cret"
+
+
+def _app():
+    return SimpleNamespace(bot=MagicMock(), update_queue=asyncio.Queue(), running=True)
+
+
+async def _client(app):
+    client = TestClient(TestServer(webhook_server.make_web_app(app, path="/telegram", secret=SECRET)))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_update_with_secret_is_queued():
+    app = _app()
+    client = await _client(app)
+    try:
+        with patch.object(webhook_server, "Update") as update_cls:
+            update_cls.de_json.return_value = "UPDATE"
+            resp = await client.post("/telegram", json={"update_id": 1},
+                                     headers={webhook_server.SECRET_HEADER: SECRET})
+        assert resp.status == 200
+        assert app.update_queue.get_nowait() == "UPDATE"
+        update_cls.de_json.assert_called_once_with({"update_id": 1}, app.bot)
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_wrong_or_missing_secret_is_rejected():
+    app = _app()
+    client = await _client(app)
+    try:
+        bad = await client.post("/telegram", json={"update_id": 1},
+                                headers={webhook_server.SECRET_HEADER: "nope"})
+        missing = await client.post("/telegram", json={"update_id": 1})
+        assert bad.status == 403 and missing.status == 403
+        assert app.update_queue.empty()
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_malformed_body_is_400():
+    app = _app()
+    client = await _client(app)
+    try:
+        resp = await client.post("/telegram", data=b"not json",
+                                 headers={webhook_server.SECRET_HEADER: SECRET})
+        assert resp.status == 400
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_healthz_reports_queue_depth():
+    app = _app()
+    app.update_queue.put_nowait("pending")
+    client = await _client(app)
+    try:
+        with patch.object(webhook_server.llm_client, "health", return_value={"breaker": "closed"}):
+            resp = await client.get("/healthz")
+            body = await resp.json()
+        assert resp.status == 200
+        assert body["ok"] is True and body["update_queue"] == 1
+        assert body["llm"] == {"breaker": "closed"}
+    finally:
+        await client.close()
@@ -0,0 +1,126 @@
+# webhook_server.py
+"""
+Webhook delivery for the Telegram bot (BOT_DELIVERY_MODE=webhook).
+
+An aiohttp server runs on the same event loop as the PTB Application, its
+job queue and the reminder dispatcher:
+
+    POST WEBHOOK_PATH  Telegram updates. Requests without the right
+                       X-Telegram-Bot-Api-Secret-Token get a 403. Valid
+                       updates go onto app.update_queue, and the server
+                       answers 200 right away; handlers run on PTB's
+                       update loop.
+    GET  /healthz      liveness plus update queue depth, per-chat processing,
+                       outbox and LLM health.
+
+WEBHOOK_URL is the public base URL Telegram should call (https). The secret
+comes from WEBHOOK_SECRET; if it is unset, a random secret is generated per
+process and registered with set_webhook.
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import signal
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+
+import llm_client
+from agent_brain import outbox
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+HEALTH_PATH = "/healthz"
+
+
+def make_web_app(app, *, path: str, secret: str) -> web.Application:
+    """aiohttp application that feeds verified updates into `app.update_queue`."""
+
+    async def receive(request: web.Request) -> web.Response:
+        given = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(given.encode(), secret.encode()):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, app.bot)
+        except Exception as e:
+            logging.warning(f"[webhook] bad update payload: {e}")
+            return web.Response(status=400)
+        await app.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        processor = getattr(app, "update_processor", None)
+        return web.json_response({
+            "ok": True,
+            "running": bool(getattr(app, "running", False)),
+            "update_queue": app.update_queue.qsize(),
+            "updates": processor.stats() if hasattr(processor, "stats") else None,
+            "outbox": outbox.stats(),
+            "llm": llm_client.health(),
+        })
+
+    web_app = web.Application()
+    web_app.router.add_post(path, receive)
+    web_app.router.add_get(HEALTH_PATH, health)
+    return web_app
+
+
+def _stop_on_signals() -> asyncio.Event:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows / non-main thread
+            pass
+    return stop
+
+
+async def serve(app, *, url: str, path: str = "/telegram", secret: Optional[str] = None,
+                host: str = "0.0.0.0", port: int = 8080, stop: Optional[asyncio.Event] = None) -> None:
+    """Run `app` behind the webhook server until `stop` is set (default: SIGINT/SIGTERM)."""
+    secret = secret or secrets.token_urlsafe(32)
+    runner = web.AppRunner(make_web_app(app, path=path, secret=secret), access_log=None)
+
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    await app.start()  # job queue + update processing
+    await app.bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret,
+                              allowed_updates=Update.ALL_TYPES)
+    logging.info(f"[webhook] listening on {host}:{port}{path}")
+
+    try:
+        await (stop or _stop_on_signals()).wait()
+    finally:
+        await runner.cleanup()
+        if app.running:
+            await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def run(app) -> None:
+    """Blocking entry point used by bot.main; mirrors app.run_polling()."""
+    url = os.getenv("WEBHOOK_URL")
+    if not url:
+        raise RuntimeError("WEBHOOK_URL missing (required for BOT_DELIVERY_MODE=webhook)")
+    # Same loop the reminder dispatcher captured in send_time_reminders
+    asyncio.get_event_loop().run_until_complete(serve(
+        app,
+        url=url,
+        path=os.getenv("WEBHOOK_PATH", "/telegram"),
+        secret=os.getenv("WEBHOOK_SECRET") or None,
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or 8080),
+    ))